@@ -1,6 +1,7 @@
-import concurrent.futures
 from logger.logger import setup_logger
-from application.extractor.extract import Extractor
+from logger.metrics import MetricsExporter
+from application.crawler.async_crawler import AsyncCrawler
+from application.crawler.frontier import SQLiteFrontier
 
 # logger = setup_logger('scraper.log', __name__)
 logger = setup_logger('scraper.log', '_main')
@@ -11,40 +12,53 @@ urls = [
 ]
 
 
-def scrape_and_store(urls: str|list[str]|tuple[str]|set[str]) -> None:
-    """Start scraping data from url(s)"""
-    product_extracted: int = 0
+def clean_url(url: str) -> str:
+    """Remove every whitespace character from the url"""
+    url = url.strip().replace('\n', '').replace('\t', '')
+    return "".join(url.split())
+
+
+def scrape_and_store(urls: str|list[str]|tuple[str]|set[str], lastmods: dict[str, str]|None=None) -> None:
+    """Start scraping data from url(s). lastmods is the sitemap lastmod of the urls (if known) to skip the unchanged ones"""
     if not urls:
         logger.warning('No product url found')
-    elif isinstance(urls, str):
-        url = urls.strip().replace('\n', '').replace('\t', '')
-        url = "".join(url.split())
+        return
+    if isinstance(urls, str):
+        urls = [urls]
+    cleaned_urls: list[str] = [clean_url(url) for url in urls if isinstance(url, str)]
+    for url in cleaned_urls:
         logger.info(f"Scraping URL: {url}")
-        extractor = Extractor(url)
-        product = extractor.scrape()
-        product_extracted += 1
-    elif isinstance(urls, list) or isinstance(urls, tuple) or isinstance(urls, set):
-        for url in urls:
-            if isinstance(url, str):
-                url = url.strip().replace('\n', '').replace('\t', '')
-                url = "".join(url.split())
-                logger.info(f"Scraping URL: {url}")
-                extractor = Extractor(product_url=url)
-                product = extractor.scrape()
-                product_extracted += 1
-    if "error" not in product:
-        logger.info(f"Data inserted-updated for the URL(s) successfully")
-    else:
-        logger.error(f"Failed to scrape data for the URL(s)")
+    if lastmods:
+        lastmods = {clean_url(url): lastmod for url, lastmod in lastmods.items()}
+    frontier = SQLiteFrontier()
+    try:
+        # Resume the interrupted crawl if there is one, otherwise start a new crawl of the urls. The urls this crawler claimed before it
+        # stopped are taken back at once, the ones claimed by another crawler still running on the same frontier only after their lease
+        frontier.recover(expired_only=True)
+        if frontier.has_unfinished():
+            logger.info(f"Resuming interrupted crawl: {frontier.counts()}")
+        else:
+            frontier.clear_finished()
+        frontier.add(cleaned_urls, lastmods=lastmods)
+        results: list[dict] = AsyncCrawler().run_frontier(frontier)
+    finally:
+        frontier.close()
+    product_extracted: int = sum(1 for result in results if result.get('status') == 'ok')
+    not_modified: int = sum(1 for result in results if result.get('status') == 'not_modified')
+    if product_extracted:
+        logger.info(f"Data inserted-updated for {product_extracted} of {len(cleaned_urls)} URL(s) successfully")
+    if not_modified:
+        logger.info(f"{not_modified} URL(s) skipped because they did not change since the last crawl")
+    if product_extracted + not_modified < len(cleaned_urls):
+        logger.error(f"Failed to scrape data for {len(cleaned_urls) - product_extracted - not_modified} URL(s)")
 
 
 def main():
     product_url = """https://datkala.com/product/%d9%84%d9%be-%d8%aa%d8%a7%d9%be-%d9%84%d9%86%d9%88%d9%88-15-6-%d8%a7%db%8c%d9%86%da%86%db%8c-%d9%85%d8%af%d9%84-loq-i7-14700hx-32gb-512gb-rtx-5060/"""
-    scrape_and_store(product_url)
-
+    # Stage timings are served and/or dumped as configured by the METRICS_* settings
+    with MetricsExporter():
+        scrape_and_store(product_url)
 
-main()
 
-# if __name__ == "__main__":
-#     with concurrent.futures.ProcessPoolExecutor() as executor:
-#         executor.map(scrape_and_store, urls)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Entry point of the distributed worker mode. Start as many workers as needed on any machine that reaches RabbitMQ:
+    python _worker.py                       # consume urls from config.QUEUE_NAME and scrape them
+    python _worker.py --publish urls.txt    # publish the urls of the file (one per line) to the queue
+"""
+
+import argparse
+from logger.logger import setup_logger
+from logger.metrics import MetricsExporter
+from application.worker.broker import RabbitMQBroker
+from application.worker.worker import ScrapeWorker
+import config
+
+logger = setup_logger('scraper.log', '_worker')
+
+
+def publish_urls(path: str) -> None:
+    """Publish every non-empty line of the file to the queue"""
+    broker = RabbitMQBroker()
+    try:
+        with open(path, encoding='utf-8') as f:
+            count = broker.publish_many(line.strip() for line in f if line.strip())
+        logger.info(f"{count} URL(s) published to {config.QUEUE_NAME}")
+    finally:
+        broker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape product urls consumed from RabbitMQ')
+    parser.add_argument('--publish', metavar='FILE', help='Publish the urls of the file to the queue and exit')
+    parser.add_argument('--method', choices=('requests', 'selenium'), default=config.METHOD)
+    parser.add_argument('--prefetch', type=int, default=config.WORKER_PREFETCH, help='Unacknowledged messages held by the worker')
+    parser.add_argument('--threads', type=int, default=config.WORKER_THREADS, help='Urls scraped at the same time')
+    parser.add_argument('--metrics-port', type=int, default=config.METRICS_PORT, help='Serve the Prometheus metrics of the worker on this port')
+    args = parser.parse_args()
+    if args.publish:
+        publish_urls(args.publish)
+        return
+    worker = ScrapeWorker(RabbitMQBroker(prefetch=args.prefetch), method=args.method, threads=args.threads)
+    exporter = MetricsExporter(port=args.metrics_port)
+    exporter.start()
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        logger.info('Worker interrupted, unacknowledged messages are requeued by RabbitMQ')
+    finally:
+        worker.close()
+        exporter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""
+Provides the raw HTML archive. Fetched pages are appended to compressed WARC segment files with an offset index, so the products
+can be extracted again from the archived pages (For eg, after the extractor is fixed) without crawling the sites again
+
+"""
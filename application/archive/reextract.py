@@ -0,0 +1,102 @@
+"""
+Re-extract the products from the raw HTML archive without any network request, for example after the extractor is fixed.
+Archived pages are streamed from the memory-mapped segments, parsed in a process pool and stored in batches.
+Usage:
+    python -m application.archive.reextract --since "2024-01-01 00:00:00" --processes 8
+"""
+
+import argparse
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from application.archive.warc import ArchiveReader
+from application.data_management.writer import ProductWriter
+from application.extractor.extract import Extractor, extract_product_data
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+def reextract(archive_dir: str=config.ARCHIVE_DIR, since: str|None=None, until: str|None=None, processes: int=config.PARSE_PROCESSES, parser_backend: str|None=None, db_file: str=config.DB_FILE, writer: ProductWriter|None=None) -> dict[str, int]:
+    """
+    Extract and store the products of the archived pages (The latest page of every url).
+    Args:
+        archive_dir (str): Directory of the segment files.
+        since (str|None): Only the pages archived at or after this timestamp ('YYYY-MM-DD HH:MM:SS').
+        until (str|None): Only the pages archived before this timestamp.
+        processes (int): Number of processes parsing the pages. 0 parses them in this process.
+        parser_backend (str|None): Parser backend used by Extractor (config.PARSER_BACKEND if not provided).
+        db_file (str): The SQLite database file of the archive index and the products.
+        writer (ProductWriter|None): Writer used to store the products. A new one created if not provided.
+    Returns:
+        dict[str, int]: Number of archived pages read and products stored.
+    """
+    started_at = time.monotonic()
+    counts = {'records': 0, 'stored': 0}
+    own_writer = writer is None
+    if own_writer:
+        writer = ProductWriter(db_file)
+    reader = ArchiveReader(archive_dir, connection=writer.connection)
+    archived = reader.iter_records(since, until)
+    try:
+        records = (record for record in archived if 200 <= record.status < 300)
+        if processes > 0:
+            _extract_in_pool(records, processes, parser_backend, writer, counts)
+        else:
+            for record in records:
+                counts['records'] += 1
+                result = Extractor(record.url, method='requests', html_body=record.body, writer=writer, parser_backend=parser_backend).scrape()
+                if result.get('status') == 'ok':
+                    counts['stored'] += 1
+    finally:
+        archived.close()
+        reader.close()
+        if own_writer:
+            writer.close()
+        else:
+            writer.flush()
+    elapsed = time.monotonic() - started_at
+    logger.info(f"{counts['stored']} product(s) re-extracted from {counts['records']} archived page(s) in {elapsed:.1f}s")
+    return counts
+
+
+def _extract_in_pool(records, processes: int, parser_backend: str|None, writer: ProductWriter, counts: dict[str, int]) -> None:
+    """Parse the records in a process pool. At most a few pages per process are in flight, so memory stays bounded"""
+    window: deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for record in records:
+            counts['records'] += 1
+            window.append(pool.submit(extract_product_data, record.url, record.body, parser_backend))
+            if len(window) >= processes * 4:
+                _store(window.popleft(), writer, counts)
+        while window:
+            _store(window.popleft(), writer, counts)
+
+
+def _store(future: Future, writer: ProductWriter, counts: dict[str, int]) -> None:
+    try:
+        result = future.result()
+        if result.get('status') == 'ok' and writer.add(result['data']):
+            counts['stored'] += 1
+    except Exception as e:
+        logger.error(f'Error in re-extracting an archived page: {e.__str__()}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract the products again from the raw HTML archive')
+    parser.add_argument('--archive-dir', default=config.ARCHIVE_DIR)
+    parser.add_argument('--since', help="Only the pages archived at or after this timestamp ('YYYY-MM-DD HH:MM:SS')")
+    parser.add_argument('--until', help='Only the pages archived before this timestamp')
+    parser.add_argument('--processes', type=int, default=config.PARSE_PROCESSES, help='Parser processes (0 parses in this process)')
+    parser.add_argument('--parser', default=None, help='Parser backend (html.parser, lxml or selectolax)')
+    parser.add_argument('--db', default=config.DB_FILE, help='SQLite database file')
+    args = parser.parse_args()
+    counts = reextract(args.archive_dir, args.since, args.until, args.processes, args.parser, args.db)
+    print(f"{counts['stored']} product(s) re-extracted from {counts['records']} archived page(s)")
+
+
+if __name__ == "__main__":
+    main()
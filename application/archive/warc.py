@@ -0,0 +1,328 @@
+"""
+Raw HTML archive stored as WARC/1.1 'response' records in segment files.
+Every record is compressed on its own (A gzip member or a zstd frame), so a record can be read with a single seek: the
+'archive_index' table keeps the segment, offset and length of every record. Segments are read through mmap, so streaming a
+whole segment costs no extra copies. Compression is chosen with config.ARCHIVE_COMPRESSION:
+    'gzip' - .warc.gz segments readable by every WARC tool (No extra dependency)
+    'zstd' - .warc.zst segments, faster and smaller (pip install zstandard)
+"""
+
+import gzip
+import mmap
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.client import responses
+from typing import Iterator, NamedTuple
+from application.database._resources import current_timestamp
+from application.database.sqlite import SQLiteDBInit, ArchiveIndexCRUD
+from logger.logger import setup_logger
+import config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+EXTENSIONS = {'gzip': '.warc.gz', 'zstd': '.warc.zst'}
+# Response headers that do not describe the stored body (It is stored decoded and without transfer encoding)
+SKIPPED_HEADERS = ('content-length', 'content-encoding', 'transfer-encoding')
+
+
+class ArchiveRecord(NamedTuple):
+    """A page read from the archive"""
+    url: str
+    date: str
+    status: int
+    headers: dict[str, str]
+    body: str
+
+
+def resolve_compression(compression: str) -> str:
+    """Return the compression if it is available, otherwise gzip"""
+    if compression not in EXTENSIONS:
+        raise ValueError(f"Unknown archive compression: {compression}. Choose one of {list(EXTENSIONS)}")
+    if compression == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, 'gzip' is used to compress the archive")
+        return 'gzip'
+    return compression
+
+
+def build_record(url: str, body: str, status: int=200, headers: dict[str, str]|None=None, date: datetime|None=None) -> bytes:
+    """Build an uncompressed WARC/1.1 response record of the page"""
+    payload = body.encode('utf-8', errors='surrogateescape')
+    http_headers = [f'HTTP/1.1 {status} {responses.get(status, "")}'.rstrip()]
+    for name, value in (headers or {}).items():
+        if name.lower() not in SKIPPED_HEADERS:
+            http_headers.append(f'{name}: {value}')
+    http_headers.append(f'Content-Length: {len(payload)}')
+    block = ('\r\n'.join(http_headers) + '\r\n\r\n').encode('utf-8', errors='replace') + payload
+    date = date or datetime.now(timezone.utc)
+    warc_headers = (
+        'WARC/1.1\r\n'
+        'WARC-Type: response\r\n'
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n'
+        f'WARC-Date: {date.strftime("%Y-%m-%dT%H:%M:%SZ")}\r\n'
+        f'WARC-Target-URI: {url}\r\n'
+        'Content-Type: application/http; msgtype=response\r\n'
+        f'Content-Length: {len(block)}\r\n'
+        '\r\n'
+    )
+    return warc_headers.encode('utf-8', errors='replace') + block + b'\r\n\r\n'
+
+
+def parse_record(data: bytes) -> ArchiveRecord:
+    """Parse an uncompressed WARC response record built by build_record"""
+    warc_head, _, rest = data.partition(b'\r\n\r\n')
+    warc_headers = _parse_headers(warc_head.split(b'\r\n')[1:])
+    block = rest[:int(warc_headers.get('Content-Length', len(rest)))]
+    http_head, _, payload = block.partition(b'\r\n\r\n')
+    http_lines = http_head.split(b'\r\n')
+    status_parts = http_lines[0].split(b' ', 2)
+    status = int(status_parts[1]) if len(status_parts) > 1 and status_parts[1].isdigit() else 0
+    return ArchiveRecord(
+        url=warc_headers.get('WARC-Target-URI', ''),
+        date=warc_headers.get('WARC-Date', ''),
+        status=status,
+        headers=_parse_headers(http_lines[1:]),
+        body=payload.decode('utf-8', errors='surrogateescape'),
+    )
+
+
+def _parse_headers(lines: list[bytes]) -> dict[str, str]:
+    headers = {}
+    for line in lines:
+        name, _, value = line.decode('utf-8', errors='replace').partition(':')
+        if name:
+            headers[name.strip()] = value.strip()
+    return headers
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes|memoryview, compression: str) -> bytes:
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstandard is required to read .warc.zst segments (pip install zstandard)')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def segment_compression(segment: str) -> str:
+    """Return the compression of the segment from its file name"""
+    return 'zstd' if segment.endswith(EXTENSIONS['zstd']) else 'gzip'
+
+
+class HtmlArchive:
+    """Append-only archive of the fetched pages. Thread-safe.\n
+    Usage:\n
+        with HtmlArchive() as archive:
+            archive.append(url, html_body, status, headers)
+    """
+    def __init__(self, archive_dir: str=config.ARCHIVE_DIR, compression: str=config.ARCHIVE_COMPRESSION, segment_size: int=config.ARCHIVE_SEGMENT_SIZE, batch_size: int=config.DB_BATCH_SIZE, db_file: str=config.DB_FILE, connection: sqlite3.Connection|None=None) -> None:
+        """
+        Args:
+            archive_dir (str): Directory of the segment files.
+            compression (str): 'gzip' or 'zstd'.
+            segment_size (int): Size (in bytes) after which a new segment file is started.
+            batch_size (int): Number of records whose index rows are written together.
+            db_file (str): The SQLite database file of the index. Not used if connection is provided.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+        """
+        self.archive_dir: str = archive_dir
+        self.compression: str = resolve_compression(compression)
+        self.segment_size: int = max(1, segment_size)
+        self.batch_size: int = max(1, batch_size)
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: ArchiveIndexCRUD = ArchiveIndexCRUD(self.connection)
+        self.archived: int = 0
+        self._file = None
+        self._segment: str|None = None
+        self._sequence: int = 0
+        self._pending: list[tuple] = []
+        self._lock = threading.Lock()
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def __enter__(self) -> 'HtmlArchive':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def append(self, url: str, body: str, status: int=200, headers: dict[str, str]|None=None, digest: str|None=None) -> bool:
+        """
+        Append the page to the current segment. Its index row is written with the next batch.
+        Args:
+            url (str): Url of the page.
+            body (str): The page content.
+            status (int): Response status.
+            headers (dict[str, str]|None): Response headers.
+            digest (str|None): Fingerprint of the page (Stored in the index).
+        Returns:
+            bool: True if the record written.
+        """
+        try:
+            data = compress(build_record(url, body, status, headers), self.compression)
+            with self._lock:
+                if self._file is None or self._file.tell() >= self.segment_size:
+                    self._open_segment()
+                offset = self._file.tell()
+                self._file.write(data)
+                self._pending.append((url, self._segment, offset, len(data), digest, current_timestamp()))
+                self.archived += 1
+                if len(self._pending) >= self.batch_size:
+                    self._flush_locked()
+            return True
+        except Exception as e:
+            logger.error(f'Cannot archive {url}: {e.__str__()}')
+            return False
+
+    def flush(self) -> bool:
+        """Write the buffered records to disk, then their index rows"""
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> bool:
+        if not self._pending:
+            return True
+        # The index never points to bytes that are not on disk yet
+        self._file.flush()
+        rows, self._pending = self._pending, []
+        return self.crud.insert(rows)
+
+    def _open_segment(self) -> None:
+        """Close the current segment and start a new one. Names sort in the order the segments are written"""
+        if self._file is not None:
+            self._flush_locked()
+            self._file.close()
+        self._sequence += 1
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self._segment = f'archive-{timestamp}-{os.getpid()}-{self._sequence:05d}{EXTENSIONS[self.compression]}'
+        self._file = open(os.path.join(self.archive_dir, self._segment), 'ab')
+        logger.info(f'New archive segment: {self._segment}')
+
+    def close(self) -> None:
+        """Flush the records, close the segment and the connection if it opened by the archive"""
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked()
+                self._file.close()
+                self._file = None
+        if self._owns_connection and self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class ArchiveReader:
+    """Read the archived pages from memory-mapped segments.\n
+    Usage:\n
+        with ArchiveReader() as reader:
+            for record in reader.iter_records(since='2024-01-01 00:00:00'):
+                ...
+    """
+    def __init__(self, archive_dir: str=config.ARCHIVE_DIR, db_file: str=config.DB_FILE, connection: sqlite3.Connection|None=None) -> None:
+        """
+        Args:
+            archive_dir (str): Directory of the segment files.
+            db_file (str): The SQLite database file of the index. Not used if connection is provided.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+        """
+        self.archive_dir: str = archive_dir
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: ArchiveIndexCRUD = ArchiveIndexCRUD(self.connection)
+        self._maps: dict[str, tuple] = {}
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def read(self, segment: str, offset: int, length: int) -> ArchiveRecord:
+        """Read a single record. Raises OSError if the segment is missing and ValueError if the record is damaged"""
+        view = self._map(segment)
+        if offset + length > len(view):
+            # The segment may have grown since it was mapped (It is still being written)
+            self._unmap(segment)
+            view = self._map(segment)
+            if offset + length > len(view):
+                raise ValueError(f'Record at {offset} is beyond the end of {segment}')
+        chunk = view[offset:offset + length]
+        try:
+            return parse_record(decompress(chunk, segment_compression(segment)))
+        finally:
+            chunk.release()
+
+    def get(self, url: str) -> ArchiveRecord|None:
+        """Return the latest archived page of the url"""
+        entry = self.crud.latest(url)
+        if entry is None:
+            return None
+        return self.read(entry[1], entry[2], entry[3])
+
+    def iter_records(self, since: str|None=None, until: str|None=None, latest_only: bool=True) -> Iterator[ArchiveRecord]:
+        """
+        Stream the archived pages in the order they are stored on disk. Damaged records are logged and skipped.
+        Args:
+            since (str|None): Only the pages archived at or after this timestamp ('YYYY-MM-DD HH:MM:SS').
+            until (str|None): Only the pages archived before this timestamp.
+            latest_only (bool): Only the latest page of every url.
+        """
+        current = None
+        entries = self.crud.iter_entries(since, until, latest_only)
+        try:
+            for url, segment, offset, length, _, _ in entries:
+                # Segments are read one after another, so only one of them is mapped at a time
+                if current != segment:
+                    if current is not None:
+                        self._unmap(current)
+                    current = segment
+                try:
+                    yield self.read(segment, offset, length)
+                except Exception as e:
+                    logger.error(f'Cannot read archived page of {url} ({segment}@{offset}): {e.__str__()}')
+        finally:
+            entries.close()
+            if current is not None:
+                self._unmap(current)
+
+    def _map(self, segment: str) -> memoryview:
+        entry = self._maps.get(segment)
+        if entry is None:
+            f = open(os.path.join(self.archive_dir, segment), 'rb')
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # An empty file cannot be mapped
+                f.close()
+                raise ValueError(f'Archive segment {segment} is empty')
+            entry = self._maps[segment] = (f, mapped, memoryview(mapped))
+        return entry[2]
+
+    def _unmap(self, segment: str) -> None:
+        entry = self._maps.pop(segment, None)
+        if entry is not None:
+            f, mapped, view = entry
+            view.release()
+            mapped.close()
+            f.close()
+
+    def close(self) -> None:
+        """Unmap the segments and close the connection if it opened by the reader"""
+        for segment in list(self._maps):
+            self._unmap(segment)
+        if self._owns_connection and self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,4 @@
+"""
+Provides the crawl engine that fetches many product pages concurrently and hands them to the extractor. Single page extraction done in the application.extractor module
+
+"""
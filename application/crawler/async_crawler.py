@@ -0,0 +1,535 @@
+"""
+This module provides the AsyncCrawler class which crawls many product pages concurrently using asyncio and aiohttp.
+Pages are fetched on the event loop while CPU-bound parsing (JSON-LD extraction) and database writes run off the event loop, so it never blocks.
+With parse processes the crawl is a staged pipeline: fetchers -> bounded queue -> parsers in a process pool (Not limited by the GIL)
+-> bounded queue -> a single writer stage. A full queue makes the previous stage wait, so memory stays bounded.
+Urls are handed to the fetchers by HostScheduler which keeps every host crawled politely (robots.txt rules, Crawl-delay and adaptive delays).
+In incremental mode unchanged pages (Same sitemap lastmod, 304 response or same content hash) are neither parsed nor written again.
+"""
+
+import asyncio
+import contextlib
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Iterable, NamedTuple
+from urllib.parse import urlsplit
+import aiohttp
+from application.archive.warc import HtmlArchive
+from application.crawler.frontier import SQLiteFrontier
+from application.crawler.incremental import CrawlState, content_hash
+from application.crawler.scheduler import HostScheduler, THROTTLE_STATUS_CODES
+from application.data_management.writer import ProductWriter
+from application.driver.pool import DriverPool
+from application.extractor.extract import Extractor, extract_product_data
+from application.extractor.robots_cache import RobotsCache
+from application.extractor.robots_parser import RobotsTxtParser
+from application.network.http_client import create_async_session
+from logger.logger import setup_logger
+from logger.metrics import count_response, result_status, stage_timer
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+# Status codes of transient failures whose urls are tried again (Throttling and server or gateway errors)
+RETRY_STATUS_CODES = THROTTLE_STATUS_CODES + (500, 502, 504)
+
+
+def parse_retry_after(value: str|None) -> float|None:
+    """Convert value of the Retry-After header (seconds or HTTP date) into seconds. Returns None if not valid"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ParseJob(NamedTuple):
+    """A fetched page waiting for the parse stage (With what incremental mode records after it is stored)"""
+    url: str
+    html_body: str
+    status: int|None
+    headers: dict[str, str]
+    digest: str|None
+    lastmod: str|None
+
+
+class AsyncCrawler:
+    """Crawl product pages concurrently with a bounded global concurrency limit.\n
+    Every url is fetched with aiohttp (requests method) and the downloaded page is extracted and stored by Extractor off the event loop. With selenium method the whole Extractor.scrape runs in the thread pool because selenium is blocking and the drivers are shared through a DriverPool.\n"""
+    def __init__(self, concurrency: int=config.CONCURRENCY, method: str=config.METHOD, timeout: int=config.REQUEST_TIMEOUT, executor_workers: int|None=None, respect_robots: bool=config.RESPECT_ROBOTS, scheduler: HostScheduler|None=None, max_retries: int=config.MAX_RETRIES, writer: ProductWriter|None=None, incremental: bool=config.INCREMENTAL_CRAWL, crawl_state: CrawlState|None=None, robots_cache: RobotsCache|None=None, parse_processes: int=config.PARSE_PROCESSES, queue_size: int=config.PIPELINE_QUEUE_SIZE, archive_pages: bool=config.ARCHIVE_PAGES, archive: HtmlArchive|None=None) -> None:
+        """
+        Args:
+            concurrency (int): Maximum number of pages being processed at the same time.
+            method (str): Scraping method to use ('requests' or 'selenium').
+            timeout (int): Total timeout (in seconds) for fetching a single page.
+            executor_workers (int|None): Number of threads used to parse and store pages. Defaults to concurrency.
+            respect_robots (bool): Skip urls disallowed by robots.txt and use its Crawl-delay for the host.
+            scheduler (HostScheduler|None): Scheduler used to keep the crawl polite. A new one created if not provided.
+            max_retries (int): Number of times a url is tried again after a 429/500/502/503/504 response, a connection error or a timeout.
+            writer (ProductWriter|None): Writer used to store the products in batches. A new one created for every crawl if not provided.
+            incremental (bool): Skip the pages that did not change since the last crawl.
+            crawl_state (CrawlState|None): State of the previous crawls used in incremental mode. A new one created for every crawl if not provided.
+            robots_cache (RobotsCache|None): Cache of the robots.txt files shared with the other workers. Created on first use if not provided.
+            parse_processes (int): Number of processes parsing the pages (requests method). 0 parses them in the thread pool.
+            queue_size (int): Maximum number of pages waiting between two stages of the pipeline.
+            archive_pages (bool): Keep the fetched pages in the raw HTML archive (Pages with unchanged content are not archived again).
+            archive (HtmlArchive|None): Archive of the fetched pages. A new one created for every crawl if not provided.
+        """
+        self.concurrency: int = max(1, concurrency)
+        self.method: str = method
+        self.timeout: int = timeout
+        self.executor_workers: int = executor_workers or self.concurrency
+        self.respect_robots: bool = respect_robots
+        self.scheduler: HostScheduler = scheduler or HostScheduler()
+        self.max_retries: int = max_retries
+        self._retries: dict[str, int] = {}
+        self.driver_pool: DriverPool|None = None
+        self.writer: ProductWriter|None = writer
+        self.incremental: bool = incremental
+        self.crawl_state: CrawlState|None = crawl_state
+        self._lastmods: dict[str, str] = {}
+        self.robots_cache: RobotsCache|None = robots_cache
+        self.parse_processes: int = max(0, parse_processes)
+        self.queue_size: int = max(1, queue_size)
+        self._parse_queue: asyncio.Queue|None = None
+        self._write_queue: asyncio.Queue|None = None
+        self.archive_pages: bool = archive_pages or archive is not None
+        self.archive: HtmlArchive|None = archive
+        # Urls handed to the writer whose batch is not committed yet, with the function recording their crawl state (Run after the commit)
+        self._pending_stores: dict[str, Callable[[], None]|None] = {}
+        # Urls whose batch was rolled back
+        self._failed_stores: set[str] = set()
+        self._stores_lock = threading.Lock()
+        # Results of the batch being crawled
+        self._results: list[dict] = []
+
+    def run(self, urls: Iterable[str], lastmods: dict[str, str]|None=None) -> list[dict]:
+        """Crawl the given urls and block until all of them processed. Returns the Extractor.scrape result for every url"""
+        return asyncio.run(self.crawl(urls, lastmods))
+
+    def run_frontier(self, frontier: SQLiteFrontier, batch_size: int=config.FRONTIER_BATCH_SIZE) -> list[dict]:
+        """Crawl the pending urls of the frontier and block until none remains. Returns the Extractor.scrape result for every url"""
+        return asyncio.run(self.crawl_frontier(frontier, batch_size))
+
+    async def crawl_frontier(self, frontier: SQLiteFrontier, batch_size: int=config.FRONTIER_BATCH_SIZE) -> list[dict]:
+        """
+        Crawl the frontier batch by batch. Urls of a batch are marked done or failed only after the batch is crawled and its
+        products are stored, so an interrupted crawl loses at most one batch of work. All the batches run in the same pipeline
+        (Thread pool, parse processes and HTTP session are created once).
+        Args:
+            frontier (SQLiteFrontier): The durable frontier to crawl.
+            batch_size (int): Number of urls claimed at a time.
+        Returns:
+            list[dict]: Extractor.scrape result for every crawled url.
+        """
+        loop = asyncio.get_running_loop()
+        results: list[dict] = []
+        async with self._open_crawl() as (session, executor):
+            while True:
+                batch = await loop.run_in_executor(None, frontier.claim, batch_size)
+                if not batch:
+                    break
+                urls = list(dict.fromkeys(url for url, _ in batch))
+                lastmods = {url: lastmod for url, lastmod in batch if lastmod}
+                batch_results = await self._crawl_batch(urls, lastmods, session, executor)
+                outcomes: dict[str, dict] = {}
+                for result in batch_results:
+                    url = (result.get('data') or {}).get('url')
+                    if url:
+                        outcomes[url] = result
+                done: list[str] = []
+                failed: list[tuple[str, str]] = []
+                for url in urls:
+                    result = outcomes.get(url)
+                    # Urls without a result were skipped on purpose (For eg, disallowed by robots.txt)
+                    if result is not None and result.get('status') == 'error':
+                        failed.append((url, result.get('msg') or 'error'))
+                    else:
+                        done.append(url)
+                await loop.run_in_executor(None, frontier.finish, done, failed)
+                results.extend(batch_results)
+                logger.info(f'Frontier: {frontier.counts()}')
+        logger.info(f'Crawling finished. {len(results)} url(s) processed')
+        return results
+
+    async def crawl(self, urls: Iterable[str], lastmods: dict[str, str]|None=None) -> list[dict]:
+        """
+        Crawl the given urls concurrently.
+        Args:
+            urls (Iterable[str]): Product page urls to crawl.
+            lastmods (dict[str, str]|None): Sitemap lastmod of the urls (For eg, RobotsExtLinks.get_lastmods()). Used in incremental mode.
+        Returns:
+            list[dict]: Extractor.scrape result for every url (Same order as the urls are finished, not as they are given).
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            logger.warning('No url to crawl')
+            return []
+        async with self._open_crawl() as (session, executor):
+            results = await self._crawl_batch(urls, lastmods, session, executor)
+        logger.info(f'Crawling finished. {len(results)} url(s) processed')
+        return results
+
+    @contextlib.asynccontextmanager
+    async def _open_crawl(self) -> AsyncIterator[tuple[aiohttp.ClientSession, ThreadPoolExecutor]]:
+        """Open what the batches of a crawl share (Thread pool, parse processes and their pipeline stages, HTTP session, writer,
+        archive and crawl state) and close them after the last batch. Yields the session and the thread pool"""
+        with ThreadPoolExecutor(max_workers=self.executor_workers) as executor:
+            own_state = self.incremental and self.crawl_state is None
+            if own_state:
+                self.crawl_state = CrawlState()
+            if self.method == 'selenium':
+                self.driver_pool = DriverPool(size=min(self.concurrency, config.DRIVER_POOL_SIZE))
+            own_writer = self.writer is None
+            if own_writer:
+                self.writer = ProductWriter()
+            self.writer.add_listener(self._on_write)
+            own_archive = self.archive_pages and self.archive is None
+            if own_archive:
+                self.archive = HtmlArchive()
+            process_pool: ProcessPoolExecutor|None = None
+            if self.method != 'selenium' and self.parse_processes:
+                # spawn: forking a process that runs threads (thread pool, writer flusher) is not safe. The processes start on first use
+                process_pool = ProcessPoolExecutor(max_workers=self.parse_processes, mp_context=multiprocessing.get_context('spawn'))
+            try:
+                async with create_async_session(self.concurrency, self.timeout) as session:
+                    stages = self._start_pipeline(process_pool, executor) if process_pool else []
+                    try:
+                        yield session, executor
+                        await self._finish_pipeline(stages)
+                    finally:
+                        for stage in stages:
+                            stage.cancel()
+                        self._parse_queue = None
+                        self._write_queue = None
+            finally:
+                if process_pool:
+                    process_pool.shutdown(wait=True, cancel_futures=True)
+                if self.driver_pool:
+                    self.driver_pool.close()
+                    self.driver_pool = None
+                if own_writer:
+                    self.writer.close()
+                    self.writer.remove_listener(self._on_write)
+                    self.writer = None
+                else:
+                    self.writer.flush()
+                    self.writer.remove_listener(self._on_write)
+                # Only left after an interrupted batch, every finished batch settles its own products
+                self._settle_stores(self._results)
+                self._results = []
+                if own_archive:
+                    self.archive.close()
+                    self.archive = None
+                elif self.archive is not None:
+                    self.archive.flush()
+                # Written after the products, so a page is never marked as crawled before its data is stored
+                self._close_crawl_state(own_state)
+
+    async def _crawl_batch(self, urls: list[str], lastmods: dict[str, str]|None, session: aiohttp.ClientSession, executor: ThreadPoolExecutor) -> list[dict]:
+        """Crawl the urls in the opened pipeline and wait until their products are stored. Returns the Extractor.scrape result for every url"""
+        loop = asyncio.get_running_loop()
+        results: list[dict] = []
+        # The write stage adds the results of the pipeline to the current batch
+        self._results = results
+        if self.respect_robots:
+            urls = await self._apply_robots(urls, executor)
+        if self.incremental:
+            urls = await self._skip_unchanged(urls, lastmods or {}, executor, results)
+        if urls:
+            for url in urls:
+                self.scheduler.add(url)
+            logger.info(f'Start crawling {len(urls)} url(s) with concurrency {self.concurrency}')
+            workers = [
+                asyncio.create_task(self._worker(session, executor, results))
+                for _ in range(min(self.concurrency, len(urls)))
+            ]
+            await asyncio.gather(*workers)
+            await self._drain_pipeline()
+            # The results are final only when the products of the batch are committed
+            await loop.run_in_executor(executor, self.writer.flush)
+            self._settle_stores(results)
+        else:
+            logger.info('Nothing changed since the last crawl')
+        if self.crawl_state is not None:
+            await loop.run_in_executor(executor, self.crawl_state.flush)
+        return results
+
+    def _expect_store(self, url: str, record: Callable[[], None]|None=None) -> None:
+        """Remember that the product of the url is going to the writer. record (Its crawl state) runs only after its batch commits"""
+        with self._stores_lock:
+            self._pending_stores[url] = record
+            self._failed_stores.discard(url)
+
+    def _cancel_store(self, url: str) -> None:
+        """The product of the url is not going to the writer (For eg, its extraction failed)"""
+        with self._stores_lock:
+            self._pending_stores.pop(url, None)
+
+    def _on_write(self, urls: list[str], committed: bool) -> None:
+        """Writer listener: record the crawl state of the committed products, remember the rolled back ones"""
+        records: list[Callable[[], None]] = []
+        with self._stores_lock:
+            for url in urls:
+                if url not in self._pending_stores:
+                    continue
+                record = self._pending_stores.pop(url)
+                if not committed:
+                    self._failed_stores.add(url)
+                elif record is not None:
+                    records.append(record)
+        for record in records:
+            record()
+
+    def _settle_stores(self, results: list[dict]) -> None:
+        """After the last flush, turn the 'ok' results whose product was not stored (Batch rolled back or never reached the writer)
+        into errors, so they are neither recorded as crawled nor marked done in the frontier"""
+        with self._stores_lock:
+            unstored = self._failed_stores | set(self._pending_stores)
+            self._pending_stores.clear()
+            self._failed_stores.clear()
+        if not unstored:
+            return
+        logger.error(f'{len(unstored)} product(s) could not be stored')
+        for result in results:
+            url = (result.get('data') or {}).get('url')
+            if result.get('status') == 'ok' and url in unstored:
+                result['status'] = 'error'
+                result['msg'] = 'Product could not be stored'
+
+    def _start_pipeline(self, process_pool: ProcessPoolExecutor, executor: ThreadPoolExecutor) -> list[asyncio.Task]:
+        """Start the parse stages (One per process) and the writer stage. The fetchers feed them through self._parse_queue"""
+        self._parse_queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        parse_stages = [
+            asyncio.create_task(self._parse_stage(process_pool, write_queue))
+            for _ in range(self.parse_processes)
+        ]
+        write_stage = asyncio.create_task(self._write_stage(write_queue, executor))
+        self._write_queue = write_queue
+        return parse_stages + [write_stage]
+
+    async def _drain_pipeline(self) -> None:
+        """Wait until the stages processed every page queued so far. The stages keep running for the next batch"""
+        if self._parse_queue is None:
+            return
+        await self._parse_queue.join()
+        await self._write_queue.join()
+
+    async def _finish_pipeline(self, stages: list[asyncio.Task]) -> None:
+        """Let the stages process everything queued, then stop them"""
+        if not stages:
+            return
+        parse_stages, write_stage = stages[:-1], stages[-1]
+        for _ in parse_stages:
+            await self._parse_queue.put(None)
+        await asyncio.gather(*parse_stages)
+        await self._write_queue.put(None)
+        await write_stage
+
+    async def _parse_stage(self, process_pool: ProcessPoolExecutor, write_queue: asyncio.Queue) -> None:
+        """Parse the fetched pages in the process pool, one page at a time, and hand the results to the writer stage"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job: ParseJob|None = await self._parse_queue.get()
+            if job is None:
+                self._parse_queue.task_done()
+                return
+            try:
+                # Timed here because the metrics of the parse processes are not exposed
+                with stage_timer('parse', job.url) as timer:
+                    result = await loop.run_in_executor(process_pool, extract_product_data, job.url, job.html_body, config.PARSER_BACKEND)
+                    timer.status = result_status(result)
+            except Exception as e:
+                logger.error(f'Error in parsing "{job.url}": {e.__str__()}')
+                result = {'status': 'error', 'msg': e.__str__(), 'data': {'url': job.url}}
+            # Done only after the result is handed on, so a drained parse queue means everything reached the write queue
+            await write_queue.put((job, result))
+            self._parse_queue.task_done()
+
+    async def _write_stage(self, write_queue: asyncio.Queue, executor: ThreadPoolExecutor) -> None:
+        """The single stage that stores the parsed products (Through the batch writer) and adds their results to the current batch"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item: tuple[ParseJob, dict]|None = await write_queue.get()
+            if item is None:
+                write_queue.task_done()
+                return
+            job, result = item
+            url = (result.get('data') or {}).get('url') or job.url
+            try:
+                if result.get('status') == 'ok':
+                    record = functools.partial(self.crawl_state.record, job.url, job.status, job.headers, job.digest, job.lastmod) if self.incremental else None
+                    # Registered before add(), because add() may write the batch right away
+                    self._expect_store(url, record)
+                    if not await loop.run_in_executor(executor, self.writer.add, result['data']):
+                        logger.warning(f'No product inserted into/updated from product table: {job.url}')
+            except Exception as e:
+                # The stage must survive, the batch waits for every queued page
+                logger.error(f'Error in storing "{job.url}": {e.__str__()}')
+                self._cancel_store(url)
+                result = {'status': 'error', 'msg': e.__str__(), 'data': {'url': job.url}}
+            self._results.append(result)
+            write_queue.task_done()
+
+    async def _skip_unchanged(self, urls: list[str], lastmods: dict[str, str], executor: ThreadPoolExecutor, results: list[dict]) -> list[str]:
+        """Load the crawl state of the urls and drop the ones whose sitemap lastmod did not change since the last crawl"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, self.crawl_state.load, urls)
+        self._lastmods = lastmods
+        changed_urls: list[str] = []
+        for url in urls:
+            if self.crawl_state.is_unchanged(url, lastmods.get(url)):
+                results.append({'status': 'not_modified', 'msg': 'Sitemap lastmod not changed', 'data': {'url': url}})
+            else:
+                changed_urls.append(url)
+        if len(changed_urls) < len(urls):
+            logger.info(f'{len(urls) - len(changed_urls)} url(s) skipped because their sitemap lastmod not changed')
+        return changed_urls
+
+    def _close_crawl_state(self, own_state: bool) -> None:
+        """Write the recorded crawl state and close it if it created by the crawler"""
+        if self.crawl_state is None:
+            return
+        if own_state:
+            self.crawl_state.close()
+            self.crawl_state = None
+        else:
+            self.crawl_state.flush()
+
+    async def _apply_robots(self, urls: list[str], executor: ThreadPoolExecutor) -> list[str]:
+        """Fetch robots.txt of every host, set its Crawl-delay on the scheduler and drop the disallowed urls"""
+        loop = asyncio.get_running_loop()
+        if self.robots_cache is None:
+            self.robots_cache = RobotsCache()
+        origins: dict[str, str] = {}
+        for url in urls:
+            parts = urlsplit(url)
+            origins.setdefault(parts.netloc.lower(), f'{parts.scheme}://{parts.netloc}')
+        parsers = await asyncio.gather(*[
+            loop.run_in_executor(executor, self._fetch_robots, origin) for origin in origins.values()
+        ])
+        robots: dict[str, RobotsTxtParser] = dict(zip(origins.keys(), parsers))
+        for host, parser in robots.items():
+            self.scheduler.set_crawl_delay(host, parser.get_crawl_delay(config.USER_AGENT))
+        allowed_urls: list[str] = []
+        for url in urls:
+            parts = urlsplit(url)
+            path = parts.path + (f'?{parts.query}' if parts.query else '')
+            if robots[parts.netloc.lower()].is_allowed(config.USER_AGENT, path or '/'):
+                allowed_urls.append(url)
+            else:
+                logger.info(f'Url disallowed by robots.txt: {url}')
+        return allowed_urls
+
+    def _fetch_robots(self, origin: str) -> RobotsTxtParser:
+        """Get the parsed robots.txt of the origin from the shared cache, fetched only if not cached (Runs in the thread pool)"""
+        return self.robots_cache.get(origin)
+
+    async def _worker(self, session: aiohttp.ClientSession, executor: ThreadPoolExecutor, results: list[dict]) -> None:
+        """Take urls from the scheduler and process them one by one until all the urls crawled"""
+        while True:
+            url = await self.scheduler.get()
+            if url is None:
+                return
+            try:
+                result = await self._process(url, session, executor)
+                if result is not None:
+                    results.append(result)
+            except Exception as e:
+                logger.error(f'Error in crawling "{url}": {e.__str__()}')
+                results.append({'status': 'error', 'msg': e.__str__(), 'data': {'url': url}})
+
+    async def _process(self, url: str, session: aiohttp.ClientSession, executor: ThreadPoolExecutor) -> dict|None:
+        """Fetch a single url then extract and store its data in the thread pool (Or queue it for the parse stage). Returns None if the url is scheduled again or queued"""
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        if self.method == 'selenium':
+            # The page is fetched inside scrape, so the fingerprint of the page is checked there too
+            crawl_state = self.crawl_state if self.incremental else None
+            extractor = Extractor(url, method='selenium', driver_pool=self.driver_pool, writer=self.writer, crawl_state=crawl_state)
+            # The digest is known only after scrape, so it is read when the batch of the product commits
+            self._expect_store(url, (lambda: crawl_state.record(url, 200, digest=extractor.digest, lastmod=self._lastmods.get(url))) if crawl_state else None)
+            try:
+                result = await loop.run_in_executor(executor, extractor.scrape)
+            finally:
+                self.scheduler.report(url, latency=time.monotonic() - started_at)
+            if result.get('status') != 'ok':
+                self._cancel_store(url)
+            if self.archive is not None and result.get('status') == 'ok' and extractor.html_body:
+                await loop.run_in_executor(executor, self.archive.append, url, extractor.html_body, 200, None, extractor.digest)
+            if crawl_state is not None and result.get('status') == 'not_modified':
+                crawl_state.record(url, 200, digest=extractor.digest, lastmod=self._lastmods.get(url))
+            return result
+        request_headers = self.crawl_state.conditional_headers(url) if self.incremental else None
+        status, html_body, retry_after, response_headers = await self._fetch(url, session, request_headers)
+        latency = time.monotonic() - started_at
+        # No status: connection error or timeout (Transient, like throttling)
+        if (status is None or status in RETRY_STATUS_CODES) and self._retries.get(url, 0) < self.max_retries:
+            # Add the url again before reporting, so the scheduler never looks empty meanwhile
+            self._retries[url] = self._retries.get(url, 0) + 1
+            self.scheduler.add(url)
+            self.scheduler.report(url, latency=latency, status=status, retry_after=retry_after)
+            return None
+        # Not tried again, its retry count is not needed anymore
+        self._retries.pop(url, None)
+        self.scheduler.report(url, latency=latency, status=status, retry_after=retry_after)
+        lastmod = self._lastmods.get(url)
+        if self.incremental and status == 304:
+            self.crawl_state.record(url, 304, response_headers, lastmod=lastmod)
+            return {'status': 'not_modified', 'msg': 'Page not modified (304)', 'data': {'url': url}}
+        if not html_body:
+            return {'status': 'error', 'msg': f'Could not fetch the page (status: {status})', 'data': {'url': url}}
+        digest = None
+        if self.incremental:
+            digest = content_hash(html_body)
+            if self.crawl_state.is_same_content(url, digest):
+                self.crawl_state.record(url, status, response_headers, digest, lastmod)
+                return {'status': 'not_modified', 'msg': 'Page content not changed', 'data': {'url': url}}
+        if self.archive is not None:
+            # Compressed and written off the event loop
+            await loop.run_in_executor(executor, self.archive.append, url, html_body, status, response_headers, digest)
+        if self._parse_queue is not None:
+            # Parsed and stored by the next stages. Waits here while the parse queue is full (Backpressure on the fetchers)
+            await self._parse_queue.put(ParseJob(url, html_body, status, response_headers, digest, lastmod))
+            return None
+        record = functools.partial(self.crawl_state.record, url, status, response_headers, digest, lastmod) if self.incremental else None
+        self._expect_store(url, record)
+        extractor = Extractor(url, method='requests', html_body=html_body, writer=self.writer)
+        result = await loop.run_in_executor(executor, extractor.scrape)
+        if result.get('status') != 'ok':
+            self._cancel_store(url)
+        return result
+
+    async def _fetch(self, url: str, session: aiohttp.ClientSession, headers: dict[str, str]|None=None) -> tuple[int|None, str|None, float|None, dict[str, str]]:
+        """Fetch the page content (With conditional request headers if given). Returns response status, page content (None if not successful or not modified), Retry-After seconds and response headers"""
+        status = None
+        timer = stage_timer('fetch', url)
+        try:
+            with timer:
+                async with session.get(url, headers=headers) as response:
+                    status = response.status
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    response_headers = dict(response.headers)
+                    if response.status >= 400:
+                        timer.status = 'error'
+                        logger.error(f'Error fetching "{url}": status {response.status}')
+                        return response.status, None, retry_after, response_headers
+                    if response.status == 304:
+                        return response.status, None, retry_after, response_headers
+                    return response.status, await response.text(), retry_after, response_headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f'Error fetching "{url}": {e}')
+        finally:
+            count_response(url, status)
+        return None, None, None, {}
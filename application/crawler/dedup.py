@@ -0,0 +1,95 @@
+"""
+Memory-bounded tracking of the seen urls.
+SeenSet keeps an exact set while it is small and switches to a BloomFilter when it grows past a threshold, so memory stays
+bounded on sites with millions of urls at the cost of a small (configurable) false-positive rate.
+"""
+
+import hashlib
+import math
+from typing import Iterable
+import config
+
+
+class BloomFilter:
+    """Bloom filter over a bytearray using double hashing of a single blake2b digest"""
+    def __init__(self, capacity: int, error_rate: float=config.BLOOM_ERROR_RATE) -> None:
+        """
+        Args:
+            capacity (int): Expected number of items.
+            error_rate (float): False-positive rate when the filter holds capacity items.
+        """
+        capacity = max(1, capacity)
+        self.capacity: int = capacity
+        self.error_rate: float = error_rate
+        self.size: int = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count: int = max(1, round(self.size / capacity * math.log(2)))
+        self.bits: bytearray = bytearray((self.size + 7) // 8)
+        self.count: int = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> bool:
+        """Add the item. Returns True if the item was not (probably) in the filter"""
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            mask = 1 << bit
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class SeenSet:
+    """Set of seen items that is exact until threshold items, then a BloomFilter"""
+    def __init__(self, threshold: int=config.SEEN_SET_THRESHOLD, capacity: int=config.BLOOM_CAPACITY, error_rate: float=config.BLOOM_ERROR_RATE) -> None:
+        """
+        Args:
+            threshold (int): Number of items kept in the exact set before switching to the bloom filter.
+            capacity (int): Expected number of items of the bloom filter (At least 2 * threshold is used).
+            error_rate (float): False-positive rate of the bloom filter.
+        """
+        self.threshold: int = threshold
+        self.capacity: int = max(capacity, 2 * threshold)
+        self.error_rate: float = error_rate
+        self._exact: set[str]|None = set()
+        self._bloom: BloomFilter|None = None
+
+    @property
+    def is_exact(self) -> bool:
+        """False after switching to the bloom filter (Some unseen items may be reported as seen)"""
+        return self._bloom is None
+
+    def add(self, item: str) -> bool:
+        """Add the item. Returns True if the item was not seen before"""
+        if self._bloom is not None:
+            return self._bloom.add(item)
+        if item in self._exact:
+            return False
+        self._exact.add(item)
+        if len(self._exact) > self.threshold:
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            for seen in self._exact:
+                self._bloom.add(seen)
+            self._exact = None
+        return True
+
+    def __contains__(self, item: str) -> bool:
+        if self._bloom is not None:
+            return item in self._bloom
+        return item in self._exact
+
+    def __len__(self) -> int:
+        return len(self._bloom) if self._bloom is not None else len(self._exact)
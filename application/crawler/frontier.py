@@ -0,0 +1,109 @@
+"""
+This module provides SQLiteFrontier, a durable queue of the urls to crawl stored in the 'frontier' table next to the products.
+Urls are claimed in batches (pending -> in_flight) and marked done or failed only after their products are stored, so if the
+process dies the next run moves the in_flight urls back to pending and resumes exactly where it stopped. Every claim is stored
+with the owner of the frontier, so a restarted crawler takes back its own urls without touching the ones other crawlers hold. Failed urls are tried
+again until they reach max_attempts, and urls with higher priority are crawled first.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Iterable
+from application.database.sqlite import SQLiteDBInit, FrontierCRUD
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+class SQLiteFrontier:
+    """Durable url frontier with per-url state, retries and priority.\n
+    Usage:\n
+        frontier = SQLiteFrontier()
+        frontier.recover()
+        frontier.add(urls)
+        while batch := frontier.claim(100):
+            ...
+            frontier.finish(done_urls, failed_urls)
+    """
+    PENDING = FrontierCRUD.PENDING
+    IN_FLIGHT = FrontierCRUD.IN_FLIGHT
+    DONE = FrontierCRUD.DONE
+    FAILED = FrontierCRUD.FAILED
+
+    def __init__(self, db_file: str=config.FRONTIER_DB, max_attempts: int=config.FRONTIER_MAX_ATTEMPTS, lease_timeout: float=config.FRONTIER_LEASE_TIMEOUT, connection: sqlite3.Connection|None=None, owner: str=config.FRONTIER_OWNER) -> None:
+        """
+        Args:
+            db_file (str): The SQLite database file. Not used if connection is provided.
+            max_attempts (int): Number of times a url is tried before it is marked as failed.
+            lease_timeout (float): Seconds a claimed url belongs to its worker. After that other workers may claim it again.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+            owner (str): Name of the crawler stored on its claims. Crawlers using the frontier at the same time need different owners.
+        """
+        self.owner: str = owner
+        self.max_attempts: int = max(1, max_attempts)
+        self.lease_timeout: float = lease_timeout
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: FrontierCRUD = FrontierCRUD(self.connection)
+        self._lock = threading.Lock()
+
+    def add(self, urls: Iterable[str], priority: int=0, lastmods: dict[str, str]|None=None) -> bool:
+        """Add the urls as pending. Urls already in the frontier keep their state (Their priority only goes up)"""
+        lastmods = lastmods or {}
+        rows = [(url, priority, lastmods.get(url)) for url in dict.fromkeys(urls)]
+        if not rows:
+            return True
+        with self._lock:
+            return self.crud.add(rows)
+
+    def claim(self, limit: int) -> list[tuple[str, str|None]]:
+        """Take up to limit pending urls (Highest priority first). Returns their (url, lastmod)"""
+        with self._lock:
+            return self.crud.claim(max(1, limit), time.time() + self.lease_timeout, self.owner)
+
+    def finish(self, done: Iterable[str]=(), failed: Iterable[tuple[str, str]]=()) -> bool:
+        """
+        Record the result of the claimed urls.
+        Args:
+            done (Iterable[str]): Urls crawled successfully.
+            failed (Iterable[tuple[str, str]]): (url, error) of the urls that failed. They are pending again until max_attempts.
+        Returns:
+            bool: True if the states written.
+        """
+        with self._lock:
+            return self.crud.finish(list(done), list(failed), self.max_attempts)
+
+    def recover(self, expired_only: bool=False) -> int:
+        """Move the in_flight urls of a crashed run back to pending. With expired_only only the urls claimed by this owner (Left by
+        its crashed run) or whose lease expired are moved (Use it when other workers may be crawling the same frontier). Returns the
+        number of urls moved"""
+        with self._lock:
+            recovered = self.crud.recover(time.time() if expired_only else None, self.owner)
+        if recovered:
+            logger.info(f'{recovered} in-flight url(s) of an interrupted crawl moved back to pending')
+        return recovered
+
+    def counts(self) -> dict[str, int]:
+        """Return number of urls in every state"""
+        with self._lock:
+            counts = self.crud.counts()
+        return {state: counts.get(state, 0) for state in (self.PENDING, self.IN_FLIGHT, self.DONE, self.FAILED)}
+
+    def has_unfinished(self) -> bool:
+        """True if some urls are still pending or in flight (An interrupted crawl to be resumed)"""
+        counts = self.counts()
+        return bool(counts[self.PENDING] or counts[self.IN_FLIGHT])
+
+    def clear_finished(self) -> bool:
+        """Delete the done and failed urls, so they can be crawled again by a new crawl"""
+        with self._lock:
+            return self.crud.clear((self.DONE, self.FAILED))
+
+    def close(self) -> None:
+        """Close the connection if it opened by the frontier"""
+        if self._owns_connection and self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,142 @@
+"""
+This module provides the CrawlState class which lets the crawl engine re-crawl incrementally.
+What the last crawl saw for every url (sitemap lastmod, ETag, Last-Modified and hash of the page content) is kept in the 'crawl_state' table,
+so urls whose sitemap lastmod did not change are skipped, the rest are fetched with conditional requests (If-None-Match/If-Modified-Since)
+and pages answered with 304 or with the same content are neither parsed nor written again.
+"""
+
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable
+from application.database._resources import normalize_url
+from application.database.sqlite import SQLiteDBInit, CrawlStateCRUD
+from application.extractor.fingerprint import content_hash
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+# Status of a url whose last crawl was successful (So it is safe to skip it if nothing changed)
+SUCCESS_STATUS_CODES = (200, 304)
+
+
+class CrawlState:
+    """Per-url state of the previous crawls. States are loaded in bulk before the crawl and the new ones are written in batches.\n
+    Usage:\n
+        state = CrawlState()
+        state.load(urls)
+        if not state.is_unchanged(url, lastmod):
+            headers = state.conditional_headers(url)
+            ...
+            state.record(url, status, response_headers, content_hash(body), lastmod)
+        state.close()
+    """
+    def __init__(self, db_file: str=config.DB_FILE, batch_size: int=config.DB_BATCH_SIZE, connection: sqlite3.Connection|None=None) -> None:
+        """
+        Args:
+            db_file (str): The SQLite database file. Not used if connection is provided.
+            batch_size (int): Number of recorded states that triggers a write.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+        """
+        self.batch_size: int = max(1, batch_size)
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: CrawlStateCRUD = CrawlStateCRUD(self.connection)
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._pending: list[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def load(self, urls: Iterable[str]) -> None:
+        """Read the state of the urls from the database with a few bulk queries"""
+        urls = [normalize_url(url) for url in urls]
+        states = self.crud.get_states(urls)
+        with self._lock:
+            # Urls that never crawled are remembered too, so get does not look them up again
+            self._states.update({url: {} for url in urls})
+            self._states.update(states)
+        logger.info(f'Crawl state loaded for {len(states)} url(s)')
+
+    def get(self, url: str) -> Dict[str, Any]|None:
+        """Return the last known state of the url (None if the url never crawled). Urls not loaded before are read from the database"""
+        url = normalize_url(url)
+        with self._lock:
+            if url not in self._states:
+                self._states[url] = self.crud.get_states([url]).get(url) or {}
+            return self._states[url] or None
+
+    def is_unchanged(self, url: str, lastmod: str|None) -> bool:
+        """True if the url crawled successfully before and its sitemap lastmod is the same as the last crawl"""
+        state = self.get(url)
+        return bool(
+            lastmod and state
+            and state.get('sitemap_lastmod') == lastmod
+            and state.get('status') in SUCCESS_STATUS_CODES
+        )
+
+    def is_same_content(self, url: str, digest: str) -> bool:
+        """True if the page content has the same hash as the last successful crawl (For servers that send no validators)"""
+        state = self.get(url)
+        return bool(state and state.get('content_hash') == digest and state.get('status') in SUCCESS_STATUS_CODES)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Return If-None-Match/If-Modified-Since headers built from the validators of the last crawl"""
+        state = self.get(url)
+        headers: Dict[str, str] = {}
+        if not state or state.get('status') not in SUCCESS_STATUS_CODES:
+            return headers
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        return headers
+
+    def record(self, url: str, status: int|None, headers: Dict[str, str]|None=None, digest: str|None=None, lastmod: str|None=None) -> None:
+        """
+        Record the result of crawling the url. Unknown values (None) keep what is already stored.
+        Args:
+            url (str): The crawled url.
+            status (int|None): Response status (304 for a not modified page).
+            headers (Dict[str, str]|None): Response headers to take ETag and Last-Modified from.
+            digest (str|None): Hash of the page content.
+            lastmod (str|None): Sitemap lastmod of the url.
+        """
+        headers = headers or {}
+        state = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'sitemap_lastmod': lastmod,
+            'content_hash': digest,
+            'status': status,
+        }
+        with self._lock:
+            known = self._states.setdefault(normalize_url(url), {})
+            known.update({key: value for key, value in state.items() if key != 'url' and value is not None})
+            known['status'] = status
+            self._pending.append(state)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self) -> bool:
+        """Write all the recorded states in a single transaction. Returns True if nothing failed"""
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> bool:
+        """Write the recorded states. The caller must hold the lock"""
+        if not self._pending:
+            return True
+        rows, self._pending = self._pending, []
+        if self.crud.upsert_states(rows):
+            return True
+        logger.error(f'Failed to write crawl state of {len(rows)} url(s)')
+        return False
+
+    def close(self) -> None:
+        """Write the remaining states and close the connection if it opened by CrawlState"""
+        self.flush()
+        if self._owns_connection and self.connection is not None:
+            self.connection.close()
+            self.connection = None
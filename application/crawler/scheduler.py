@@ -0,0 +1,218 @@
+"""
+This module provides the HostScheduler class which sits between the url frontier and the fetchers of the crawl engine.
+Every host gets its own queue and token bucket, so fast hosts are crawled at full speed while slow or overloaded hosts are slowed down.
+The delay between two requests of a host starts from robots.txt Crawl-delay (or config.DEFAULT_CRAWL_DELAY) and adapts to the observed latency and 429/503 responses.
+"""
+
+import asyncio
+import time
+from collections import deque
+from urllib.parse import urlsplit
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+# Smoothing factor for the exponentially weighted moving average of the host latency
+LATENCY_EWMA_ALPHA = 0.3
+# Status codes that mean the host wants us to slow down
+THROTTLE_STATUS_CODES = (429, 503)
+# Upper limit of the backoff multiplier and the smallest delay used while a host is backed off
+MAX_BACKOFF = 64.0
+MIN_BACKOFF_DELAY = 0.5
+
+
+def get_host(url: str) -> str:
+    """Return the host (netloc) of the url in lower case"""
+    return urlsplit(url).netloc.lower()
+
+
+class TokenBucket:
+    """A token bucket which refills 'rate' tokens per second up to 'capacity' tokens. A rate of 0 means no limit"""
+    def __init__(self, rate: float, capacity: float=1.0) -> None:
+        self.rate: float = rate
+        self.capacity: float = max(1.0, capacity)
+        self.tokens: float = self.capacity
+        self.updated_at: float = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last refill"""
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        else:
+            self.tokens = self.capacity
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Return number of seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> bool:
+        """Take a token if available. Returns True if token consumed"""
+        if self.wait_time(now) > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class HostState:
+    """Politeness state of a single host"""
+    def __init__(self, host: str, base_delay: float, burst: float) -> None:
+        self.host: str = host
+        self.queue: deque[str] = deque()
+        self.base_delay: float = base_delay
+        self.backoff: float = 1.0
+        self.latency: float|None = None
+        self.in_flight: int = 0
+        self.blocked_until: float = 0.0
+        self.bucket: TokenBucket = TokenBucket(0.0, burst)
+
+
+class HostScheduler:
+    """Hand out urls to the fetchers while respecting per-host politeness.\n
+    Usage: add() urls, then every fetcher awaits get() to receive the next url that is allowed to be fetched now and calls report() when the fetch is done. get() returns None when all the urls have been crawled.\n"""
+    def __init__(self, default_delay: float=config.DEFAULT_CRAWL_DELAY, max_delay: float=config.MAX_CRAWL_DELAY, host_concurrency: int=config.HOST_CONCURRENCY, burst: float=1.0) -> None:
+        """
+        Args:
+            default_delay (float): Delay (in seconds) between two requests to the same host if no Crawl-delay is set for it.
+            max_delay (float): Upper limit of the adaptive delay.
+            host_concurrency (int): Maximum number of requests sent at the same time to a single host.
+            burst (float): Number of requests allowed to be sent back to back before the delay applies.
+        """
+        self.default_delay: float = default_delay
+        self.max_delay: float = max_delay
+        self.host_concurrency: int = max(1, host_concurrency)
+        self.burst: float = burst
+        self.hosts: dict[str, HostState] = {}
+        # Round robin order of hosts that have pending urls
+        self._ready_hosts: deque[str] = deque()
+        self._pending: int = 0
+        self._in_flight: int = 0
+        self._changed: asyncio.Event|None = None
+        self._loop: asyncio.AbstractEventLoop|None = None
+
+    def _get_state(self, host: str) -> HostState:
+        """Return the state of the host, create it if not exists"""
+        state = self.hosts.get(host)
+        if state is None:
+            state = HostState(host, self.default_delay, self.burst)
+            self.hosts[host] = state
+            self._update_rate(state)
+        return state
+
+    def _notify(self) -> None:
+        """Wake up fetchers waiting in get()"""
+        if self._changed is not None:
+            self._changed.set()
+
+    def add(self, url: str) -> None:
+        """Add url to the queue of its host"""
+        host = get_host(url)
+        state = self._get_state(host)
+        if not state.queue:
+            self._ready_hosts.append(host)
+        state.queue.append(url)
+        self._pending += 1
+        self._notify()
+
+    def set_crawl_delay(self, host: str, delay: float|None) -> None:
+        """Set the base delay of the host (For eg, Crawl-delay of robots.txt). None resets it to the default delay"""
+        state = self._get_state(host.lower())
+        state.base_delay = self.default_delay if delay is None else min(max(0.0, delay), self.max_delay)
+        self._update_rate(state)
+
+    def get_delay(self, host: str) -> float:
+        """Return the current delay (in seconds) between two requests of the host"""
+        return self._delay(self._get_state(host.lower()))
+
+    def _delay(self, state: HostState) -> float:
+        """Compute the current delay of the host from its base delay, latency and backoff"""
+        delay = state.base_delay
+        if state.latency is not None:
+            # Send no more requests than the host can answer with 'host_concurrency' parallel connections
+            delay = max(delay, state.latency / self.host_concurrency)
+        if state.backoff > 1:
+            delay = max(delay, MIN_BACKOFF_DELAY)
+        return min(delay * state.backoff, self.max_delay)
+
+    def _update_rate(self, state: HostState) -> None:
+        """Set the refill rate of the host token bucket from its current delay"""
+        delay = self._delay(state)
+        state.bucket.rate = 1 / delay if delay > 0 else 0.0
+
+    def report(self, url: str, latency: float|None=None, status: int|None=None, retry_after: float|None=None) -> None:
+        """
+        Report the result of fetching a url handed out by get(), so the delay of its host adapts.
+        Args:
+            url (str): The fetched url.
+            latency (float|None): Seconds taken to fetch the url.
+            status (int|None): HTTP status code of the response (None if no response received).
+            retry_after (float|None): Seconds the host asked us to wait (Retry-After header).
+        """
+        host = get_host(url)
+        state = self._get_state(host)
+        state.in_flight = max(0, state.in_flight - 1)
+        self._in_flight = max(0, self._in_flight - 1)
+        if latency is not None:
+            state.latency = latency if state.latency is None else (
+                LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * state.latency
+            )
+        if status in THROTTLE_STATUS_CODES:
+            state.backoff = min(state.backoff * 2, MAX_BACKOFF)
+            if retry_after:
+                state.blocked_until = max(state.blocked_until, time.monotonic() + min(retry_after, self.max_delay))
+            logger.warning(f'Host "{host}" answered {status}. Delay increased to {self._delay(state):.2f}s')
+        elif status is not None and status < 500:
+            # Recover slowly after the host stops throttling us
+            state.backoff = max(1.0, state.backoff * 0.75)
+        self._update_rate(state)
+        self._notify()
+
+    def _take(self, now: float) -> tuple[str|None, float|None]:
+        """Return a url allowed to be fetched now, or the seconds to wait until one is (None if no wait helps)"""
+        wait: float|None = None
+        for _ in range(len(self._ready_hosts)):
+            host = self._ready_hosts[0]
+            self._ready_hosts.rotate(-1)
+            state = self.hosts[host]
+            if state.in_flight >= self.host_concurrency:
+                continue
+            host_wait = state.blocked_until - now if state.blocked_until > now else state.bucket.wait_time(now)
+            if host_wait <= 0 and state.bucket.consume(now):
+                url = state.queue.popleft()
+                if not state.queue:
+                    # The host has just been rotated to the end of the round robin order
+                    self._ready_hosts.pop()
+                state.in_flight += 1
+                self._pending -= 1
+                self._in_flight += 1
+                return url, None
+            wait = host_wait if wait is None else min(wait, host_wait)
+        return None, wait
+
+    async def get(self) -> str|None:
+        """Wait until a url is allowed to be fetched and return it. Returns None when no url is pending and none is being fetched"""
+        loop = asyncio.get_running_loop()
+        if self._changed is None or self._loop is not loop:
+            self._changed = asyncio.Event()
+            self._loop = loop
+        while True:
+            if not self._pending and not self._in_flight:
+                return None
+            url, wait = self._take(time.monotonic())
+            if url is not None:
+                return url
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def pending(self) -> int:
+        """Return number of urls waiting to be fetched"""
+        return self._pending
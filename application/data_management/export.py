@@ -0,0 +1,200 @@
+"""
+Streaming export of the products table to JSONL, CSV or Parquet.
+Rows are read with fetchmany and written chunk by chunk, so the memory usage of an export stays the same for any catalog size.
+Incremental exports take only the products updated since the last export: pass the returned last_updated_at and last_id as since
+and after_id next time. Rows are ordered by (updated_at, id) and the next export starts strictly after that pair, so no row is
+exported twice although updated_at has a one second resolution. The rows of the second the export started in are left to the
+next export, because more rows of that second may still be written.
+The file is written next to its destination and renamed at the end, so consumers never read a half written export.
+Usage:
+    python -m application.data_management.export products.parquet --since "2024-01-01 00:00:00"
+    python -m application.data_management.export products.jsonl --since "2024-01-01 00:00:00" --after-id 1200
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from typing import Any, NamedTuple
+from application.database._resources import current_timestamp
+from application.database.sqlite import ProductsCRUD
+from application.data_management.manage_sqlite import get_db_connection
+from logger.logger import setup_logger
+import config
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+FORMATS = ('jsonl', 'csv', 'parquet')
+
+
+class ExportResult(NamedTuple):
+    """Number of exported rows, updated_at and id of the last one (The since and after_id of the next incremental export)"""
+    rows: int
+    last_updated_at: str|None
+    last_id: int|None
+
+
+class JsonlExporter:
+    """Write every row as a JSON object on its own line"""
+    def __init__(self, path: str) -> None:
+        self.file = open(path, 'w', encoding='utf-8', newline='\n')
+
+    def write(self, columns: list[str], rows: list[tuple]) -> None:
+        self.file.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class CsvExporter:
+    """Write the rows as CSV with a header line"""
+    def __init__(self, path: str) -> None:
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self._header_written: bool = False
+
+    def write(self, columns: list[str], rows: list[tuple]) -> None:
+        if not self._header_written:
+            self.writer.writerow(columns)
+            self._header_written = True
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetExporter:
+    """Write every chunk as a row group of a Parquet file (Requires pyarrow)"""
+    # Columns that are not stored as strings
+    COLUMN_TYPES: dict[str, str] = {'id': 'int64', 'price': 'float64'}
+
+    def __init__(self, path: str) -> None:
+        if pyarrow is None:
+            raise ImportError('pyarrow is required to export Parquet files (pip install pyarrow)')
+        self.path: str = path
+        self.writer = None
+        self.schema = None
+
+    def write(self, columns: list[str], rows: list[tuple]) -> None:
+        if self.writer is None:
+            self.schema = pyarrow.schema([(column, pyarrow.type_for_alias(self.COLUMN_TYPES.get(column, 'string'))) for column in columns])
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema, compression='snappy')
+        data = {column: [self._convert(column, row[i]) for row in rows] for i, column in enumerate(columns)}
+        self.writer.write_table(pyarrow.Table.from_pydict(data, schema=self.schema))
+
+    def _convert(self, column: str, value: Any) -> Any:
+        """Convert the SQLite value to the type of its column (SQLite columns may hold values of any type)"""
+        if value is None:
+            return None
+        column_type = self.COLUMN_TYPES.get(column, 'string')
+        try:
+            if column_type == 'int64':
+                return int(value)
+            if column_type == 'float64':
+                return float(value)
+        except (TypeError, ValueError):
+            return None
+        return f'{value}'
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        elif self.schema is None:
+            # No row exported, an empty file with no columns is written
+            pyarrow.parquet.write_table(pyarrow.table({}), self.path)
+
+
+EXPORTERS = {
+    'jsonl': JsonlExporter,
+    'csv': CsvExporter,
+    'parquet': ParquetExporter,
+}
+
+
+def detect_format(path: str) -> str:
+    """Return the export format from the extension of the file"""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    extension = {'json': 'jsonl', 'ndjson': 'jsonl', 'pq': 'parquet'}.get(extension, extension)
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot detect export format of {path}. Choose one of {FORMATS}")
+    return extension
+
+
+def export_products(path: str, export_format: str|None=None, since: str|None=None, chunk_size: int=config.EXPORT_CHUNK_SIZE, db_connection: sqlite3.Connection|None=None, after_id: int|None=None) -> ExportResult|None:
+    """
+    Export the products table into the file. The products updated in the current second are left to the next export.
+    Args:
+        path (str): Destination file.
+        export_format (str|None): 'jsonl', 'csv' or 'parquet'. Detected from the extension of the path if not given.
+        since (str|None): Only the products updated at or after this timestamp ('YYYY-MM-DD HH:MM:SS').
+        chunk_size (int): Number of rows read and written at a time.
+        db_connection (sqlite3.Connection|None): Connection to be used instead of the shared one.
+        after_id (int|None): With since, only the products after (since, after_id). The last_id of the previous export.
+    Returns:
+        ExportResult|None: Number of exported rows, updated_at and id of the last one. None if the export failed.
+    """
+    export_format = export_format or detect_format(path)
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Unknown export format: {export_format}. Choose one of {FORMATS}")
+    conn = db_connection or get_db_connection()
+    if conn is None:
+        logger.error('Error: Cannot connect to sqldb')
+        return None
+    temp_path = f'{path}.part'
+    exporter = None
+    rows_count = 0
+    last_updated_at = last_id = None
+    try:
+        exporter = EXPORTERS[export_format](temp_path)
+        products = ProductsCRUD(conn).iter_products(since=since, chunk_size=chunk_size, after_id=after_id, until=current_timestamp())
+        for columns, rows in products:
+            exporter.write(columns, rows)
+            rows_count += len(rows)
+            # Rows are ordered by (updated_at, id), so the last row of the last chunk is where the next export starts
+            last_updated_at, last_id = rows[-1][columns.index('updated_at')], rows[-1][columns.index('id')]
+        exporter.close()
+        exporter = None
+        os.replace(temp_path, path)
+        logger.info(f'{rows_count} product(s) exported into {path}')
+        return ExportResult(rows_count, last_updated_at, last_id)
+    except ImportError:
+        raise
+    except Exception as e:
+        logger.error(f'Cannot export products into {path}: {e.__str__()}')
+        return None
+    finally:
+        if exporter is not None:
+            exporter.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the products table')
+    parser.add_argument('path', help='Destination file (.jsonl, .csv or .parquet)')
+    parser.add_argument('--format', choices=FORMATS, help='Export format (Detected from the extension by default)')
+    parser.add_argument('--since', help="Only the products updated at or after this timestamp ('YYYY-MM-DD HH:MM:SS')")
+    parser.add_argument('--after-id', type=int, help='With --since, only the products after this id in that second (Printed by the previous export)')
+    parser.add_argument('--chunk-size', type=int, default=config.EXPORT_CHUNK_SIZE)
+    parser.add_argument('--db', default=config.DB_FILE, help='SQLite database file')
+    args = parser.parse_args()
+    result = export_products(args.path, args.format, args.since, args.chunk_size, get_db_connection(args.db), args.after_id)
+    if result is not None:
+        since, after_id = (result.last_updated_at, result.last_id) if result.rows else (args.since, args.after_id)
+        next_export = f'--since "{since or ""}"'
+        if since and after_id is not None:
+            next_export += f' --after-id {after_id}'
+        print(f'{result.rows} product(s) exported. Next incremental export: {next_export}')
+
+
+if __name__ == "__main__":
+    main()
@@ -3,42 +3,77 @@ Insert or Update product data extracted from e-commerce websites into SQLite dat
 """
 
 from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+from application.data_management.price_history import PriceTracker
 from logger.logger import setup_logger
+from logger.metrics import timed
 import sqlite3
+import threading
+import config
 
 
 logger = setup_logger('scraper.log', __name__)
 
 
-def upsert_product_data(product_data: dict, db_connection: sqlite3.Connection|None=None, update: bool=False, url: str='') -> bool:
+# A single long-lived connection per database file is shared by every caller. The lock serializes its usage between threads
+_connections: dict[str, sqlite3.Connection] = {}
+# Price tracker of every shared connection (Keeps the last known prices between the calls)
+_price_trackers: dict[sqlite3.Connection, PriceTracker] = {}
+_connection_lock = threading.RLock()
+
+
+def get_db_connection(db_file: str=config.DB_FILE) -> sqlite3.Connection|None:
+    """Return the shared connection of the database file. The database and its tables are initialized only on the first call"""
+    with _connection_lock:
+        conn = _connections.get(db_file)
+        if conn is None:
+            conn = SQLiteDBInit(db_file).connection
+            if conn is not None:
+                _connections[db_file] = conn
+        return conn
+
+
+def get_price_tracker(conn: sqlite3.Connection) -> PriceTracker:
+    """Return the price tracker of the shared connection, so the last known prices are kept between the calls"""
+    with _connection_lock:
+        tracker = _price_trackers.get(conn)
+        if tracker is None:
+            tracker = _price_trackers[conn] = PriceTracker(conn)
+        return tracker
+
+
+def close_db_connections() -> None:
+    """Close all the shared connections"""
+    with _connection_lock:
+        for conn in _connections.values():
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Error in closing database connection: {e}")
+        _connections.clear()
+        _price_trackers.clear()
+
+
+@timed('db_upsert', url_of=lambda product_data, *args, **kwargs: product_data.get('url'))
+def upsert_product_data(product_data: dict, db_connection: sqlite3.Connection|None=None, update: bool=True, url: str='') -> bool:
     """
-    Insert or update product data into the SQLite database. By default try to insert every product data found into database but if update argument is True, if the url currently is in the database try to update the data instead of inserting data. Returns True if successful.
+    Insert or update product data into the SQLite database with a single 'INSERT ... ON CONFLICT(url)' statement keyed on the normalized url. If update argument is False and the url currently is in the database the existing row is left untouched. Returns True if successful.
     Args:
         product_data (dict): Dictionary containing product details.
+        db_connection (sqlite3.Connection|None): Connection to be used instead of the shared one.
+        update (bool): Update the existing row of the url (default) or keep it.
     """
     logger.info("Try to insert-update data into database...")
     try:
-        conn = db_connection
-        if not conn:
-            db = SQLiteDBInit()
-            conn = db.connection
-            if conn is None:
-                logger.warning("\nFailed to create database connection.")
-                return False
-        pd = ProductsCRUD(conn)
-        if update:
-            product_set: set = pd.get_product(url=product_data['url'])
-            product_list: list = list(product_set)
-            if product_set:
-                if pd.update_product(product_data, product_list[1]):
-                    # logger.info(f'product_id({product_list[0]}) updated')
-                    logger.info(f'product_id({product_list[0]}) updated')
-                    return True
-        else:
-            # Insert new record into products
-            if pd.insert_product(product_data):
-                # logger.info(f"Inserted new product: {product_data}")
-                logger.info(f"Inserted new product: {product_data}")
+        conn = db_connection or get_db_connection()
+        if conn is None:
+            logger.warning("\nFailed to create database connection.")
+            return False
+        with _connection_lock:
+            pd = ProductsCRUD(conn)
+            # A connection of the caller has no tracker, so the last price is read from the database
+            price_tracker = PriceTracker(conn) if db_connection else get_price_tracker(conn)
+            if pd.upsert_product(product_data, update=update, price_tracker=price_tracker):
+                logger.info(f"Inserted-updated product: {product_data['url']}")
                 return True
         logger.warning(f"Failed to insert product into products table")
     except Exception as e:
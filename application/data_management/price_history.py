@@ -0,0 +1,107 @@
+"""
+Change-only price tracking. PriceTracker keeps the last known (price, currency, availability) of the products in memory, loads the
+missing ones lazily from the 'price_history' table and returns a history row only for the products whose values changed, so the
+table grows with the price changes instead of with the number of crawls.
+"""
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from application.database.sqlite import PriceHistoryCRUD
+from application.database._resources import current_timestamp, to_price
+import config
+
+
+# Marks a product without history in the cache (So it is not looked up in the database again)
+_NO_HISTORY = object()
+
+
+def normalize_availability(availability) -> str|None:
+    """Return the availability without the schema.org prefix ('https://schema.org/InStock' -> 'InStock')"""
+    if not availability:
+        return None
+    return f'{availability}'.rstrip('/').rsplit('/', 1)[-1].strip() or None
+
+
+def observed_values(product_data: dict) -> tuple[float|None, str|None, str|None]:
+    """Return (price, currency, availability) of the product data. A zero price means the price was not found"""
+    price = to_price(product_data.get('price'))
+    currency = product_data.get('currency') or None
+    return (price or None, f'{currency}'.strip().upper() if currency else None, normalize_availability(product_data.get('availability')))
+
+
+class PriceTracker:
+    """Detect the price changes of the products with an LRU cache of their last known values.\n
+    Usage:\n
+        tracker = PriceTracker(connection)
+        crud.upsert_products(products, price_tracker=tracker)
+    """
+    def __init__(self, connection: sqlite3.Connection, cache_size: int=config.PRICE_CACHE_SIZE) -> None:
+        """
+        Args:
+            connection (sqlite3.Connection): Connection of the database that holds the price_history table.
+            cache_size (int): Maximum number of products whose last values are kept in memory.
+        """
+        self.crud: PriceHistoryCRUD = PriceHistoryCRUD(connection)
+        self.cache_size: int = max(1, cache_size)
+        self._cache: OrderedDict[str, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def diff(self, products: list[tuple[str, dict]]) -> list[tuple]:
+        """
+        Return the history rows of the products whose values changed. The cache is not changed (Call update after the rows are
+        committed). Must be called inside the write transaction: the cache may be stale when other processes write the same
+        database, so a cached value that differs from the observation is read again from the database before a change is recorded.
+        A cached value equal to the observation is trusted (Unchanged products, the common case, are not read).
+        Args:
+            products (list[tuple[str, dict]]): (normalized url, product data) of the written products.
+        Returns:
+            list[tuple]: (url, price, currency, availability, observed_at) rows to be inserted.
+        """
+        with self._lock:
+            # Last values of the batch are taken out of the cache first, so a small cache never evicts them during the loop
+            last: dict[str, object] = {}
+            for url, _ in products:
+                if url in self._cache:
+                    self._cache.move_to_end(url)
+                    last[url] = self._cache[url]
+            changed = []
+            for url, product_data in products:
+                values = observed_values(product_data)
+                if url in last and last[url] != values and values != (None, None, None):
+                    changed.append(url)
+            last.update(self._load(changed + [url for url, _ in products if url not in last]))
+        observed_at = current_timestamp()
+        rows = []
+        for url, product_data in products:
+            values = observed_values(product_data)
+            if values == (None, None, None):
+                continue
+            # A url may be repeated in the batch, so it is compared with its latest value within the batch
+            if last.get(url, _NO_HISTORY) != values:
+                rows.append((url, *values, observed_at))
+                last[url] = values
+        return rows
+
+    def update(self, rows: list[tuple]) -> None:
+        """Make the committed history rows the last known values"""
+        with self._lock:
+            for url, price, currency, availability, _ in rows:
+                self._remember(url, (price, currency, availability))
+
+    def _load(self, urls: list[str]) -> dict[str, object]:
+        """Load the last values of the urls from the database and cache them"""
+        if not urls:
+            return {}
+        urls = list(dict.fromkeys(urls))
+        values = self.crud.last_values(urls)
+        loaded = {url: values.get(url, _NO_HISTORY) for url in urls}
+        for url, value in loaded.items():
+            self._remember(url, value)
+        return loaded
+
+    def _remember(self, url: str, values: object) -> None:
+        self._cache[url] = values
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
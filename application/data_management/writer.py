@@ -0,0 +1,125 @@
+"""
+Batch writer for product data. Instead of committing every product on its own, rows are buffered and upserted with executemany
+in a single transaction when the batch is full or the flush interval passed.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+from application.data_management.price_history import PriceTracker
+from logger.logger import setup_logger
+from logger.metrics import stage_timer
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+class ProductWriter:
+    """A long-lived, thread-safe writer that owns one database connection and stores products in batches.\n
+    Usage:\n
+        with ProductWriter() as writer:
+            writer.add(product_data)
+    """
+    def __init__(self, db_file: str=config.DB_FILE, batch_size: int=config.DB_BATCH_SIZE, flush_interval: float=config.DB_FLUSH_INTERVAL, connection: sqlite3.Connection|None=None) -> None:
+        """
+        Args:
+            db_file (str): The SQLite database file. Not used if connection is provided.
+            batch_size (int): Number of buffered rows that triggers a flush.
+            flush_interval (float): Maximum seconds a row waits in the buffer. 0 disables the background flusher.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+        """
+        self.batch_size: int = max(1, batch_size)
+        self.flush_interval: float = flush_interval
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: ProductsCRUD = ProductsCRUD(self.connection)
+        self.price_tracker: PriceTracker = PriceTracker(self.connection)
+        self.written: int = 0
+        # Called with the urls of every written batch and whether the batch was committed (See add_listener)
+        self._listeners: list[Callable[[list[str], bool], None]] = []
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()
+        self._last_flush: float = time.monotonic()
+        self._stop = threading.Event()
+        self._flusher: threading.Thread|None = None
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='ProductWriterFlusher', daemon=True)
+            self._flusher.start()
+
+    def __enter__(self) -> 'ProductWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def add(self, product_data: dict) -> bool:
+        """Buffer the product data to be written. Flushes the buffer if it is full. Returns False if the writer has no connection"""
+        if self.connection is None:
+            logger.error('Error: Cannot connect to sqldb')
+            return False
+        with self._lock:
+            self._buffer.append(product_data)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+        return True
+
+    def add_listener(self, listener: Callable[[list[str], bool], None]) -> None:
+        """Call listener(urls, committed) after every batch is written or rolled back. A product counts as stored only after its
+        batch committed, not when add() returns (For eg, the crawl state of a page is recorded only then)"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[list[str], bool], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def flush(self) -> bool:
+        """Write all the buffered rows in a single transaction. Returns True if nothing failed"""
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> bool:
+        """Write the buffer. The caller must hold the lock"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return True
+        rows, self._buffer = self._buffer, []
+        with stage_timer('db_flush') as timer:
+            written = self.crud.upsert_products(rows, price_tracker=self.price_tracker)
+            timer.status = 'ok' if written else 'error'
+        self._notify([row.get('url') for row in rows], written)
+        if written:
+            self.written += len(rows)
+            logger.info(f'{len(rows)} product(s) written into products table')
+            return True
+        logger.error(f'Failed to write {len(rows)} product(s) into products table')
+        return False
+
+    def _notify(self, urls: list[str], committed: bool) -> None:
+        """Tell the listeners about the written batch. A failing listener never fails the writer"""
+        for listener in list(self._listeners):
+            try:
+                listener(urls, committed)
+            except Exception as e:
+                logger.error(f'Error in writer listener: {e.__str__()}')
+
+    def _flush_periodically(self) -> None:
+        """Background loop that flushes rows waiting longer than flush_interval"""
+        while not self._stop.wait(self.flush_interval / 2):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def close(self) -> None:
+        """Flush the remaining rows, stop the background flusher and close the connection if it opened by the writer"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        if self._owns_connection and self.connection is not None:
+            self.connection.close()
+            self.connection = None
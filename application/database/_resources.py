@@ -1,4 +1,11 @@
+import ast
+import json
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote, unquote
+
+
+# Query parameters that only track the visitor and never change the product page
+TRACKING_PARAMETERS = ('utm_', 'fbclid', 'gclid', 'yclid', 'mc_cid', 'mc_eid')
 
 
 def current_timestamp() -> str:
@@ -8,3 +15,63 @@ def current_timestamp() -> str:
     # iso_time = current_time.isoformat()
     # String format
     return current_time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def normalize_url(url: str) -> str:
+    """Return the canonical form of the url used as the unique key of a product.\n
+    Scheme and host are lower-cased, default ports, fragment, tracking query parameters and the trailing slash are removed,
+    percent-encoding is made uniform and the query parameters are sorted."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)) else None
+    netloc = f'{host}:{port}' if port else host
+    path = quote(unquote(parts.path), safe="/:@!$&'()*+,;=-._~") or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMETERS)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def to_price(value) -> float|None:
+    """Return the price as float (Stored in the REAL price column). None if it is not a number"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(f'{value}'.replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def to_list(value) -> list[str]:
+    """Return images or categories as a list of strings. Accepts a list, a JSON array or the Python repr strings stored by
+    older versions ("['a.jpg', 'b.jpg']"). Empty values and 'N/A' give an empty list"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if not text or text == 'N/A':
+            return []
+        if text[0] in '[(':
+            for parse in (json.loads, ast.literal_eval):
+                try:
+                    value = parse(text)
+                    break
+                except (ValueError, SyntaxError):
+                    continue
+            else:
+                return [text]
+        else:
+            return [text]
+    if isinstance(value, (list, tuple, set)):
+        return [f'{item}'.strip() for item in value if item is not None and f'{item}'.strip()]
+    return [f'{value}']
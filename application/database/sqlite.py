@@ -1,33 +1,74 @@
+import json
 import sqlite3
 from sqlite3 import Error
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 from logger.logger import setup_logger
-from ._resources import current_timestamp
+from ._resources import current_timestamp, normalize_url, to_price, to_list
+import config
 
 
 logger = setup_logger('scraper.log', __name__)
 
 
+# Pragmas applied to every connection. WAL lets readers work while a writer commits and synchronous=NORMAL
+# avoids an fsync per transaction (still safe in WAL mode, only the last commits can be lost on power failure).
+CONNECTION_PRAGMAS: tuple[str, ...] = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA foreign_keys=ON',
+)
+
+
+# Columns of the 'products' table. Formatted with the table name because migrate_product_table builds a copy of it
+PRODUCTS_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        url TEXT,
+                        title TEXT,
+                        price REAL,
+                        description TEXT,
+                        images TEXT,
+                        name TEXT,
+                        company_name TEXT,
+                        category TEXT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    );'''
+
+
 class SQLiteDBInit:
     """Initialize the SQLite database and create the necessary tables."""
-    def __init__(self, db_file: str = "scraped_data.db") -> None:
+    def __init__(self, db_file: str = config.DB_FILE) -> None:
         """
         Initialize the SQLiteDBInit instance.
         Args:
-            db_file (str): The filename for the SQLite database. Defaults to 'scraped_data.db'.
+            db_file (str): The filename for the SQLite database. Defaults to config.DB_FILE.
         """
         self.db_file: str = db_file
         self.connection: Optional[sqlite3.Connection] = self.create_connection()
         self.create_product_table()
+        self.create_product_detail_tables()
+        self.migrate_product_table()
+        self.create_product_indexes()
+        self.create_crawl_state_table()
+        self.create_robots_cache_table()
+        self.create_frontier_table()
+        self.create_price_history_table()
+        self.create_archive_index_table()
 
     def create_connection(self) -> Optional[sqlite3.Connection]:
         """
-        Establish a connection to the SQLite database.
+        Establish a connection to the SQLite database. The connection is tuned with CONNECTION_PRAGMAS and can be shared
+        between threads (callers must serialize its usage).
         Returns:
             Optional[sqlite3.Connection]: The database connection object if successful, otherwise None.
         """
         try:
-            conn = sqlite3.connect(self.db_file)
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
             return conn
         except Error as e:
             logger.info(f"Database connection error: {e}")
@@ -37,32 +78,284 @@ class SQLiteDBInit:
         """
         Create the 'products' table in the database if it does not already exist.
         The table stores product information such as URL, title, price, description, images,
-        name, company name, and category.
+        name, company name, and category. Images and categories are kept as JSON arrays here and one row per item
+        in the 'product_images' and 'product_categories' tables.
         Returns:
             None
         """
         try:
             if self.connection is not None:
-                sql = '''CREATE TABLE IF NOT EXISTS products (
-                        id INTEGER PRIMARY KEY,
-                        url TEXT,
-                        title TEXT,
-                        price TEXT,
-                        description TEXT,
-                        images TEXT,
-                        name TEXT,
-                        company_name TEXT,
-                        category TEXT,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                self.connection.execute(PRODUCTS_TABLE_SQL.format(table='products'))
+                self.connection.commit()
+        except Error as e:
+            logger.info(f"Error creating table: {e}")
+
+    def create_product_detail_tables(self) -> None:
+        """
+        Create the 'product_images' and 'product_categories' tables (One row per image and category of a product) and the
+        index used to find the products of a category.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                self.connection.execute('''CREATE TABLE IF NOT EXISTS product_images (
+                        product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+                        position INTEGER NOT NULL,
+                        url TEXT NOT NULL,
+                        PRIMARY KEY (product_id, position)
+                    );''')
+                self.connection.execute('''CREATE TABLE IF NOT EXISTS product_categories (
+                        product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+                        position INTEGER NOT NULL,
+                        name TEXT NOT NULL,
+                        PRIMARY KEY (product_id, position)
+                    );''')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_product_categories_name ON product_categories(name, product_id)')
+                self.connection.commit()
+        except Error as e:
+            logger.info(f"Error creating table: {e}")
+
+    def migrate_product_table(self) -> None:
+        """
+        Rebuild the 'products' table of databases created before price became a REAL column. Prices are converted to numbers,
+        images and categories (Python repr strings) to JSON arrays and copied into the detail tables. The table is rebuilt
+        (create, copy, drop, rename) in a single transaction because SQLite cannot change the type of a column.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is None:
+                return
+            columns = {row[1]: row[2] for row in self.connection.execute('PRAGMA table_info(products)')}
+            if columns.get('price', '').upper() == 'REAL':
+                return
+            # Foreign keys must be off while the parent table is dropped and renamed (No-op inside a transaction)
+            self.connection.execute('PRAGMA foreign_keys=OFF')
+            try:
+                self.connection.execute('BEGIN')
+                self.connection.execute('DROP TABLE IF EXISTS products_new')
+                self.connection.execute(PRODUCTS_TABLE_SQL.format(table='products_new'))
+                self.connection.execute('DELETE FROM product_images')
+                self.connection.execute('DELETE FROM product_categories')
+                cur = self.connection.execute(
+                    'SELECT id, url, title, price, description, images, name, company_name, category, created_at, updated_at FROM products'
+                )
+                migrated = 0
+                while rows := cur.fetchmany(1000):
+                    converted = [
+                        (row[0], row[1], row[2], to_price(row[3]), row[4], to_list(row[5]), row[6], row[7], to_list(row[8]), row[9], row[10])
+                        for row in rows
+                    ]
+                    self.connection.executemany('INSERT INTO products_new VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+                        row[:5] + (json.dumps(row[5], ensure_ascii=False),) + row[6:8] + (json.dumps(row[8], ensure_ascii=False),) + row[9:]
+                        for row in converted
+                    ])
+                    ProductsCRUD.write_details(self.connection, {row[0]: (row[5], row[8]) for row in converted})
+                    migrated += len(rows)
+                self.connection.execute('DROP TABLE products')
+                self.connection.execute('ALTER TABLE products_new RENAME TO products')
+                self.connection.commit()
+                logger.info(f'{migrated} product row(s) migrated to the typed products table')
+            except Error:
+                self.connection.rollback()
+                raise
+            finally:
+                self.connection.execute('PRAGMA foreign_keys=ON')
+        except Error as e:
+            logger.info(f"Error migrating products table: {e}")
+
+    def create_product_indexes(self) -> None:
+        """
+        Create the unique index of the 'products' table on the normalized url, so upserts and url lookups are indexed.
+        Databases created before the index existed are migrated first: urls are normalized and duplicate rows
+        (left by older crawls) are removed keeping the most recent row of every url.
+        The index on updated_at serves the incremental exports and the one on price the price range queries.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is None:
+                return
+            with self.connection:
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products(updated_at, id)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)')
+            exists = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_products_url'"
+            ).fetchone()
+            if exists:
+                return
+            with self.connection:
+                rows = self.connection.execute('SELECT id, url FROM products').fetchall()
+                changed = [(normalize_url(url), product_id) for product_id, url in rows if url and normalize_url(url) != url]
+                if changed:
+                    self.connection.executemany('UPDATE products SET url = ? WHERE id = ?', changed)
+                removed = self.connection.execute(
+                    'DELETE FROM products WHERE id NOT IN (SELECT MAX(id) FROM products GROUP BY url)'
+                ).rowcount
+                if removed:
+                    logger.info(f'{removed} duplicate product row(s) removed before creating url index')
+                self.connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_products_url ON products(url)')
+        except Error as e:
+            logger.info(f"Error creating index: {e}")
+
+    def create_crawl_state_table(self) -> None:
+        """
+        Create the 'crawl_state' table in the database if it does not already exist.
+        The table stores what the last crawl of every url saw: HTTP validators (ETag, Last-Modified), sitemap lastmod,
+        hash of the page content and status, so the next crawl can skip unchanged pages.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                sql = '''CREATE TABLE IF NOT EXISTS crawl_state (
+                        url TEXT PRIMARY KEY,
+                        etag TEXT,
+                        last_modified TEXT,
+                        sitemap_lastmod TEXT,
+                        content_hash TEXT,
+                        status INTEGER,
+                        fetched_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    );'''
+                self.connection.execute(sql)
+                self.connection.commit()
+        except Error as e:
+            logger.info(f"Error creating table: {e}")
+
+    def create_robots_cache_table(self) -> None:
+        """
+        Create the 'robots_cache' table in the database if it does not already exist.
+        The table keeps the fetched robots.txt of every origin until it expires, so all the workers (even in other processes)
+        share one fetch. lease_until lets a single worker fetch an expired robots.txt while the others wait for it.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                sql = '''CREATE TABLE IF NOT EXISTS robots_cache (
+                        origin TEXT PRIMARY KEY,
+                        status INTEGER,
+                        content TEXT,
+                        fetched_at REAL,
+                        expires_at REAL NOT NULL DEFAULT 0,
+                        lease_until REAL NOT NULL DEFAULT 0
+                    );'''
+                self.connection.execute(sql)
+                self.connection.commit()
+        except Error as e:
+            logger.info(f"Error creating table: {e}")
+
+    def create_frontier_table(self) -> None:
+        """
+        Create the 'frontier' table (Durable queue of the urls to crawl) and its index if they do not already exist.
+        Every url has a state ('pending', 'in_flight', 'done' or 'failed'), priority and number of attempts, so an interrupted
+        crawl resumes where it stopped.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                sql = '''CREATE TABLE IF NOT EXISTS frontier (
+                        url TEXT PRIMARY KEY,
+                        fetch_url TEXT NOT NULL,
+                        state TEXT NOT NULL DEFAULT 'pending',
+                        priority INTEGER NOT NULL DEFAULT 0,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        lastmod TEXT,
+                        last_error TEXT,
+                        lease_until REAL NOT NULL DEFAULT 0,
+                        owner TEXT,
                         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
                     );'''
                 self.connection.execute(sql)
+                # Frontiers created before the claims had an owner
+                columns = {row[1] for row in self.connection.execute('PRAGMA table_info(frontier)')}
+                if 'owner' not in columns:
+                    self.connection.execute('ALTER TABLE frontier ADD COLUMN owner TEXT')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_frontier_next ON frontier(state, priority DESC)')
+                self.connection.commit()
+        except Error as e:
+            logger.info(f"Error creating table: {e}")
+
+    def create_price_history_table(self) -> None:
+        """
+        Create the 'price_history' table in the database if it does not already exist.
+        A row is written only when the price, currency or availability of a product changed since its previous row.
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                sql = '''CREATE TABLE IF NOT EXISTS price_history (
+                        id INTEGER PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        price REAL,
+                        currency TEXT,
+                        availability TEXT,
+                        observed_at DATETIME NOT NULL
+                    );'''
+                self.connection.execute(sql)
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_price_history_url ON price_history(url, observed_at)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_price_history_observed_at ON price_history(observed_at)')
+                self.connection.commit()
+        except Error as e:
+            logger.info(f"Error creating table: {e}")
+
+    def create_archive_index_table(self) -> None:
+        """
+        Create the 'archive_index' table in the database if it does not already exist.
+        Every row points to a record of the raw HTML archive (Segment file, offset and length of the compressed record).
+        Returns:
+            None
+        """
+        try:
+            if self.connection is not None:
+                sql = '''CREATE TABLE IF NOT EXISTS archive_index (
+                        id INTEGER PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        segment TEXT NOT NULL,
+                        offset INTEGER NOT NULL,
+                        length INTEGER NOT NULL,
+                        digest TEXT,
+                        archived_at DATETIME NOT NULL
+                    );'''
+                self.connection.execute(sql)
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_archive_index_url ON archive_index(url, id)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS idx_archive_index_archived_at ON archive_index(archived_at)')
                 self.connection.commit()
         except Error as e:
             logger.info(f"Error creating table: {e}")
 
 
 class ProductsCRUD:
+    INSERT_SQL = """INSERT INTO products (
+                url, title, price, description, images, name, company_name, category, created_at, updated_at
+                )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"""
+    # Insert the product or update the existing row of the same url (created_at of the existing row is kept)
+    UPSERT_SQL = """INSERT INTO products (
+                url, title, price, description, images, name, company_name, category, created_at, updated_at
+                )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    price = excluded.price,
+                    description = excluded.description,
+                    images = excluded.images,
+                    name = excluded.name,
+                    company_name = excluded.company_name,
+                    category = excluded.category,
+                    updated_at = excluded.updated_at;"""
+    # Insert the product only if its url does not exist
+    INSERT_IGNORE_SQL = """INSERT INTO products (
+                url, title, price, description, images, name, company_name, category, created_at, updated_at
+                )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO NOTHING;"""
+    # Maximum number of parameters in a single 'IN (...)' lookup
+    CHUNK_SIZE = 500
+
     def __init__(self, connection: sqlite3.Connection) -> None:
         self.conn: sqlite3.Connection = connection
         # TODO: Get database name from database connection
@@ -88,12 +381,51 @@ class ProductsCRUD:
             logger.info(f'Cannot list products from products table: {e.__str__()}')
         return products
 
-    def get_product(self, product_id: int=0, url: str='') -> set:
-        """Get product by product_id or url. If not found product or run into any problem return empty set
+    def iter_products(self, since: str|None=None, chunk_size: int=1000, after_id: int|None=None, until: str|None=None) -> Iterator[tuple[list[str], list[tuple]]]:
+        """Stream the products table in chunks with fetchmany, so memory usage does not depend on the size of the table
         Args:
-            product_id (int): _description_
+            since (str|None): Only the products updated at or after this timestamp ('YYYY-MM-DD HH:MM:SS').
+            chunk_size (int): Number of rows fetched at a time.
+            after_id (int|None): With since, only the products after (since, after_id) in the (updated_at, id) order. The
+                timestamps have a one second resolution, the id tells apart the rows of the same second.
+            until (str|None): Only the products updated before this timestamp.
+        Yields:
+            tuple[list[str], list[tuple]]: Column names and the rows of the chunk (Ordered by updated_at and id).
+        """
+        if not self.conn:
+            logger.error(f'Error: Cannot connect to "{self}"')
+            return
+        conditions: list[str] = []
+        params: list = []
+        if since and after_id is not None:
+            conditions.append("(updated_at > ? OR (updated_at = ? AND id > ?))")
+            params += [since, since, after_id]
+        elif since:
+            conditions.append("updated_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("updated_at < ?")
+            params.append(until)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"SELECT * FROM products{where} ORDER BY updated_at, id", params)
+            columns = [column[0] for column in cur.description]
+            while True:
+                rows = cur.fetchmany(max(1, chunk_size))
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            cur.close()
+
+    def get_product(self, product_id: int=0, url: str='') -> tuple|set:
+        """Get product by product_id or url (Both lookups use an index). If not found product or run into any problem return empty set
+        Args:
+            product_id (int): Id of the product.
+            url (str): Url of the product. Normalized before lookup.
         Returns:
-            set: _description_
+            tuple|set: The product row or empty set
         """
         try:
             product_data = set()
@@ -105,11 +437,10 @@ class ProductsCRUD:
                 return product_data
             cur = self.conn.cursor()
             if product_id:
-                sql = f"""SELECT * FROM products WHERE id={product_id}"""
+                cur.execute("""SELECT * FROM products WHERE id = ?""", (product_id,))
             elif url:
-                sql = f"""SELECT * FROM products WHERE url={url}"""
-            cur.execute(sql)
-            product_data = cur.fetchone()
+                cur.execute("""SELECT * FROM products WHERE url = ?""", (normalize_url(url),))
+            product_data = cur.fetchone() or set()
             self.conn.commit()
             cur.close()
         except Exception as e:
@@ -125,27 +456,168 @@ class ProductsCRUD:
             if not self.conn:
                 logger.error(f'Error: Cannot connect to sqldb')
                 return False
-            cur = self.conn.cursor()
-            sql = f"""INSERT INTO products (
-                url, title, price, description, images, company_name, created_at, updated_at
-                )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?);"""
-            cur.execute(sql, (
-                f"{product_data['url']}",
-                f"{product_data['title']}",
-                product_data['price'],
-                f"{product_data['description']}",
-                f"{product_data['images']}",
-                f"{product_data['company_name']}",
-                f"{current_timestamp()}",
-                f"{current_timestamp()}"
-            ))
-            self.conn.commit()
-            cur.close()
+            with self.conn:
+                cur = self.conn.execute(self.INSERT_SQL, self._product_row(product_data))
+                self.write_details(self.conn, {cur.lastrowid: self._product_details(product_data)})
             return True
         except Exception as e:
             logger.error(f'Cannot insert product data into products table: {e.__str__()}')
             return False
+
+    def upsert_product(self, product_data: dict, update: bool=True, price_tracker=None) -> bool:
+        """Insert product data or update the existing row of the same url with a single statement
+        Args:
+            product_data (dict): Product data dictionary (Same format as insert_product).
+            update (bool): If False the existing row of the url is left untouched.
+            price_tracker (PriceTracker|None): Records the price change of the product if given.
+        Returns:
+            bool: True if the statement succeeded
+        """
+        return self.upsert_products([product_data], update=update, price_tracker=price_tracker)
+
+    def upsert_products(self, products_data: list[dict], update: bool=True, price_tracker=None) -> bool:
+        """Insert or update many products in a single transaction
+        Args:
+            products_data (list[dict]): Product data dictionaries (Same format as insert_product).
+            update (bool): If False the existing rows of the urls are left untouched.
+            price_tracker (PriceTracker|None): If given, the price changes of the written products are added to the
+                price_history table in the same transaction.
+        Returns:
+            bool: True if all the rows written, False if the transaction rolled back
+        """
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            if not products_data:
+                return True
+            rows = [self._product_row(product_data) for product_data in products_data]
+            # Images and categories of every url (The last one wins if a url is repeated in the batch)
+            details = {row[0]: self._product_details(product_data) for row, product_data in zip(rows, products_data)}
+            with self.conn:
+                existing = set() if update else set(self._product_ids(list(details)))
+                self.conn.executemany(self.UPSERT_SQL if update else self.INSERT_IGNORE_SQL, rows)
+                # Detail rows of the existing products are left untouched if they are not updated
+                ids = self._product_ids([url for url in details if url not in existing])
+                self.write_details(self.conn, {ids[url]: details[url] for url in ids})
+                changes = []
+                if price_tracker is not None:
+                    changes = price_tracker.diff([(row[0], product_data) for row, product_data in zip(rows, products_data) if row[0] not in existing])
+                    PriceHistoryCRUD(self.conn).insert(changes)
+            if changes:
+                # The cache is updated only after the transaction committed
+                price_tracker.update(changes)
+            return True
+        except Exception as e:
+            logger.error(f'Cannot upsert {len(products_data)} products into products table: {e.__str__()}')
+            return False
+
+    @staticmethod
+    def _product_row(product_data: dict) -> tuple:
+        """Convert product data dictionary into the parameters of INSERT_SQL"""
+        timestamp = current_timestamp()
+        images, categories = ProductsCRUD._product_details(product_data)
+        return (
+            normalize_url(f"{product_data['url']}"),
+            f"{product_data['title']}",
+            to_price(product_data['price']),
+            f"{product_data['description']}",
+            json.dumps(images, ensure_ascii=False),
+            f"{product_data.get('name', 'N/A')}",
+            f"{product_data['company_name']}",
+            json.dumps(categories, ensure_ascii=False),
+            f"{timestamp}",
+            f"{timestamp}"
+        )
+
+    @staticmethod
+    def _product_details(product_data: dict) -> tuple[list[str], list[str]]:
+        """Return the images and categories of the product data as lists"""
+        return to_list(product_data.get('images')), to_list(product_data.get('category'))
+
+    def _product_ids(self, urls: list[str]) -> dict[str, int]:
+        """Return the id of every (normalized) url found in the products table"""
+        ids = {}
+        for i in range(0, len(urls), self.CHUNK_SIZE):
+            chunk = urls[i:i + self.CHUNK_SIZE]
+            ids.update(self.conn.execute(
+                f"SELECT url, id FROM products WHERE url IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return ids
+
+    @staticmethod
+    def write_details(connection: sqlite3.Connection, details: dict[int, tuple[list[str], list[str]]]) -> None:
+        """Replace the rows of the products in the product_images and product_categories tables. Must be called inside the
+        transaction that wrote the products
+        Args:
+            connection (sqlite3.Connection): The connection of the transaction.
+            details (dict[int, tuple[list[str], list[str]]]): Images and categories of every product id.
+        """
+        if not details:
+            return
+        ids = [(product_id,) for product_id in details]
+        connection.executemany('DELETE FROM product_images WHERE product_id = ?', ids)
+        connection.executemany('DELETE FROM product_categories WHERE product_id = ?', ids)
+        connection.executemany('INSERT INTO product_images (product_id, position, url) VALUES (?, ?, ?)', [
+            (product_id, position, url) for product_id, (images, _) in details.items() for position, url in enumerate(images)
+        ])
+        connection.executemany('INSERT INTO product_categories (product_id, position, name) VALUES (?, ?, ?)', [
+            (product_id, position, name) for product_id, (_, categories) in details.items() for position, name in enumerate(categories)
+        ])
+
+    def get_product_images(self, product_id: int) -> list[str]:
+        """Return the image urls of the product in their original order"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return []
+            rows = self.conn.execute('SELECT url FROM product_images WHERE product_id = ? ORDER BY position', (product_id,)).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            logger.error(f'Cannot get images of product ({product_id}): {e.__str__()}')
+            return []
+
+    def get_product_categories(self, product_id: int) -> list[str]:
+        """Return the categories of the product in their original order"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return []
+            rows = self.conn.execute('SELECT name FROM product_categories WHERE product_id = ? ORDER BY position', (product_id,)).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            logger.error(f'Cannot get categories of product ({product_id}): {e.__str__()}')
+            return []
+
+    def find_products(self, category: str|None=None, min_price: float|None=None, max_price: float|None=None, limit: int=100) -> list:
+        """Find products by category and/or price range. Both filters are served by an index
+        Args:
+            category (str|None): Exact name of the category.
+            min_price (float|None): Lowest price (Inclusive).
+            max_price (float|None): Highest price (Inclusive).
+            limit (int): Maximum number of rows returned.
+        Returns:
+            list: The product rows ordered by price
+        """
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return []
+            conditions, params = [], []
+            if category is not None:
+                conditions.append('id IN (SELECT product_id FROM product_categories WHERE name = ?)')
+                params.append(category)
+            if min_price is not None:
+                conditions.append('price >= ?')
+                params.append(min_price)
+            if max_price is not None:
+                conditions.append('price <= ?')
+                params.append(max_price)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            return self.conn.execute(f'SELECT * FROM products {where} ORDER BY price LIMIT ?', (*params, limit)).fetchall()
+        except Exception as e:
+            logger.error(f'Cannot find products: {e.__str__()}')
+            return []
     
     def update_product(self, product_data: dict, product_id: int) -> bool:
         """Update products table using product_id
@@ -159,30 +631,22 @@ class ProductsCRUD:
             if not self.conn:
                 logger.error(f'Error: Cannot connect to sqldb')
                 return False
-            cur = self.conn.cursor()
-            sql = f'SELECT * FROM products WHERE id={product_id}'
-            row = cur.execute(sql)
-            product_data = row.fetchone()
             sql = f"""UPDATE products SET
                 url = ?,
                 title = ?,
                 price = ?,
                 description = ?,
                 images = ?,
+                name = ?,
                 company_name = ?,
+                category = ?,
                 updated_at = ?
-                WHERE id = {product_id};"""
-            cur.execute(sql, (
-                f"{product_data['url']}",
-                f"{product_data['title']}",
-                product_data['price'],
-                f"{product_data['description']}",
-                f"{product_data['images']}",
-                f"{product_data['company_name']}",
-                f"{current_timestamp()}",
-            ))
-            self.conn.commit()
-            cur.close()
+                WHERE id = ?;"""
+            row = self._product_row(product_data)
+            with self.conn:
+                cur = self.conn.execute(sql, (*row[:-2], row[-1], product_id))
+                if cur.rowcount:
+                    self.write_details(self.conn, {product_id: self._product_details(product_data)})
             return True
         except Exception as e:
             logger.error(f'Cannot update product data: {e.__str__()}')
@@ -200,11 +664,416 @@ class ProductsCRUD:
                 logger.error(f'Error: Cannot connect to sqldb')
                 return False
             cur = self.conn.cursor()
-            sql = f'''DELETE FROM products WHERE id={product_id}'''
-            cur.execute(sql)
+            cur.execute('''DELETE FROM products WHERE id = ?''', (product_id,))
             self.conn.commit()
             return True
         except Exception as e:
             logger.error(f'Error in delete product ({product_id}): {e.__str__()}')
             return False
     ######## *** CRUD 'products' operations *** ######
+
+
+class PriceHistoryCRUD:
+    """Read and write the 'price_history' table (Price, currency and availability changes of the products)"""
+    # Maximum number of parameters in a single 'IN (...)' lookup
+    CHUNK_SIZE = 500
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection = connection
+
+    def insert(self, rows: list[tuple[str, float|None, str|None, str|None, str]]) -> None:
+        """Insert (url, price, currency, availability, observed_at) rows. Must be called inside a transaction"""
+        if rows:
+            self.conn.executemany('INSERT INTO price_history (url, price, currency, availability, observed_at) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def last_values(self, urls: list[str]) -> dict[str, tuple[float|None, str|None, str|None]]:
+        """Return the latest (price, currency, availability) of every url that has a history. Errors are raised (Not logged), so
+        the transaction of the caller rolls back instead of recording every product as changed"""
+        values = {}
+        for i in range(0, len(urls), self.CHUNK_SIZE):
+            chunk = urls[i:i + self.CHUNK_SIZE]
+            rows = self.conn.execute(
+                f"""SELECT url, price, currency, availability FROM price_history WHERE id IN (
+                    SELECT MAX(id) FROM price_history WHERE url IN ({', '.join('?' * len(chunk))}) GROUP BY url)""", chunk
+            ).fetchall()
+            values.update((row[0], tuple(row[1:])) for row in rows)
+        return values
+
+    def get_history(self, url: str, start: str|None=None, end: str|None=None) -> list[tuple]:
+        """Return the (price, currency, availability, observed_at) rows of the product in the time window
+        Args:
+            url (str): Url of the product. Normalized before lookup.
+            start (str|None): Lowest observed_at ('YYYY-MM-DD HH:MM:SS', Inclusive).
+            end (str|None): Highest observed_at (Exclusive).
+        Returns:
+            list[tuple]: The rows ordered by observed_at
+        """
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return []
+            where, params = self._time_window(start, end)
+            return self.conn.execute(
+                f"""SELECT price, currency, availability, observed_at FROM price_history
+                    WHERE url = ? {where} ORDER BY observed_at, id""",
+                (normalize_url(url), *params)
+            ).fetchall()
+        except Exception as e:
+            logger.error(f'Cannot get price history of {url}: {e.__str__()}')
+            return []
+
+    def get_changes(self, start: str|None=None, end: str|None=None, limit: int=1000) -> list[tuple]:
+        """Return the (url, price, currency, availability, observed_at) rows of every product in the time window (Same
+        bounds as get_history), ordered by observed_at"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return []
+            where, params = self._time_window(start, end)
+            return self.conn.execute(
+                f"""SELECT url, price, currency, availability, observed_at FROM price_history
+                    WHERE 1 {where} ORDER BY observed_at, id LIMIT ?""",
+                (*params, limit)
+            ).fetchall()
+        except Exception as e:
+            logger.error(f'Cannot get price changes: {e.__str__()}')
+            return []
+
+
+    @staticmethod
+    def _time_window(start: str|None, end: str|None) -> tuple[str, list[str]]:
+        """Return the conditions and parameters of the observed_at window (Only the given bounds are added)"""
+        where, params = '', []
+        if start:
+            where += ' AND observed_at >= ?'
+            params.append(start)
+        if end:
+            where += ' AND observed_at < ?'
+            params.append(end)
+        return where, params
+
+
+class ArchiveIndexCRUD:
+    """Read and write the 'archive_index' table (Location of the records of the raw HTML archive)"""
+    COLUMNS = 'url, segment, offset, length, digest, archived_at'
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection = connection
+
+    def insert(self, rows: list[tuple[str, str, int, int, str|None, str]]) -> bool:
+        """Insert (url, segment, offset, length, digest, archived_at) rows in a single transaction"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            with self.conn:
+                self.conn.executemany(
+                    f'INSERT INTO archive_index ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(normalize_url(row[0]), *row[1:]) for row in rows]
+                )
+            return True
+        except Exception as e:
+            logger.error(f'Cannot write {len(rows)} row(s) into archive index: {e.__str__()}')
+            return False
+
+    def latest(self, url: str) -> tuple|None:
+        """Return the (url, segment, offset, length, digest, archived_at) of the latest record of the url"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return None
+            return self.conn.execute(
+                f'SELECT {self.COLUMNS} FROM archive_index WHERE url = ? ORDER BY id DESC LIMIT 1', (normalize_url(url),)
+            ).fetchone()
+        except Exception as e:
+            logger.error(f'Cannot read archive index of {url}: {e.__str__()}')
+            return None
+
+    def iter_entries(self, since: str|None=None, until: str|None=None, latest_only: bool=True, chunk_size: int=1000) -> Iterator[tuple]:
+        """Stream the (url, segment, offset, length, digest, archived_at) rows ordered by segment and offset (The order of the
+        records on disk)
+        Args:
+            since (str|None): Only the records archived at or after this timestamp.
+            until (str|None): Only the records archived before this timestamp.
+            latest_only (bool): Only the latest record of every url.
+            chunk_size (int): Number of rows fetched at a time.
+        """
+        if not self.conn:
+            logger.error(f'Error: Cannot connect to sqldb')
+            return
+        conditions, params = [], []
+        if since:
+            conditions.append('archived_at >= ?')
+            params.append(since)
+        if until:
+            conditions.append('archived_at < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        if latest_only:
+            sql = f'SELECT {self.COLUMNS} FROM archive_index WHERE id IN (SELECT MAX(id) FROM archive_index {where} GROUP BY url) ORDER BY segment, offset'
+        else:
+            sql = f'SELECT {self.COLUMNS} FROM archive_index {where} ORDER BY segment, offset'
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            while rows := cur.fetchmany(max(1, chunk_size)):
+                yield from rows
+        finally:
+            cur.close()
+
+
+class CrawlStateCRUD:
+    """Read and write the 'crawl_state' table (Per-url state of the last crawl)"""
+    FIELDS: tuple[str, ...] = ('etag', 'last_modified', 'sitemap_lastmod', 'content_hash', 'status', 'fetched_at')
+    # Every field is replaced except the ones the new state does not know (NULL), for eg, a 304 response has no content hash
+    UPSERT_SQL = """INSERT INTO crawl_state (
+                url, etag, last_modified, sitemap_lastmod, content_hash, status, fetched_at
+                )
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = COALESCE(excluded.etag, etag),
+                    last_modified = COALESCE(excluded.last_modified, last_modified),
+                    sitemap_lastmod = COALESCE(excluded.sitemap_lastmod, sitemap_lastmod),
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    status = excluded.status,
+                    fetched_at = excluded.fetched_at;"""
+    # Maximum number of parameters in a single 'IN (...)' lookup
+    CHUNK_SIZE = 500
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection = connection
+
+    def get_states(self, urls: list[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the crawl state of many urls (Looked up in chunks)
+        Args:
+            urls (list[str]): Urls to look up. Normalized before lookup.
+        Returns:
+            Dict[str, Dict[str, Any]]: Crawl state of every url found, keyed by the normalized url
+        """
+        states: Dict[str, Dict[str, Any]] = {}
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return states
+            normalized = list(dict.fromkeys(normalize_url(url) for url in urls))
+            for start in range(0, len(normalized), self.CHUNK_SIZE):
+                chunk = normalized[start:start + self.CHUNK_SIZE]
+                placeholders = ', '.join('?' * len(chunk))
+                cur = self.conn.execute(
+                    f"SELECT url, {', '.join(self.FIELDS)} FROM crawl_state WHERE url IN ({placeholders})", chunk
+                )
+                for row in cur.fetchall():
+                    states[row[0]] = dict(zip(self.FIELDS, row[1:]))
+        except Exception as e:
+            logger.error(f'Cannot get crawl state: {e.__str__()}')
+        return states
+
+    def upsert_states(self, states: list[Dict[str, Any]]) -> bool:
+        """Insert or update the crawl state of many urls in a single transaction
+        Args:
+            states (list[Dict[str, Any]]): Dictionaries with 'url' and any of the FIELDS.
+        Returns:
+            bool: True if all the rows written
+        """
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            rows = [
+                (normalize_url(state['url']),) + tuple(
+                    state.get(field) if field != 'fetched_at' else state.get(field) or current_timestamp()
+                    for field in self.FIELDS
+                )
+                for state in states
+            ]
+            with self.conn:
+                self.conn.executemany(self.UPSERT_SQL, rows)
+            return True
+        except Exception as e:
+            logger.error(f'Cannot write crawl state of {len(states)} url(s): {e.__str__()}')
+            return False
+
+
+class RobotsCacheCRUD:
+    """Read and write the 'robots_cache' table (Fetched robots.txt of every origin)"""
+    STORE_SQL = """INSERT INTO robots_cache (origin, status, content, fetched_at, expires_at, lease_until)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(origin) DO UPDATE SET
+                    status = excluded.status,
+                    content = excluded.content,
+                    fetched_at = excluded.fetched_at,
+                    expires_at = excluded.expires_at,
+                    lease_until = 0;"""
+    # Take the lease only if nobody holds it and the cached robots.txt (if any) is expired
+    LEASE_SQL = """INSERT INTO robots_cache (origin, lease_until) VALUES (?, ?)
+                ON CONFLICT(origin) DO UPDATE SET lease_until = excluded.lease_until
+                    WHERE lease_until < ? AND expires_at <= ?;"""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection = connection
+
+    def get(self, origin: str) -> Optional[Dict[str, Any]]:
+        """Get the cached robots.txt of the origin (None if it never cached)"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return None
+            row = self.conn.execute(
+                "SELECT status, content, fetched_at, expires_at, lease_until FROM robots_cache WHERE origin = ?", (origin,)
+            ).fetchone()
+            if row is None:
+                return None
+            return dict(zip(('status', 'content', 'fetched_at', 'expires_at', 'lease_until'), row))
+        except Exception as e:
+            logger.error(f'Cannot get robots cache of {origin}: {e.__str__()}')
+            return None
+
+    def try_lease(self, origin: str, now: float, lease_seconds: float) -> bool:
+        """Try to take the right to fetch robots.txt of the origin for lease_seconds. Returns True if the lease taken"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            with self.conn:
+                cur = self.conn.execute(self.LEASE_SQL, (origin, now + lease_seconds, now, now))
+            return cur.rowcount > 0
+        except Exception as e:
+            logger.error(f'Cannot take robots cache lease of {origin}: {e.__str__()}')
+            return False
+
+    def store(self, origin: str, status: int|None, content: str, fetched_at: float, expires_at: float) -> bool:
+        """Store the fetched robots.txt of the origin and release the lease"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            with self.conn:
+                self.conn.execute(self.STORE_SQL, (origin, status, content, fetched_at, expires_at))
+            return True
+        except Exception as e:
+            logger.error(f'Cannot store robots cache of {origin}: {e.__str__()}')
+            return False
+
+
+class FrontierCRUD:
+    """Read and write the 'frontier' table (Durable queue of the urls to crawl)"""
+    PENDING = 'pending'
+    IN_FLIGHT = 'in_flight'
+    DONE = 'done'
+    FAILED = 'failed'
+    # A url already in the frontier keeps its state, only its priority may go up and its lastmod is refreshed
+    ADD_SQL = """INSERT INTO frontier (url, fetch_url, priority, lastmod, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    priority = MAX(priority, excluded.priority),
+                    lastmod = COALESCE(excluded.lastmod, lastmod);"""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection = connection
+
+    def add(self, rows: list[tuple[str, int, str|None]]) -> bool:
+        """Add (url, priority, lastmod) rows in a single transaction"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            now = current_timestamp()
+            with self.conn:
+                self.conn.executemany(self.ADD_SQL, [
+                    (normalize_url(url), url, priority, lastmod, now) for url, priority, lastmod in rows
+                ])
+            return True
+        except Exception as e:
+            logger.error(f'Cannot add {len(rows)} url(s) to frontier: {e.__str__()}')
+            return False
+
+    def claim(self, limit: int, lease_until: float, owner: str|None=None) -> list[tuple[str, str|None]]:
+        """Move up to limit pending urls (Highest priority first) to in_flight for the owner and return their (fetch_url, lastmod)"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return []
+            # IMMEDIATE takes the write lock before reading, so two processes never claim the same url
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute(
+                    "SELECT url, fetch_url, lastmod FROM frontier WHERE state = ? ORDER BY priority DESC, rowid LIMIT ?",
+                    (self.PENDING, limit)
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE frontier SET state = ?, lease_until = ?, owner = ?, updated_at = ? WHERE url = ?",
+                    [(self.IN_FLIGHT, lease_until, owner, current_timestamp(), row[0]) for row in rows]
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            return [(row[1], row[2]) for row in rows]
+        except Exception as e:
+            logger.error(f'Cannot claim urls from frontier: {e.__str__()}')
+            return []
+
+    def finish(self, done: list[str], failed: list[tuple[str, str]], max_attempts: int) -> bool:
+        """Mark urls as done, and the failed ones as pending again until they reach max_attempts (Then failed)"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            now = current_timestamp()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE frontier SET state = ?, attempts = attempts + 1, last_error = NULL, lease_until = 0, updated_at = ? WHERE url = ?",
+                    [(self.DONE, now, normalize_url(url)) for url in done]
+                )
+                self.conn.executemany(
+                    """UPDATE frontier SET state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,
+                        attempts = attempts + 1, last_error = ?, lease_until = 0, updated_at = ? WHERE url = ?""",
+                    [(max_attempts, self.FAILED, self.PENDING, error, now, normalize_url(url)) for url, error in failed]
+                )
+            return True
+        except Exception as e:
+            logger.error(f'Cannot update frontier: {e.__str__()}')
+            return False
+
+    def recover(self, now: float|None=None, owner: str|None=None) -> int:
+        """Move in_flight urls back to pending (Only the ones whose lease expired before now or claimed by the owner if now is given).
+        Returns the number of urls moved"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return 0
+            with self.conn:
+                if now is None:
+                    cur = self.conn.execute("UPDATE frontier SET state = ?, lease_until = 0 WHERE state = ?", (self.PENDING, self.IN_FLIGHT))
+                else:
+                    cur = self.conn.execute(
+                        "UPDATE frontier SET state = ?, lease_until = 0 WHERE state = ? AND (lease_until < ? OR owner = ?)",
+                        (self.PENDING, self.IN_FLIGHT, now, owner)
+                    )
+            return cur.rowcount
+        except Exception as e:
+            logger.error(f'Cannot recover frontier: {e.__str__()}')
+            return 0
+
+    def counts(self) -> Dict[str, int]:
+        """Return number of urls in every state"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return {}
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall())
+        except Exception as e:
+            logger.error(f'Cannot count frontier urls: {e.__str__()}')
+            return {}
+
+    def clear(self, states: tuple[str, ...]) -> bool:
+        """Delete the urls in the given states"""
+        try:
+            if not self.conn:
+                logger.error(f'Error: Cannot connect to sqldb')
+                return False
+            with self.conn:
+                self.conn.execute(f"DELETE FROM frontier WHERE state IN ({', '.join('?' * len(states))})", states)
+            return True
+        except Exception as e:
+            logger.error(f'Cannot clear frontier: {e.__str__()}')
+            return False
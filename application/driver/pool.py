@@ -0,0 +1,163 @@
+"""
+This module provides the DriverPool class which keeps warm Selenium Chrome drivers to be shared between scrapers.
+Starting Chrome takes seconds, so drivers are reused for many pages. A driver is health checked before it is handed out and replaced after
+it loaded too many pages or its memory grew too much. The pool is safe to be used from many threads.
+"""
+
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from selenium.webdriver.chrome.webdriver import WebDriver
+from application.driver.chrome import setup_driver
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+class DriverPool:
+    """A thread-safe pool of reusable Selenium drivers.\n
+    Usage:\n
+        with pool.driver() as driver:
+            driver.get(url)
+    """
+    def __init__(
+        self,
+        size: int = config.DRIVER_POOL_SIZE,
+        max_pages: int = config.DRIVER_MAX_PAGES,
+        max_memory_mb: float = config.DRIVER_MAX_MEMORY_MB,
+        driver_factory: Callable[[], WebDriver] = setup_driver
+    ) -> None:
+        """
+        Args:
+            size (int): Maximum number of drivers alive at the same time.
+            max_pages (int): Number of times a driver is handed out before it is replaced with a new one.
+            max_memory_mb (float): JS heap size (in MB) of a driver that makes it to be replaced.
+            driver_factory (Callable[[], WebDriver]): Function that creates a new driver.
+        """
+        self.size: int = max(1, size)
+        self.max_pages: int = max_pages
+        self.max_memory_mb: float = max_memory_mb
+        self.driver_factory: Callable[[], WebDriver] = driver_factory
+        # Idle drivers are reused in LIFO order to keep the most recently used (warmest) ones busy
+        self._idle: deque[WebDriver] = deque()
+        self._pages: dict[int, int] = {}
+        self._created: int = 0
+        self._closed: bool = False
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float|None = None) -> WebDriver:
+        """
+        Take a healthy driver from the pool. Creates a new one if no idle driver exists and the pool is not full,
+        otherwise waits until a driver is released.
+        Args:
+            timeout (float|None): Seconds to wait for a free driver. None means wait forever.
+        Returns:
+            WebDriver: A driver that must be given back with release().
+        Raises:
+            TimeoutError: If no driver became free in time.
+        """
+        # A single deadline for the whole call, so wake-ups that find no driver (or unhealthy drivers) do not extend the wait
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            driver = None
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError('Driver pool is closed')
+                while not self._idle and self._created >= self.size:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0 or not self._condition.wait(remaining):
+                        raise TimeoutError('No selenium driver became free in time')
+                if self._idle:
+                    driver = self._idle.pop()
+                else:
+                    self._created += 1
+            if driver is None:
+                return self._create_driver()
+            if self._is_healthy(driver):
+                return driver
+            logger.warning('Unhealthy selenium driver found in the pool. Replacing it')
+            self._discard(driver)
+
+    def release(self, driver: WebDriver) -> None:
+        """Give the driver back to the pool. The driver is replaced if it loaded too many pages or uses too much memory"""
+        if driver is None:
+            return
+        pages = self._pages.get(id(driver), 0) + 1
+        self._pages[id(driver)] = pages
+        if self._closed or pages >= self.max_pages or not self._is_healthy(driver):
+            self._discard(driver)
+            return
+        memory_mb = self._memory_mb(driver)
+        if memory_mb is not None and memory_mb >= self.max_memory_mb:
+            logger.info(f'Selenium driver uses {memory_mb:.0f}MB memory. Replacing it')
+            self._discard(driver)
+            return
+        with self._condition:
+            self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def driver(self, timeout: float|None = None) -> Iterator[WebDriver]:
+        """Context manager that acquires a driver and releases it when done"""
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self) -> None:
+        """Quit all idle drivers. Drivers still in use are quit when released"""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+        for driver in idle:
+            self._discard(driver)
+
+    def _create_driver(self) -> WebDriver:
+        """Create a new driver. The slot reserved for it is freed if creation fails"""
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+        self._pages[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver: WebDriver) -> None:
+        """Quit the driver and free its slot in the pool"""
+        self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f'Error in quitting selenium driver: {e}')
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+    def _is_healthy(self, driver: WebDriver) -> bool:
+        """Check the browser session of the driver is still alive"""
+        try:
+            return bool(driver.window_handles)
+        except Exception:
+            return False
+
+    def _memory_mb(self, driver: WebDriver) -> float|None:
+        """Return JS heap size of the current page in MB. Returns None if not available"""
+        try:
+            used_heap = driver.execute_script(
+                'return window.performance && performance.memory ? performance.memory.usedJSHeapSize : null'
+            )
+            if isinstance(used_heap, (int, float)) and used_heap > 0:
+                return used_heap / (1024 * 1024)
+        except Exception:
+            pass
+        return None
@@ -0,0 +1,88 @@
+"""
+This module decides when a page loaded with selenium is ready to be extracted.
+Instead of sleeping a fixed time after driver.get, the page is polled until any configured readiness condition is met or the timeout is reached.
+If the site has a css selector in READY_SELECTORS, only that selector marks its pages ready.
+"""
+
+
+import time
+from urllib.parse import urlsplit
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.webdriver import WebDriver
+from selenium.webdriver.support.ui import WebDriverWait
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+# JavaScript expression of every readiness condition. 'selector' gets the css selector as arguments[0]
+READY_CHECKS: dict[str, str] = {
+    'json_ld': "document.querySelector('script[type=\"application/ld+json\"]') !== null",
+    'ready_state': "document.readyState === 'complete'",
+    'selector': "(arguments[0] ? document.querySelector(arguments[0]) !== null : false)",
+}
+
+
+def get_ready_selector(url: str, selectors: dict[str, str]|None = None) -> str|None:
+    """Return the css selector that marks pages of the url host ready (also matches 'www.' prefixed hosts)"""
+    selectors = config.READY_SELECTORS if selectors is None else selectors
+    host = urlsplit(url).netloc.lower()
+    return selectors.get(host) or selectors.get(host.removeprefix('www.'))
+
+
+def build_ready_script(conditions: list[str]|tuple[str, ...]) -> str|None:
+    """Combine the conditions into a single script, so every poll costs one round trip to the browser"""
+    checks = [READY_CHECKS[condition] for condition in conditions if condition in READY_CHECKS]
+    if not checks:
+        return None
+    return 'return ' + ' || '.join(f'({check})' for check in checks) + ';'
+
+
+def wait_until_ready(
+    driver: WebDriver,
+    url: str = '',
+    conditions: list[str]|tuple[str, ...]|None = None,
+    timeout: float|None = None,
+    poll_interval: float|None = None,
+    selector: str|None = None
+) -> bool:
+    """
+    Wait until the page loaded in the driver is ready to be extracted.
+
+    Args:
+        driver (WebDriver): Driver that loaded the page.
+        url (str): Url of the page, used to find the per-site css selector.
+        conditions (list[str]|None): Readiness conditions ('json_ld', 'ready_state', 'selector'). Defaults to config.READY_CONDITIONS.
+        timeout (float|None): Maximum seconds to wait. Defaults to config.READY_TIMEOUT.
+        poll_interval (float|None): Seconds between two checks. Defaults to config.READY_POLL_INTERVAL.
+        selector (str|None): Css selector for the 'selector' condition. Defaults to the one of the url host in config.READY_SELECTORS.
+
+    Returns:
+        bool: True if a condition met, False if the timeout reached (The page can still be extracted).
+    """
+    conditions = config.READY_CONDITIONS if conditions is None else conditions
+    timeout = config.READY_TIMEOUT if timeout is None else timeout
+    poll_interval = config.READY_POLL_INTERVAL if poll_interval is None else poll_interval
+    selector = selector or get_ready_selector(url)
+    if 'selector' in conditions and selector:
+        # readyState is complete (and JSON-LD exists) before the scripts of the site render the product, the selector is required
+        conditions = ['selector']
+    else:
+        conditions = [condition for condition in conditions if condition != 'selector']
+    script = build_ready_script(conditions)
+    if script is None:
+        # No condition to check, keep the old behavior of waiting the whole timeout
+        time.sleep(timeout)
+        return False
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(
+            lambda d: d.execute_script(script, selector)
+        )
+        return True
+    except TimeoutException:
+        logger.debug(f'Page not ready after {timeout}s: {url}')
+    except Exception as e:
+        logger.warning(f'Error in waiting for page to become ready: {e}')
+    return False
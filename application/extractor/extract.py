@@ -9,14 +9,21 @@ from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from typing import Optional, Any
 from application.driver.chrome import setup_driver
+from application.driver.pool import DriverPool
+from application.driver.readiness import wait_until_ready
 from application.data_management.manage_sqlite import upsert_product_data
+from application.data_management.writer import ProductWriter
+from application.network.http_client import http_get
+from application.extractor.parsers import parse_html
+from application.extractor.fingerprint import content_hash
+from application.crawler.incremental import CrawlState
 from ._resources import to_english_digits, subset_dict, clean_text
 import requests
 from requests import Response
 import config
 from bs4 import BeautifulSoup, Tag
-import time
 from logger.logger import setup_logger
+from logger.metrics import count_response, stage_timer, timed
 import json
 import re
 
@@ -24,12 +31,19 @@ import re
 logger = setup_logger('scraper.log', __name__)
 
 
+# Body of every <script type="application/ld+json"> tag. Scanning for these is much cheaper than parsing the whole page
+JSON_LD_SCRIPT_RE = re.compile(
+    r'<script\b[^>]*?\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
 class Extractor:
     """A class to extract product data from e-commerce websites.\n
     Every methods that scrape a single attribute can be called with arbitrary scraping method (For eg, we can scrape title with selenium and image using Beautiful soup. But beware because it could have additional proccessing overhead).\n"""
-    def __init__(self, product_url: str, method: str=config.METHOD, driver: WebDriver|None=None, requests_response: Response|None=None, soup: BeautifulSoup|None=None):
+    def __init__(self, product_url: str, method: str=config.METHOD, driver: WebDriver|None=None, requests_response: Response|None=None, soup: BeautifulSoup|None=None, html_body: str='', driver_pool: DriverPool|None=None, writer: ProductWriter|None=None, parser_backend: str|None=None, crawl_state: CrawlState|None=None):
         # Initialize product attributes with default values one by one
-        self.needed_fields: list = ['url', 'title', 'price', 'description', 'images', 'name', 'company_name', 'category']
+        self.needed_fields: list = ['url', 'title', 'price', 'description', 'images', 'name', 'company_name', 'category', 'currency', 'availability']
         self.product_url = product_url
         self.product_title: str = 'N/A'
         self.product_price: float = 0.0
@@ -38,6 +52,8 @@ class Extractor:
         self.product_name: str = 'N/A'
         self.company_name: str = 'N/A'
         self.categories: list = []
+        self.currency: str|None = None
+        self.availability: str|None = None
         self.product_data: dict = {
             "url": self.product_url,
             "title": self.product_title,
@@ -46,14 +62,30 @@ class Extractor:
             "images": self.product_images,
             "name": self.product_name,
             "company_name": self.company_name,
-            "category": self.categories
+            "category": self.categories,
+            "currency": self.currency,
+            "availability": self.availability
         }
         self.driver: Optional[WebDriver] = driver
+        # Drivers borrowed from the pool are given back after scraping and drivers passed by the caller are never quit here
+        self.driver_pool: Optional[DriverPool] = driver_pool
+        self._owns_driver: bool = False
+        self._borrowed_driver: bool = False
         self.requests_response: Optional[requests.Response] = requests_response
-        self.html_body: str = ''
+        # Already fetched page content (For eg, by the crawl engine). If provided no request sent for the page
+        self.html_body: str = html_body
         self.soup = soup
+        # Parser backend used to build the soup (config.PARSER_BACKEND if not provided)
+        self.parser_backend: str|None = parser_backend
         self.method = method
+        # If a writer provided product data is buffered to be written in batches instead of its own transaction
+        self.writer: Optional[ProductWriter] = writer
+        # If crawl state provided pages with the same fingerprint as the last crawl are neither parsed nor stored.
+        # Recording the new state is left to the caller (It knows when the product is really stored)
+        self.crawl_state: Optional[CrawlState] = crawl_state
+        self.digest: str|None = None
 
+    @timed('scrape')
     def scrape(self) -> dict:
         """
         Scraps and extract product data from a given e-commerce product URL.
@@ -66,84 +98,121 @@ class Extractor:
                 images, name, company_name, category, and other standard product data.
         """
         try:
-            is_extracted_completed : bool = False
-            if config.METHOD == "selenium":
-                if not self._initialize_driver():
-                    return {'status': 'error', 'msg': 'WebDriverException occurred', 'data': self.product_data}
-            self._initialize_soup()
-            if not self.soup:
+            # Fetch the page only if its content not provided already
+            if not self.html_body:
+                if self.method == "selenium":
+                    if not self._initialize_driver():
+                        return {'status': 'error', 'msg': 'WebDriverException occurred', 'data': self.product_data}
+                elif not self._initialize_requests():
+                    return {'status': 'error', 'msg': 'RequestException occurred', 'data': self.product_data}
+            if not self.html_body and not self.soup:
                 logger.error('No HTML content to parse')
                 return {'status': 'error', 'msg': 'No HTML content to parse', 'data': self.product_data}
-            logger.info(f'Product url to be extracted:\n{self.product_url}')
-            # ? Extract product data using diffrent methods
-            # * 1- Extract data using "script-json+ld tag". If json_ld script tag found in the web page return the product_data
-            json_ld_data = self._extract_json_ld_data(res) if (res := self._scrape_json_ld()) else {}
-            if json_ld_data:
-                self.product_data = subset_dict(json_ld_data, self.needed_fields)
-                logger.debug(f'\nAFTER EXTRACTION: data exracted for: "{self.product_url}":\n{self.product_data}')
-                # ? Insert-upadte product data into database
-                result: bool = upsert_product_data(product_data=self.product_data)
-                if not result:
-                    logger.warning('No product inserted into/updated from product table')
-                else:
-                    logger.warning('Product data inserted/updated into product table')
-                is_extracted_completed = True
-            # * 2- If any Product data field could not be found in previous methods try to scrape data for every single field
-            if not is_extracted_completed:
-                # ! TODO
-                pass
+            # ? Skip soup, JSON-LD and database stages if the page did not change since the last crawl
+            if self.crawl_state is not None and self.html_body:
+                self.digest = content_hash(self.html_body)
+                if self.crawl_state.is_same_content(self.product_url, self.digest):
+                    logger.info(f'Page content not changed: {self.product_url}')
+                    if self.driver and (self._borrowed_driver or not config.REUSE_DRIVER):
+                        self._close_driver()
+                    return {'status': 'not_modified', 'msg': 'Page content not changed', 'data': {'url': self.product_url}}
+            self.extract()
             # ? Insert-upadte product data into database
-            result: bool = upsert_product_data(product_data=self.product_data)
-            if not result:
+            if not self._store_product():
                 logger.warning('No product inserted into/updated from product table')
             else:
-                logger.warning('Product data inserted/updated into product table')
+                logger.info('Product data inserted/updated into product table')
         except Exception as e:
             logger.error(f'\nError happened in scraping data: {e.__str__()}')
             self._close_driver()
-        if self.driver and not config.REUSE_DRIVER:
+        if self.driver and (self._borrowed_driver or not config.REUSE_DRIVER):
             self._close_driver()
         logger.debug(f'\nAFTER EXTRACTION: data exracted for: "{self.product_url}":\n{self.product_data}')
         return {'status': 'ok', 'msg': 'Data scrapped and extracted successfully', 'data': self.product_data}
 
+    def extract(self) -> dict:
+        """
+        Extract product data from the already fetched page content (Nothing is fetched or stored).
+
+        Returns:
+            dict: The extracted product data (Also kept in product_data).
+        """
+        is_extracted_completed : bool = False
+        logger.info(f'Product url to be extracted:\n{self.product_url}')
+        # ? Extract product data using diffrent methods
+        # * 1- Extract data using "script-json+ld tag". If json_ld script tag found in the web page return the product_data
+        # The script tags are found by scanning the page, so the whole page is not parsed if JSON-LD has the product
+        with stage_timer('json_ld', self.product_url) as timer:
+            json_ld_data = self._extract_json_ld_data(res) if (res := self._scrape_json_ld()) else {}
+            timer.status = 'ok' if json_ld_data else 'not_found'
+        if json_ld_data:
+            self.product_data = subset_dict(json_ld_data, self.needed_fields)
+            logger.debug(f'\nAFTER EXTRACTION: data exracted for: "{self.product_url}":\n{self.product_data}')
+            is_extracted_completed = True
+        # * 2- If any Product data field could not be found in previous methods try to scrape data for every single field
+        if not is_extracted_completed:
+            # Only this fallback needs the whole page parsed
+            if self._initialize_soup() and self.soup:
+                with stage_timer('css_fields', self.product_url):
+                    self._extract_fields()
+        return self.product_data
+
+    def _store_product(self) -> bool:
+        """Insert-update the extracted product data through the writer if provided, otherwise directly into database"""
+        if self.writer:
+            return self.writer.add(self.product_data)
+        return upsert_product_data(product_data=self.product_data)
+
     # ! Following methods used to initialize Extraction instance
 
+    @timed('driver_fetch')
     def _initialize_driver(self) -> bool:
         """Initializes the Selenium WebDriver if not already done. If initialization fails, it returns False."""
-        if not self.driver:
-            self.driver = setup_driver()
         try:
+            if not self.driver:
+                if self.driver_pool:
+                    self.driver = self.driver_pool.acquire()
+                    self._borrowed_driver = True
+                else:
+                    self.driver = setup_driver()
+                    self._owns_driver = True
             self.driver.get(self.product_url)
-            time.sleep(3)  # Let JavaScript render
+            with stage_timer('render_wait', self.product_url):
+                wait_until_ready(self.driver, self.product_url)  # Let JavaScript render
             self.html_body = self.driver.page_source
             return True
         except WebDriverException as e:
             logger.error(f"WebDriverException: {e}")
-            self.driver.quit()
+            self._close_driver()
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
-            self.driver.quit()
+            self._close_driver()
         return False
     
+    @timed('fetch')
     def _initialize_requests(self) -> bool:
         """Initializes the requests response if not already done. If initialization fails, it returns False."""
         try:
-            response = requests.get(self.product_url)
+            response = http_get(self.product_url)
+            count_response(self.product_url, response.status_code)
             response.raise_for_status()
             self.requests_response = response
             self.html_body = response.text
             return True
         except requests.RequestException as e:
+            if e.response is None:
+                count_response(self.product_url, None)
             logger.error(f"RequestException: {e}")
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
         return False
     
+    @timed('parse_soup')
     def _initialize_soup(self) -> bool:
-        """Initializes the BeautifulSoup object if not already done. If initialization fails, it returns False."""
+        """Initializes the parsed document (With the configured parser backend) if not already done. If initialization fails, it returns False."""
         try:
             if not self.soup:
-                self.soup = BeautifulSoup(self.html_body, "html.parser")
+                self.soup = parse_html(self.html_body, self.parser_backend)
             return True
         except requests.RequestException as e:
             logger.error(f"RequestException: {e}")
@@ -157,10 +226,15 @@ class Extractor:
         pass
     
     def _close_driver(self) -> None:
-        """Close selenium driver if exists"""
+        """Give selenium driver back to the pool or quit it if the driver created by this instance"""
         try:
-            if self.driver:
+            if self.driver and self._borrowed_driver:
+                self.driver_pool.release(self.driver)
+                self.driver = None
+                self._borrowed_driver = False
+            elif self.driver and self._owns_driver:
                 self.driver.quit()
+                self.driver = None
         except Exception:
             pass
     
@@ -174,38 +248,41 @@ class Extractor:
         """
         try:
             json_ld_data = {}
-            if self.soup:
-                scripts = self.soup.find_all('script', type='application/ld+json')
-                # print(scripts)
-                if not scripts:
-                    logger.warning('No application/ld+json script found')
-                    return
-                for script in scripts:
-                    try:
-                        json_content = script.text
-                        if not json_content:
-                            logger.warning('No json content found in the script')
-                            return
-                        # print (json_content)
-                        if json_content:
-                            data = json.loads(json_content)
-                            # print(type(data))
-                            # print(data)
-                            if isinstance(data, list):
-                                for item in data:
-                                    if item.get('@type') == 'Product':
-                                        json_ld_data = item
-                                        # break
-                            elif data.get('@type') == 'Product':
-                                json_ld_data = data
-                                # break
-                            return json_ld_data
-                    except Exception as e:
-                        logger.error(f'Error parsing JSON-LD script: {e.__str__()}')
+            scripts = self._find_json_ld_scripts()
+            if not scripts:
+                logger.warning('No application/ld+json script found')
+                return
+            for json_content in scripts:
+                try:
+                    if not json_content.strip():
+                        logger.warning('No json content found in the script')
+                        continue
+                    data = json.loads(json_content)
+                    if isinstance(data, list):
+                        for item in data:
+                            if isinstance(item, dict) and item.get('@type') == 'Product':
+                                json_ld_data = item
+                    elif isinstance(data, dict) and data.get('@type') == 'Product':
+                        json_ld_data = data
+                    # Other JSON-LD scripts (For eg, BreadcrumbList or Organization) may come before the product
+                    if json_ld_data:
+                        return json_ld_data
+                except Exception as e:
+                    logger.error(f'Error parsing JSON-LD script: {e.__str__()}')
+            return json_ld_data
         except Exception as e:
             logger.error(f'Error in extracting data from JSON-LD: {e.__str__()}')
         return
 
+    def _find_json_ld_scripts(self) -> list[str]:
+        """Return content of the JSON-LD script tags. The page content is scanned for them instead of being parsed,
+        a soup is used only if it is already built and no page content is available."""
+        if self.html_body:
+            return JSON_LD_SCRIPT_RE.findall(self.html_body)
+        if self.soup:
+            return [script.get_text() for script in self.soup.select('script[type="application/ld+json"]')]
+        return []
+
     def _extract_json_ld_data(self, json_ld_data: dict) -> dict:
         """
         Extract structured product data from a JSON-LD Product dictionary.
@@ -331,7 +408,9 @@ class Extractor:
                         description_selector:str|list[str]='.description',
                         images_selector:str|list[str]='.images img',
                         company_selector:str|list[str]=['.brand', '.company'],
-                        category_selector:str|list[str]='.category') -> dict:
+                        category_selector:str|list[str]='.category',
+                        currency_selector:str='[itemprop="priceCurrency"]',
+                        availability_selector:str='[itemprop="availability"]') -> dict:
         """Scrape and extract data for all needed fields manually using css selectors
 
         Returns:
@@ -344,6 +423,8 @@ class Extractor:
         self.product_name: str = self.product_title
         self.company_name: str = self.__find_company_name(company_selector)
         self.categories: list = self.__find_category(category_selector)
+        self.currency = self.__find_itemprop(currency_selector)
+        self.availability = self.__find_itemprop(availability_selector)
         self.product_data.update({
             "title": self.product_title,
             "price": self.product_price,
@@ -351,7 +432,9 @@ class Extractor:
             "images": self.product_images,
             "name": self.product_title,
             "company_name": self.company_name,
-            "category": self.categories
+            "category": self.categories,
+            "currency": self.currency,
+            "availability": self.availability
         })
         return self.product_data
     
@@ -411,3 +494,40 @@ class Extractor:
         except Exception as e:
             logger.error(f'Error in getting product category: {e.__str__()}')
         return []
+
+    def __find_itemprop(self, selector) -> str|None:
+        """Get the value of a microdata property (For eg, <meta itemprop="priceCurrency" content="USD">)
+        """
+        try:
+            if not self.soup:
+                return None
+            for node in self.soup.select(selector):
+                value = node.get('content') or node.get('href') or node.get_text().strip()
+                if value:
+                    return value
+        except Exception as e:
+            logger.error(f'Error in getting product property ({selector}): {e.__str__()}')
+        return None
+
+
+def extract_product_data(product_url: str, html_body: str, parser_backend: str|None=None) -> dict:
+    """
+    Extract product data from an already fetched page without storing it. This is a module-level function,
+    so it can be sent to a process pool (For eg, by the parse stage of the crawl engine).
+
+    Args:
+        product_url (str): The product page URL.
+        html_body (str): The page content.
+        parser_backend (str|None): Parser backend used if the whole page must be parsed.
+
+    Returns:
+        dict: Same result as Extractor.scrape ('status', 'msg' and 'data').
+    """
+    extractor = Extractor(product_url, method='requests', html_body=html_body, parser_backend=parser_backend)
+    try:
+        if not html_body:
+            return {'status': 'error', 'msg': 'No HTML content to parse', 'data': extractor.product_data}
+        return {'status': 'ok', 'msg': 'Data scrapped and extracted successfully', 'data': extractor.extract()}
+    except Exception as e:
+        logger.error(f'\nError happened in extracting data: {e.__str__()}')
+        return {'status': 'error', 'msg': e.__str__(), 'data': extractor.product_data}
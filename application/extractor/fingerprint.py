@@ -0,0 +1,54 @@
+"""
+Content fingerprint of the product pages. Pages of many shops change on every request only because of per-request values
+(CSRF tokens, nonces, cache comments with timestamps), so the page is normalized before it is hashed and an unchanged product
+page gives the same fingerprint on every crawl. Set config.NORMALIZE_CONTENT_HASH to False to hash the raw body.
+"""
+
+import hashlib
+import re
+import config
+
+
+# HTML comments (Cache plugins write the generation time into them)
+HTML_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+# Quoted values of keys that hold a per-request token: attributes (nonce="..", data-wp-nonce=".."), JS variables and JSON keys
+TOKEN_VALUE_RE = re.compile(
+    r'''(["']?[\w\-]*(?:nonce|csrf|xsrf|token)[\w\-]*["']?\s*[:=]\s*)(["'])[^"'<>]*\2''',
+    re.IGNORECASE,
+)
+# <input> and <meta> tags whose name or id is a token (<input type="hidden" name="csrf_token" value="..">)
+TOKEN_TAG_RE = re.compile(
+    r'''<(?:input|meta)\b[^>]*?\b(?:name|id|property)\s*=\s*["'][^"']*(?:nonce|csrf|xsrf|token|authenticity|verification)[^"']*["'][^>]*>''',
+    re.IGNORECASE,
+)
+TAG_VALUE_RE = re.compile(r'''(\b(?:value|content)\s*=\s*)("[^"]*"|'[^']*')''', re.IGNORECASE)
+# Token query parameters of the links and forms (?_wpnonce=..)
+TOKEN_PARAMETER_RE = re.compile(r'([?&;](?:_wpnonce|nonce|_token|csrf_token|csrfmiddlewaretoken)=)[^&"\'\s<>]*', re.IGNORECASE)
+
+
+def normalize_html(html: str) -> str:
+    """Return the page without the values that change on every request"""
+    html = HTML_COMMENT_RE.sub('', html)
+    html = TOKEN_TAG_RE.sub(lambda match: TAG_VALUE_RE.sub(r'\1""', match.group(0)), html)
+    html = TOKEN_VALUE_RE.sub(r'\1\2\2', html)
+    return TOKEN_PARAMETER_RE.sub(r'\1', html)
+
+
+def content_hash(content: str|bytes, normalize: bool|None=None) -> str:
+    """
+    Return sha256 hex digest of the page content.
+    Args:
+        content (str|bytes): The page content.
+        normalize (bool|None): Remove the per-request values before hashing. Defaults to config.NORMALIZE_CONTENT_HASH.
+    Returns:
+        str: The fingerprint of the page.
+    """
+    if normalize is None:
+        normalize = config.NORMALIZE_CONTENT_HASH
+    if normalize:
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', errors='surrogateescape')
+        content = normalize_html(content).encode('utf-8', errors='surrogateescape')
+    elif isinstance(content, str):
+        content = content.encode('utf-8', errors='surrogatepass')
+    return hashlib.sha256(content).hexdigest()
@@ -0,0 +1,142 @@
+"""
+HTML parser backends used by Extractor.
+Every backend returns a document with the same small selector API that BeautifulSoup already has:
+    select(css_selector) -> list of nodes, node.get_text() -> str and node.get(attribute, default) -> str|None
+so the field finders of Extractor work with any of them. Backend is chosen with config.PARSER_BACKEND:
+    'html.parser' - BeautifulSoup with the builtin parser (No extra dependency, slowest)
+    'lxml'        - lxml.html with cssselect (pip install lxml cssselect)
+    'selectolax'  - selectolax with the lexbor engine (pip install selectolax)
+If the configured backend is not installed, 'html.parser' is used instead.
+"""
+
+from functools import lru_cache
+from typing import Any, Callable, Protocol
+from bs4 import BeautifulSoup
+from logger.logger import setup_logger
+import config
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+    CSSSelector = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+    except ImportError:
+        SelectolaxParser = None
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+DEFAULT_BACKEND = 'html.parser'
+
+
+class Node(Protocol):
+    """Selector API shared by the documents and nodes of every backend"""
+    def select(self, selector: str) -> list['Node']: ...
+
+    def get_text(self) -> str: ...
+
+    def get(self, attribute: str, default: Any=None) -> Any: ...
+
+
+@lru_cache(maxsize=256)
+def _compile_css(selector: str) -> 'CSSSelector':
+    """Compile the css selector to XPath once"""
+    return CSSSelector(selector)
+
+
+class LxmlNode:
+    """Adapter of an lxml element"""
+    __slots__ = ('element',)
+
+    def __init__(self, element: Any) -> None:
+        self.element = element
+
+    def select(self, selector: str) -> list['LxmlNode']:
+        return [LxmlNode(element) for element in _compile_css(selector)(self.element)]
+
+    def get_text(self) -> str:
+        return self.element.text_content()
+
+    def get(self, attribute: str, default: Any=None) -> Any:
+        return self.element.get(attribute, default)
+
+
+class SelectolaxNode:
+    """Adapter of a selectolax node (Or the parsed document)"""
+    __slots__ = ('node',)
+
+    def __init__(self, node: Any) -> None:
+        self.node = node
+
+    def select(self, selector: str) -> list['SelectolaxNode']:
+        return [SelectolaxNode(node) for node in self.node.css(selector)]
+
+    def get_text(self) -> str:
+        return self.node.text(deep=True)
+
+    def get(self, attribute: str, default: Any=None) -> Any:
+        attributes = getattr(self.node, 'attributes', None) or {}
+        value = attributes.get(attribute, default)
+        return default if value is None else value
+
+
+def _parse_html_parser(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, 'html.parser')
+
+
+def _parse_lxml(html: str) -> LxmlNode:
+    return LxmlNode(lxml.html.document_fromstring(html or '<html></html>'))
+
+
+def _parse_selectolax(html: str) -> SelectolaxNode:
+    return SelectolaxNode(SelectolaxParser(html))
+
+
+PARSERS: dict[str, Callable[[str], Node]] = {
+    'html.parser': _parse_html_parser,
+    'lxml': _parse_lxml,
+    'selectolax': _parse_selectolax,
+}
+
+
+def available_backends() -> list[str]:
+    """Return the backends whose libraries are installed"""
+    backends = [DEFAULT_BACKEND]
+    if lxml is not None and CSSSelector is not None:
+        backends.append('lxml')
+    if SelectolaxParser is not None:
+        backends.append('selectolax')
+    return backends
+
+
+@lru_cache(maxsize=None)
+def resolve_backend(backend: str) -> str:
+    """Return the backend if it is installed, otherwise the default one (Logged once per backend)"""
+    if backend not in PARSERS:
+        raise ValueError(f"Unknown parser backend: {backend}. Choose one of {list(PARSERS)}")
+    if backend not in available_backends():
+        logger.warning(f"Parser backend '{backend}' is not installed, '{DEFAULT_BACKEND}' is used instead")
+        return DEFAULT_BACKEND
+    return backend
+
+
+def parse_html(html: str, backend: str|None=None) -> Node:
+    """
+    Parse the page with the parser backend.
+    Args:
+        html (str): Page content.
+        backend (str|None): Name of the backend. Defaults to config.PARSER_BACKEND.
+    Returns:
+        Node: The parsed document with select/get_text/get API.
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    return PARSERS[resolve_backend(backend or config.PARSER_BACKEND)](html)
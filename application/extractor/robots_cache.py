@@ -0,0 +1,156 @@
+"""
+Shared robots.txt cache keyed by origin.
+Parsed robots.txt (compiled rules, sitemaps and Crawl-delay) is kept in memory and in the 'robots_cache' table of the SQLite
+database, so every worker thread and every worker process on the machine shares one fetch per origin until it expires.
+Failed fetches are cached too (RFC 9309): a 4xx response allows everything, while a 5xx response or an unreachable server
+disallows everything for a shorter time. When a cached robots.txt expires, only the worker holding the lease fetches it again.
+"""
+
+import sqlite3
+import threading
+import time
+from urllib.parse import urljoin
+from application.database.sqlite import SQLiteDBInit, RobotsCacheCRUD
+from application.extractor.robots_parser import RobotsTxtParser
+from application.network.http_client import http_get
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+# Seconds between the checks of a worker waiting for another worker to fetch robots.txt
+LEASE_POLL_INTERVAL = 0.1
+
+
+class RobotsCache:
+    """Cache of the parsed robots.txt of every origin with TTL, negative caching and a cross-process fetch lease.\n
+    Usage:\n
+        cache = RobotsCache()
+        parser = cache.get('https://example.com')
+        parser.is_allowed(config.USER_AGENT, '/product/1')
+    """
+    def __init__(self, db_file: str=config.DB_FILE, ttl: float=config.ROBOTS_CACHE_TTL, error_ttl: float=config.ROBOTS_CACHE_ERROR_TTL, lease_timeout: float=config.ROBOTS_CACHE_LEASE_TIMEOUT, connection: sqlite3.Connection|None=None) -> None:
+        """
+        Args:
+            db_file (str): The SQLite database file shared by the workers. Not used if connection is provided.
+            ttl (float): Seconds a fetched robots.txt (or a 4xx response) is kept.
+            error_ttl (float): Seconds a 5xx response or an unreachable server is kept (Everything disallowed meanwhile).
+            lease_timeout (float): Maximum seconds a worker may take to fetch robots.txt before another worker takes over.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+        """
+        self.ttl: float = ttl
+        self.error_ttl: float = error_ttl
+        self.lease_timeout: float = lease_timeout
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: RobotsCacheCRUD = RobotsCacheCRUD(self.connection)
+        self._memory: dict[str, tuple[RobotsTxtParser, float]] = {}
+        # Serializes the usage of the connection and the in-memory cache
+        self._lock = threading.Lock()
+        # One lock per origin, so threads of this process never fetch the same robots.txt together
+        self._origin_locks: dict[str, threading.Lock] = {}
+
+    def get(self, origin: str) -> RobotsTxtParser:
+        """
+        Return the parsed robots.txt of the origin. It is fetched only if no fresh copy is cached in memory or on disk.
+        Args:
+            origin (str): Scheme and host of the site (For eg, 'https://example.com').
+        Returns:
+            RobotsTxtParser: The parser with the rules, sitemaps and Crawl-delay of the origin.
+        """
+        origin = origin.rstrip('/')
+        parser = self._from_memory(origin)
+        if parser is not None:
+            return parser
+        with self._origin_lock(origin):
+            # Another thread may have fetched it meanwhile
+            parser = self._from_memory(origin) or self._from_disk(origin)
+            if parser is not None:
+                return parser
+            deadline = time.time() + self.lease_timeout
+            while not self._try_lease(origin) and time.time() < deadline:
+                # Another worker is fetching it
+                time.sleep(LEASE_POLL_INTERVAL)
+                parser = self._from_disk(origin)
+                if parser is not None:
+                    return parser
+            status, content = self._fetch(origin)
+            return self._store(origin, status, content)
+
+    def invalidate(self, origin: str) -> None:
+        """Drop robots.txt of the origin from the memory and disk cache"""
+        origin = origin.rstrip('/')
+        with self._lock:
+            self._memory.pop(origin, None)
+            self.crud.store(origin, None, '', 0, 0)
+
+    def close(self) -> None:
+        """Close the connection if it opened by the cache"""
+        with self._lock:
+            self._memory.clear()
+            if self._owns_connection and self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def _origin_lock(self, origin: str) -> threading.Lock:
+        with self._lock:
+            return self._origin_locks.setdefault(origin, threading.Lock())
+
+    def _from_memory(self, origin: str) -> RobotsTxtParser|None:
+        entry = self._memory.get(origin)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def _from_disk(self, origin: str) -> RobotsTxtParser|None:
+        """Load and parse the cached robots.txt if it is not expired"""
+        with self._lock:
+            row = self.crud.get(origin)
+        if row is None or row['expires_at'] <= time.time():
+            return None
+        parser = self.build_parser(origin, row['status'], row['content'] or '')
+        with self._lock:
+            self._memory[origin] = (parser, row['expires_at'])
+        return parser
+
+    def _try_lease(self, origin: str) -> bool:
+        with self._lock:
+            return self.crud.try_lease(origin, time.time(), self.lease_timeout)
+
+    def _fetch(self, origin: str) -> tuple[int|None, str]:
+        """Fetch robots.txt of the origin. Returns the response status (None if the server is unreachable) and content"""
+        robots_url = urljoin(origin, '/robots.txt')
+        try:
+            response = http_get(robots_url, timeout=5)
+            return response.status_code, response.text if response.status_code < 400 else ''
+        except Exception as e:
+            logger.error(f"Error fetching robots.txt of {origin}: {e}")
+            return None, ''
+
+    def _store(self, origin: str, status: int|None, content: str) -> RobotsTxtParser:
+        """Parse the fetched robots.txt, keep it in memory and on disk and release the lease"""
+        now = time.time()
+        expires_at = now + (self.error_ttl if self.is_unreachable(status) else self.ttl)
+        parser = self.build_parser(origin, status, content)
+        with self._lock:
+            self.crud.store(origin, status, content, now, expires_at)
+            self._memory[origin] = (parser, expires_at)
+        logger.info(f"robots.txt of {origin} cached (status: {status})")
+        return parser
+
+    @staticmethod
+    def is_unreachable(status: int|None) -> bool:
+        """True if robots.txt could not be fetched because of the server (RFC 9309: everything must be disallowed)"""
+        return status is None or status == 429 or status >= 500
+
+    @staticmethod
+    def build_parser(origin: str, status: int|None, content: str) -> RobotsTxtParser:
+        """Build the parser of the robots.txt response. 4xx allows everything and an unreachable robots.txt disallows everything"""
+        parser = RobotsTxtParser(origin)
+        if RobotsCache.is_unreachable(status):
+            parser.user_agents = {'*': {'allow': [], 'disallow': ['/']}}
+        elif status < 400:
+            parser._parse_content(content)
+        return parser
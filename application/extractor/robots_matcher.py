@@ -0,0 +1,141 @@
+"""
+Compiled robots.txt rule matcher.
+Allow/Disallow rules of a group are compiled once into a trie whose '*' nodes loop on any character, then every path is
+checked in a single pass over its characters (O(len(path)) for rules without wildcards). Precedence follows RFC 9309:
+the matching rule with the longest pattern wins and Allow wins a tie. A pattern ending with '$' matches only the whole path.
+"""
+
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+
+# (Length of the pattern, is Allow) so that max() picks the longest match and prefers Allow in a tie
+Rule = Tuple[int, bool]
+
+
+class _Node:
+    __slots__ = ('children', 'star', 'is_star', 'rule', 'end_rule')
+
+    def __init__(self, is_star: bool=False) -> None:
+        self.children: Dict[str, '_Node'] = {}
+        self.star: Optional['_Node'] = None
+        self.is_star: bool = is_star
+        # Rule of the patterns that end at this node (Prefix match) and of the ones ending with '$' (Whole path match)
+        self.rule: Optional[Rule] = None
+        self.end_rule: Optional[Rule] = None
+
+
+def _normalize(pattern: str) -> str:
+    """Make the pattern start with '/' (Or a wildcard) the same way paths do"""
+    pattern = pattern.strip()
+    if pattern and not pattern.startswith(('/', '*')):
+        pattern = '/' + pattern
+    return pattern
+
+
+def select_group_name(names: Collection[str], user_agent: str) -> Optional[str]:
+    """Return the name of the group of the user-agent (Case-insensitive), or '*' if the user-agent has no group"""
+    if user_agent in names:
+        return user_agent
+    lowered = user_agent.lower()
+    for name in names:
+        if name.lower() == lowered:
+            return name
+    return '*' if '*' in names else None
+
+
+def select_group(groups: Dict[str, Any], user_agent: str) -> Optional[Any]:
+    """Return the group of the user-agent (Case-insensitive), or the '*' group if the user-agent has no group"""
+    name = select_group_name(groups, user_agent)
+    return groups[name] if name is not None else None
+
+
+class RobotsMatcher:
+    """Allow/Disallow rules of a single user-agent group compiled into a trie.\n
+    Usage:\n
+        matcher = RobotsMatcher(allow=['/public/'], disallow=['/private/', '/*.pdf$'])
+        matcher.is_allowed('/private/page')  # False
+    """
+    def __init__(self, allow: Iterable[str]=(), disallow: Iterable[str]=()) -> None:
+        self._root = _Node()
+        self._has_rules: bool = False
+        for pattern in allow:
+            self._add(pattern, True)
+        for pattern in disallow:
+            self._add(pattern, False)
+
+    def _add(self, pattern: str, allow: bool) -> None:
+        """Compile the rule into the trie. Empty patterns match nothing"""
+        pattern = _normalize(pattern)
+        if not pattern:
+            return
+        rule: Rule = (len(pattern), allow)
+        match_end = pattern.endswith('$')
+        if match_end:
+            pattern = pattern[:-1]
+        if not match_end:
+            # A trailing wildcard is the same as a prefix match
+            pattern = pattern.rstrip('*')
+        node = self._root
+        previous = ''
+        for char in pattern:
+            if char == '*':
+                if previous != '*':
+                    if node.star is None:
+                        node.star = _Node(is_star=True)
+                    node = node.star
+            else:
+                node = node.children.setdefault(char, _Node())
+            previous = char
+        if match_end:
+            node.end_rule = max(node.end_rule, rule) if node.end_rule else rule
+        else:
+            node.rule = max(node.rule, rule) if node.rule else rule
+        self._has_rules = True
+
+    @staticmethod
+    def _closure(nodes: List[_Node]) -> List[_Node]:
+        """Add the wildcard nodes reachable without consuming a character ('*' also matches an empty string)"""
+        result: List[_Node] = []
+        seen: set[int] = set()
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            result.append(node)
+            if node.star is not None:
+                stack.append(node.star)
+        return result
+
+    def match(self, path: str) -> Optional[Rule]:
+        """Return (pattern length, is Allow) of the rule that decides for the path, None if no rule matches"""
+        if not self._has_rules:
+            return None
+        path = '/' + path.lstrip('/')
+        best: Optional[Rule] = None
+        active = self._closure([self._root])
+        for char in path:
+            for node in active:
+                if node.rule and (best is None or node.rule > best):
+                    best = node.rule
+            following: List[_Node] = []
+            for node in active:
+                child = node.children.get(char)
+                if child is not None:
+                    following.append(child)
+                if node.is_star:
+                    following.append(node)
+            if not following:
+                return best
+            active = self._closure(following) if len(following) > 1 or following[0].star else following
+        for node in active:
+            for rule in (node.rule, node.end_rule):
+                if rule and (best is None or rule > best):
+                    best = rule
+        return best
+
+    def is_allowed(self, path: str) -> bool:
+        """Check if the path (With its query string) is allowed. Paths no rule matches are allowed"""
+        rule = self.match(path)
+        return rule is None or rule[1]
@@ -1,12 +1,17 @@
 import requests
-from urllib.parse import urljoin
-from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from application.crawler.dedup import SeenSet
 from application.driver.chrome import setup_driver
+from application.extractor.robots_matcher import RobotsMatcher, select_group, select_group_name
+from application.extractor.sitemap import SitemapEntry, iter_sitemap_text, stream_sitemap
+from application.network.http_client import http_get
 from logger.logger import setup_logger
 from selenium.webdriver.chrome.webdriver import WebDriver
 import config
 import re
-import xml.etree.ElementTree as ET
 
 
 logger = setup_logger(__name__)
@@ -16,10 +21,23 @@ class RobotsTxtParser:
     def __init__(self, base_url: str, driver: WebDriver|None=None):
         self.base_url = base_url.rstrip('/')
         self.robots_url = urljoin(self.base_url, '/robots.txt')
-        self.user_agents: Dict[str, Dict[str, List[str]]] = {}
+        self._user_agents: Dict[str, Dict[str, List[str]]] = {}
+        # Compiled rules of every user-agent group (Built on first use)
+        self._matchers: Dict[str, RobotsMatcher] = {}
         self.sitemaps: List[str] = []
+        self.crawl_delays: Dict[str, float] = {}
         self.driver = driver
 
+    @property
+    def user_agents(self) -> Dict[str, Dict[str, List[str]]]:
+        """Allow/Disallow rules of every user-agent group"""
+        return self._user_agents
+
+    @user_agents.setter
+    def user_agents(self, value: Dict[str, Dict[str, List[str]]]) -> None:
+        self._user_agents = value
+        self._matchers.clear()
+
     def _fetch_and_parse(self, method: Optional[str] = None) -> None:
         """
         Fetches and parses the robots.txt file using the specified scraping method.
@@ -45,7 +63,7 @@ class RobotsTxtParser:
     def _scrape_requests(self) -> None:
         """Scrapes the robots.txt file using requests module."""
         try:
-            response = requests.get(self.robots_url, timeout=5)
+            response = http_get(self.robots_url, timeout=5)
             response.raise_for_status()
             self._parse_content(response.text)
         except requests.RequestException as e:
@@ -87,26 +105,34 @@ class RobotsTxtParser:
                     continue  # Skip if no User-agent defined
                 for ua in current_user_agents:
                     self.user_agents[ua][directive].append(value)
+            elif directive == 'crawl-delay':
+                if not current_user_agents:
+                    continue
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for ua in current_user_agents:
+                    self.crawl_delays[ua] = delay
             elif directive == 'sitemap':
                 self.sitemaps.append(value)
+        # Rules changed, compile them again on next check
+        self._matchers.clear()
 
     def is_allowed(self, user_agent: str, path: str) -> bool:
-        """Checks if a user-agent is allowed to crawl a path."""
-        path = path.lstrip('/')
-        for ua in [user_agent, '*']:  # Check specific UA and wildcard
-            if ua in self.user_agents:
-                rules = self.user_agents[ua]
-                # Check disallowed paths (most specific match first)
-                for disallowed in sorted(rules['disallow'], key=len, reverse=True):
-                    disallowed = disallowed.lstrip('/')
-                    if disallowed and path.startswith(disallowed):
-                        # Check if there's an explicit Allow overriding Disallow 
-                        for allowed in rules['allow']:
-                            allowed = allowed.lstrip('/')
-                            if allowed and path.startswith(allowed):
-                                return True
-                        return False
-        return True  # Default: allowed if no rule blocks
+        """Checks if a user-agent is allowed to crawl a path (With its query string).
+        Rules of the user-agent group are used, or of the '*' group if the user-agent has no group (RFC 9309).
+        Among the matching rules the longest one wins and Allow wins a tie. '*' and '$' wildcards are supported."""
+        return self._get_matcher(user_agent).is_allowed(path)
+
+    def _get_matcher(self, user_agent: str) -> RobotsMatcher:
+        """Return the compiled rules of the group that applies to the user-agent (Compiled once and cached)"""
+        matcher = self._matchers.get(user_agent)
+        if matcher is None:
+            rules = select_group(self.user_agents, user_agent) or {}
+            matcher = RobotsMatcher(rules.get('allow', ()), rules.get('disallow', ()))
+            self._matchers[user_agent] = matcher
+        return matcher
 
     def get_sitemaps(self) -> List[str]:
         """Returns all sitemap URLs."""
@@ -115,6 +141,12 @@ class RobotsTxtParser:
     def get_rules(self, user_agent: str = '*') -> Optional[Dict[str, List[str]]]:
         """Returns rules for a specific user-agent."""
         return self.user_agents.get(user_agent)
+
+    def get_crawl_delay(self, user_agent: str = '*') -> Optional[float]:
+        """Returns Crawl-delay (in seconds) of the group that applies to the user-agent, the same group is_allowed uses.
+        The '*' group is used only if the user-agent has no group, a group without Crawl-delay has no delay (None)."""
+        name = select_group_name(self.user_agents.keys() | self.crawl_delays.keys(), user_agent)
+        return self.crawl_delays.get(name) if name is not None else None
     
     # USE CASE OF 'is_allowed' METHOD:
     # parser = RobotsTxtParser("https://example.com")
@@ -123,52 +155,104 @@ class RobotsTxtParser:
     #     # Proceed to crawl
 
 class RobotsExtLinks:
-    def __init__(self, robots_parser: RobotsTxtParser, driver: WebDriver|None=None) -> None:
+    def __init__(self, robots_parser: RobotsTxtParser, driver: WebDriver|None=None, concurrency: int=config.SITEMAP_CONCURRENCY) -> None:
         self.robots_parser = robots_parser
         self.product_links: List[str] = []
+        # <lastmod> of every product link that has one, used by the incremental crawl to skip unchanged pages
+        self.lastmods: Dict[str, str] = {}
         self.driver = driver
+        # Number of sitemaps fetched in parallel. A selenium driver cannot be shared between threads
+        self.concurrency: int = 1 if getattr(config, "METHOD", "requests") == "selenium" else max(1, concurrency)
 
     def find_product_sitemap_links(self) -> List[str]:
         """
         Read all the sitemap links extracted from robots.
         If a link belongs to a product, add it to product_links.
-        Continue until no sitemap links remain to check.
+        Child sitemaps are fetched in parallel (up to concurrency at the same time) until no sitemap links remain to check.
         Returns:
             List[str]: All product links found in the sitemaps.
         """
-        to_check: List[str] = self.robots_parser.get_sitemaps()
-        checked: set[str] = set()
-        if not to_check:
-            logger.warning("No sitemaps found in robots.txt.")
+        frontier: Deque[str] = deque()
+        seen = SeenSet()
+        # Every Sitemap: line of robots.txt is a sitemap, whatever its name (For eg, product-sitemap.xml)
+        for url in self.robots_parser.get_sitemaps():
+            self._check_link(url, None, True, seen, frontier)
+        if not frontier:
+            if not seen:
+                logger.warning("No sitemaps found in robots.txt.")
             return self.product_links
-        logger.info(f"Starting with {len(to_check)} sitemap links to check.")
-        # Loop through the sitemap links to check for product links or more sitemaps
-        while to_check:
-            url = to_check.pop(0)
-            if url in checked:
-                continue
-            checked.add(url)
-            logger.info(f"Checking sitemap link: {url}")
-            # Check if the current link is a product link or another sitemap link
-            if self._is_url_product(url):
-                self.product_links.append(url)
-                logger.info(f"Found product link: {url}")
-            elif self._is_url_sitemap(url):
-                content = self._fetch_content(url)
-                if content:
-                    # If the link is a sitemap, find all links in it
-                    logger.info(f"Found sitemap link: {url}")
-                    found_links = re.findall(r"<loc>(.*?)</loc>", content)
-                    to_check.extend(found_links)
+        logger.info(f"Starting with {len(frontier)} sitemap links to check.")
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            running: Dict[Future, str] = {}
+            # Loop through the sitemap links to check for product links or more sitemaps
+            while frontier or running:
+                while frontier and len(running) < self.concurrency:
+                    url = frontier.popleft()
+                    running[executor.submit(self._fetch_entries, url)] = url
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    fetched += 1
+                    for entry in future.result():
+                        self._check_link(entry.loc, entry.lastmod, entry.is_sitemap, seen, frontier)
+        logger.info(f"Found {len(self.product_links)} product links in {fetched} sitemaps ({len(seen)} links checked).")
         # Return the product links found in the sitemaps
         return self.product_links
-    
+
+    def _check_link(self, url: str, lastmod: Optional[str], is_sitemap: bool, seen: SeenSet, frontier: Deque[str]) -> None:
+        """Add the link to the frontier if it is another sitemap link or to product_links if it is a product link. Seen links are ignored"""
+        if not seen.add(url):
+            return
+        # An entry of a sitemap index is always a sitemap, whatever its name (For eg, products-1.xml)
+        if is_sitemap:
+            frontier.append(url)
+        elif self._is_url_product(url):
+            self.product_links.append(url)
+            if lastmod:
+                self.lastmods[url] = lastmod
+        elif self._is_url_sitemap(url):
+            frontier.append(url)
+
+    def _fetch_entries(self, url: str) -> List[SitemapEntry]:
+        """Fetch and parse the sitemap (Runs in the thread pool). Returns an empty list on errors"""
+        logger.info(f"Checking sitemap link: {url}")
+        try:
+            return list(self._iter_entries(url))
+        except Exception as e:
+            logger.error(f"Error in checking sitemap link {url}: {e}")
+            return []
+
     def get_product_links(self) -> List[str]:
         """
         Get all product links found in the sitemaps.
         """
         return self.product_links
 
+    def get_lastmods(self) -> Dict[str, str]:
+        """
+        Get the sitemap <lastmod> of the product links found in the sitemaps.
+        """
+        return dict(self.lastmods)
+
+    def _iter_entries(self, url: str) -> Iterator[SitemapEntry]:
+        """Yield the entries of the sitemap. With requests method the sitemap is parsed while it is downloaded (gzipped sitemaps too),
+        with selenium the page source is parsed.
+
+        Args:
+            url (str): The sitemap link.
+
+        Yields:
+            SitemapEntry: (loc, lastmod, is_sitemap) of every entry in the sitemap.
+        """
+        method = getattr(config, "METHOD", "requests")
+        if method == "selenium":
+            content = self._fetch_content(url)
+            if content:
+                yield from iter_sitemap_text(content)
+        else:
+            yield from stream_sitemap(url, timeout=5)
+
     def _is_url_product(self, url: str) -> bool:
         """
         Check if the current url is likely a product link.
@@ -181,9 +265,14 @@ class RobotsExtLinks:
         """
         # Common patterns for product links in e-commerce sitemaps
         product_keywords = ["product", "item", "prod", "detail", "goods"]
-        # Check if any keyword is in the URL path (case-insensitive)
-        path = url.lower()
-        return any(keyword in path for keyword in product_keywords)
+        # Check if any word of the URL path starts with a keyword (case-insensitive). The host is not checked (For eg, sitemap-shop.com)
+        # and a keyword inside a word does not count (For eg, 'item' in 'sitemap_index.xml')
+        path = urlsplit(url).path.lower()
+        # An XML file is a sitemap, never a product page
+        if path.endswith(('.xml', '.xml.gz')):
+            return False
+        words = re.split(r'[^a-z0-9]+', path)
+        return any(word.startswith(keyword) for word in words for keyword in product_keywords)
 
     def _is_url_sitemap(self, url: str) -> bool:
         """
@@ -218,7 +307,7 @@ class RobotsExtLinks:
             return self.driver.page_source
         else:
             try:
-                response = requests.get(url, timeout=5)
+                response = http_get(url, timeout=5)
                 response.raise_for_status()
                 return response.text
             except Exception:
@@ -238,22 +327,9 @@ class RobotsExtLinks:
         Returns:
             List[str]: A list of extracted <loc> links.
         """
-        links = []
-        try:
-            # Remove XML declaration for easier parsing if present
-            content_clean = re.sub(r'<\?xml.*?\?>', '', content).strip()
-            root = ET.fromstring(content_clean)
-            # Extract namespace if present
-            ns_match = re.match(r'\{(.*)\}', root.tag)
-            ns = {'ns': ns_match.group(1)} if ns_match else {}
-            # Find all <loc> tags, with or without namespace
-            if ns:
-                locs = root.findall('.//ns:loc', ns)
-            else:
-                locs = root.findall('.//loc')
-            links.extend([loc.text for loc in locs if loc.text])
-        except Exception:
-            # If not XML, try to extract URLs using regex
+        links = [entry.loc for entry in iter_sitemap_text(content)]
+        if not links:
+            # If not a sitemap, try to extract URLs using regex
             # This will match http(s) links in plain text or malformed XML
             url_pattern = r'https?://[^\s"<>\']+'
             links = re.findall(url_pattern, content)
@@ -1,8 +1,9 @@
-import re
 import aiohttp
 from urllib.parse import urljoin
 from typing import Dict, List, Optional, Set, Tuple
 import asyncio
+from application.extractor.robots_matcher import RobotsMatcher, select_group
+from application.network.http_client import create_async_session
 
 class AsyncRobotsTxtParser:
     def __init__(self, base_url: str):
@@ -10,20 +11,26 @@ class AsyncRobotsTxtParser:
         self.robots_url = urljoin(self.base_url, '/robots.txt')
         self.user_agents: Dict[str, Dict[str, Set[str]]] = {}
         self.sitemaps: Set[str] = set()
-        self._regex_cache: Dict[str, re.Pattern] = {}  # Cache compiled regex patterns
+        self._matchers: Dict[str, RobotsMatcher] = {}  # Cache compiled rules of every user-agent
 
-    async def fetch(self) -> None:
-        """Asynchronously fetches and parses robots.txt."""
+    async def fetch(self, session: Optional[aiohttp.ClientSession] = None) -> None:
+        """Asynchronously fetches and parses robots.txt. Uses the given session (For eg, the crawl engine session) or a new shared-client session."""
         try:
-            async with aiohttp.ClientSession() as session:
-                # async with session.get(self.robots_url, timeout=5) as response:
-                async with session.get(self.robots_url) as response:
-                    response.raise_for_status()
-                    content = await response.text()
-                    await self._parse_content(content)
+            if session is None:
+                async with create_async_session() as own_session:
+                    await self._fetch_with(own_session)
+            else:
+                await self._fetch_with(session)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             print(f"Error fetching robots.txt: {e}")
 
+    async def _fetch_with(self, session: aiohttp.ClientSession) -> None:
+        """Fetches robots.txt with the session and parses it."""
+        async with session.get(self.robots_url) as response:
+            response.raise_for_status()
+            content = await response.text()
+            await self._parse_content(content)
+
     async def _parse_content(self, content: str) -> None:
         """Parses robots.txt content with async support."""
         current_user_agents: List[str] = []
@@ -47,38 +54,16 @@ class AsyncRobotsTxtParser:
                     self.user_agents[ua][directive].add(value)
             elif directive == 'sitemap':
                 self.sitemaps.add(value)
-
-    def _path_to_regex(self, path: str) -> re.Pattern:
-        """Converts a robots.txt path rule to a regex pattern."""
-        if path in self._regex_cache:
-            return self._regex_cache[path]
-        # Escape regex chars and handle wildcards (*) and end-of-path ($)
-        regex = re.escape(path)
-        regex = regex.replace(r'\*', '.*')  # * → .*
-        if path.endswith('$'):
-            regex = regex[:-2] + '$'  # Exact match for paths ending with $
-        else:
-            regex += '.*'  # Default: prefix match
-        compiled = re.compile(f'^{regex}')
-        self._regex_cache[path] = compiled
-        return compiled
+        self._matchers.clear()
 
     async def is_allowed(self, user_agent: str, path: str) -> bool:
-        """Checks if a path is allowed for the given user-agent using regex matching."""
-        path = path.lstrip('/')
-        for ua in [user_agent, '*']:
-            if ua not in self.user_agents:
-                continue
-            rules = self.user_agents[ua]
-            # Check disallowed paths (most specific first)
-            for disallowed in sorted(rules['disallow'], key=len, reverse=True):
-                if disallowed and self._path_to_regex(disallowed.lstrip('/')).match(path):
-                    # Check if an Allow rule overrides this Disallow
-                    for allowed in rules['allow']:
-                        if allowed and self._path_to_regex(allowed.lstrip('/')).match(path):
-                            return True
-                    return False
-        return True  # Default: allowed
+        """Checks if a path is allowed for the given user-agent using the compiled rules (Longest match wins, Allow wins a tie)."""
+        matcher = self._matchers.get(user_agent)
+        if matcher is None:
+            rules = select_group(self.user_agents, user_agent) or {}
+            matcher = RobotsMatcher(rules.get('allow', ()), rules.get('disallow', ()))
+            self._matchers[user_agent] = matcher
+        return matcher.is_allowed(path)
 
     async def get_sitemaps(self) -> List[str]:
         """Returns all sitemap URLs."""
@@ -0,0 +1,207 @@
+"""
+Streaming sitemap parser.
+Sitemaps are parsed incrementally with xml.etree.ElementTree.XMLPullParser while they are downloaded, so memory stays flat
+even for sitemaps with tens of thousands of urls. Gzipped sitemaps (.xml.gz) are decompressed on the fly and plain-text
+sitemaps (One url per line) are supported too. Every <url>/<sitemap> entry is yielded as soon as it is parsed.
+"""
+
+import re
+import zlib
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator, NamedTuple
+from application.network.http_client import http_get
+from logger.logger import setup_logger
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+UTF8_BOM = b'\xef\xbb\xbf'
+CHUNK_SIZE = 64 * 1024
+# Tags of the entries in a sitemap (<urlset>) and a sitemap index (<sitemapindex>)
+ENTRY_TAGS = ('url', 'sitemap')
+
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    lastmod: str|None = None
+    # True if the entry is a child sitemap of a sitemap index
+    is_sitemap: bool = False
+
+
+def _local_name(tag: str) -> str:
+    """Remove the namespace from the tag ('{http://www.sitemaps.org/schemas/sitemap/0.9}loc' -> 'loc')"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Decompress the chunks if they are gzipped (Detected by the magic bytes), otherwise pass them through"""
+    decompressor = None
+    chunks = iter(chunks)
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if decompressor is None:
+            if not chunk.startswith(GZIP_MAGIC):
+                yield chunk
+                yield from chunks
+                return
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(chunk)
+        # Concatenated gzip members. Anything else after the last member (For eg, zero padding) is ignored
+        while decompressor.unused_data.startswith(GZIP_MAGIC):
+            rest = decompressor.unused_data
+            data += decompressor.flush()
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data += decompressor.decompress(rest)
+        if data:
+            yield data
+    if decompressor is not None:
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+def _iter_text_lines(first: bytes, chunks: Iterator[bytes]) -> Iterator[SitemapEntry]:
+    """Yield every url of a plain-text sitemap"""
+    pending = b''
+    for chunk in _prepend(first, chunks):
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            url = line.strip().decode('utf-8', errors='replace')
+            if url.startswith(('http://', 'https://')):
+                yield SitemapEntry(url)
+    url = pending.strip().decode('utf-8', errors='replace')
+    if url.startswith(('http://', 'https://')):
+        yield SitemapEntry(url)
+
+
+def iter_sitemap_entries(chunks: Iterable[bytes]) -> Iterator[SitemapEntry]:
+    """
+    Parse a sitemap incrementally from its raw (optionally gzipped) chunks. Parsing stops at the first XML error.
+    Args:
+        chunks (Iterable[bytes]): Sitemap content in chunks.
+    Yields:
+        SitemapEntry: (loc, lastmod, is_sitemap) of every entry as soon as it parsed.
+    """
+    try:
+        yield from _iter_entries(chunks)
+    except (ET.ParseError, zlib.error) as e:
+        logger.error(f'Error in parsing sitemap: {e}')
+
+
+def _iter_entries(chunks: Iterable[bytes]) -> Iterator[SitemapEntry]:
+    """Parse the sitemap chunks. Raises ET.ParseError if the content is not valid XML"""
+    chunks = iter(_gunzip(chunks))
+    first = b''
+    for chunk in chunks:
+        first += chunk
+        # Wait for the whole byte order mark if it is split between the chunks
+        if UTF8_BOM.startswith(first) and len(first) < len(UTF8_BOM):
+            continue
+        # The byte order mark and the leading whitespace are removed before the content type is sniffed
+        first = first.removeprefix(UTF8_BOM).lstrip()
+        if first:
+            break
+    if not first:
+        return
+    if not first.startswith(b'<'):
+        yield from _iter_text_lines(first, chunks)
+        return
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    # Local names of the open elements, so only the <loc>/<lastmod> children of an entry are read (Not <image:loc> inside <image:image>)
+    path: list[str] = []
+    loc: str|None = None
+    lastmod: str|None = None
+    for chunk in _prepend(first, chunks):
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = elem
+                path.append(_local_name(elem.tag))
+                continue
+            name = path.pop()
+            in_entry = bool(path) and path[-1] in ENTRY_TAGS
+            if name == 'loc' and in_entry:
+                loc = (elem.text or '').strip()
+            elif name == 'lastmod' and in_entry:
+                lastmod = (elem.text or '').strip() or None
+            elif name in ENTRY_TAGS:
+                if loc:
+                    yield SitemapEntry(loc, lastmod, name == 'sitemap')
+                loc = lastmod = None
+                # Drop the parsed entries, so the tree never grows
+                root.clear()
+    parser.close()
+
+
+def _prepend(first: bytes, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Yield the first chunk then the rest of the chunks"""
+    yield first
+    yield from chunks
+
+
+def iter_sitemap_text(content: str) -> Iterator[SitemapEntry]:
+    """
+    Parse an already downloaded sitemap (For eg, page source from selenium).
+    Falls back to regex if the content is not valid XML (For eg, an XML file rendered as HTML by the browser).
+    Args:
+        content (str): The sitemap content.
+    Yields:
+        SitemapEntry: (loc, lastmod, is_sitemap) of every entry.
+    """
+    content = content.lstrip('\ufeff').strip()
+    if not content:
+        return
+    # Remove XML declaration because encoding declaration is not allowed in a decoded string
+    data = re.sub(r'^<\?xml.*?\?>', '', content, count=1, flags=re.S).encode('utf-8')
+    yielded = 0
+    try:
+        for entry in _iter_entries([data]):
+            yielded += 1
+            yield entry
+    except ET.ParseError as e:
+        if yielded:
+            logger.error(f'Error in parsing sitemap: {e}')
+        else:
+            yield from _iter_regex_entries(content)
+
+
+def _iter_regex_entries(content: str) -> Iterator[SitemapEntry]:
+    """Extract the entries of a malformed sitemap with regex"""
+    found = False
+    for prefix, tag, block in re.findall(r"<((?:\w+:)?)(url|sitemap)\b[^>]*>(.*?)</\1(?:url|sitemap)>", content, re.S):
+        # The children of the entry have its prefix (<image:loc> of an image sitemap is not the loc of the entry)
+        prefix = re.escape(prefix)
+        loc = re.search(rf"<{prefix}loc>\s*(.*?)\s*</{prefix}loc>", block, re.S)
+        if not loc:
+            continue
+        lastmod = re.search(rf"<{prefix}lastmod>\s*(.*?)\s*</{prefix}lastmod>", block, re.S)
+        found = True
+        yield SitemapEntry(loc.group(1), lastmod.group(1) if lastmod else None, tag == 'sitemap')
+    if not found:
+        for link in re.findall(r"<loc>(.*?)</loc>", content, re.S):
+            yield SitemapEntry(link.strip())
+
+
+def stream_sitemap(url: str, timeout: float=5, chunk_size: int=CHUNK_SIZE) -> Iterator[SitemapEntry]:
+    """
+    Download and parse the sitemap at the same time. Nothing is yielded if the sitemap could not be fetched.
+    Args:
+        url (str): Url of the sitemap (.xml, .xml.gz or .txt).
+        timeout (float): Timeout in seconds to connect and between the received chunks.
+        chunk_size (int): Size of the chunks read from the connection.
+    Yields:
+        SitemapEntry: (loc, lastmod, is_sitemap) of every entry.
+    """
+    try:
+        with http_get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            # iter_content removes the Content-Encoding compression, a .xml.gz file itself is detected by its magic bytes
+            yield from iter_sitemap_entries(response.iter_content(chunk_size=chunk_size))
+    except Exception as e:
+        logger.error(f'Error in fetching sitemap "{url}": {e}')
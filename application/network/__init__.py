@@ -0,0 +1,4 @@
+"""
+Provides the shared HTTP client layer. Every module should fetch web pages through it to reuse connections, retries and timeouts
+
+"""
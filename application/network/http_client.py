@@ -0,0 +1,106 @@
+"""
+This module provides the shared HTTP clients used for fetching web pages.
+Connections are pooled per host and kept alive, responses are compressed (gzip, deflate and brotli/zstd when their libraries are installed),
+failed requests are retried with exponential backoff and every request has a timeout.
+requests sessions are kept per thread because requests.Session is not guaranteed to be thread-safe.
+"""
+
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+import config
+
+
+# Status codes that are worth to be retried
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+DEFAULT_HEADERS: dict[str, str] = {
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+}
+
+_local = threading.local()
+
+
+def create_session(
+    pool_connections: int = config.HTTP_POOL_CONNECTIONS,
+    pool_maxsize: int = config.HTTP_POOL_MAXSIZE,
+    retries: int = config.HTTP_RETRIES,
+    backoff_factor: float = config.HTTP_BACKOFF_FACTOR
+) -> requests.Session:
+    """
+    Create a requests session with pooled keep-alive connections and retries.
+    Args:
+        pool_connections (int): Number of hosts whose connection pools are cached.
+        pool_maxsize (int): Maximum number of connections kept alive per host.
+        retries (int): Number of retries for connection errors and retryable status codes.
+        backoff_factor (float): Exponential backoff factor (in seconds) between retries.
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        # Return the last response instead of raising, so callers decide with raise_for_status
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared session of the current thread (created on first use)"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = create_session()
+        _local.session = session
+    return session
+
+
+def http_get(url: str, timeout: float|None = None, **kwargs) -> requests.Response:
+    """
+    Send a GET request through the shared session of the current thread.
+    Args:
+        url (str): Url to fetch.
+        timeout (float|None): Timeout in seconds. Defaults to config.REQUEST_TIMEOUT.
+        **kwargs: Other arguments passed to requests.Session.get (For eg, headers or stream).
+    Returns:
+        requests.Response: The response (Call raise_for_status() to check it).
+    Raises:
+        requests.RequestException: If the request failed after all the retries.
+    """
+    return get_session().get(url, timeout=config.REQUEST_TIMEOUT if timeout is None else timeout, **kwargs)
+
+
+def create_async_session(concurrency: int = config.CONCURRENCY, timeout: float = config.REQUEST_TIMEOUT) -> aiohttp.ClientSession:
+    """
+    Create an aiohttp session with pooled keep-alive connections for the crawl engine (Must be created inside a running event loop).
+    Args:
+        concurrency (int): Maximum number of open connections.
+        timeout (float): Total timeout in seconds for every request.
+    Returns:
+        aiohttp.ClientSession: The configured session. aiohttp negotiates and decompresses the supported encodings itself.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=min(concurrency, config.HTTP_POOL_MAXSIZE),
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={'Connection': 'keep-alive'},
+    )
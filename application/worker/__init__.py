@@ -0,0 +1,5 @@
+"""
+Provides the distributed worker mode. Product urls are published to a RabbitMQ queue and any number of workers on any number of
+machines consume them, scrape them and store the products. A message is acknowledged only after its product is written
+
+"""
@@ -0,0 +1,194 @@
+"""
+Message brokers used by ScrapeWorker. Both brokers have the same small API:
+    publish(body), consume(timeout) -> Delivery|None, ack(delivery_tag), nack(delivery_tag, requeue), dead_letter(delivery),
+    process_events() and close()
+RabbitMQBroker talks to a real RabbitMQ server with pika and InMemoryBroker is an in-process stand-in with the same delivery
+semantics (prefetch limit, redelivery of nacked and unacknowledged messages) used for tests and local runs.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Iterable, NamedTuple
+from logger.logger import setup_logger
+import config
+
+try:
+    import pika
+except ImportError:
+    pika = None
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+class Delivery(NamedTuple):
+    """A message received from the broker"""
+    body: bytes
+    delivery_tag: int
+    redelivered: bool = False
+
+
+class InMemoryBroker:
+    """In-process broker with RabbitMQ-like semantics. At most prefetch messages are delivered without being acknowledged,
+    nacked messages may be requeued (at the front, marked as redelivered) and unacknowledged messages are requeued on close.\n
+    Usage:\n
+        broker = InMemoryBroker(prefetch=10)
+        broker.publish_many(urls)
+        worker = ScrapeWorker(broker)
+    """
+    def __init__(self, prefetch: int=config.WORKER_PREFETCH) -> None:
+        self.prefetch: int = max(1, prefetch)
+        self._ready: deque[tuple[bytes, bool]] = deque()
+        self._unacked: dict[int, bytes] = {}
+        self.dead: list[bytes] = []
+        self._next_tag: int = 1
+        self._condition = threading.Condition()
+
+    def publish(self, body: bytes|str) -> None:
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self._condition:
+            self._ready.append((body, False))
+            self._condition.notify()
+
+    def publish_many(self, bodies: Iterable[bytes|str]) -> int:
+        count = 0
+        for body in bodies:
+            self.publish(body)
+            count += 1
+        return count
+
+    def consume(self, timeout: float=0) -> Delivery|None:
+        """Return the next message, waiting up to timeout seconds for one. None if no message can be delivered"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._ready or len(self._unacked) >= self.prefetch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            body, redelivered = self._ready.popleft()
+            tag = self._next_tag
+            self._next_tag += 1
+            self._unacked[tag] = body
+            return Delivery(body, tag, redelivered)
+
+    def ack(self, delivery_tag: int) -> None:
+        with self._condition:
+            self._unacked.pop(delivery_tag, None)
+            self._condition.notify()
+
+    def nack(self, delivery_tag: int, requeue: bool=True) -> None:
+        with self._condition:
+            body = self._unacked.pop(delivery_tag, None)
+            if body is not None and requeue:
+                self._ready.appendleft((body, True))
+            self._condition.notify()
+
+    def dead_letter(self, delivery: Delivery) -> None:
+        """Move the message to the dead letter list"""
+        with self._condition:
+            body = self._unacked.pop(delivery.delivery_tag, None)
+            if body is not None:
+                self.dead.append(body)
+            self._condition.notify()
+
+    def process_events(self) -> None:
+        """Nothing to do, there is no connection to keep alive"""
+
+    def counts(self) -> dict[str, int]:
+        """Return number of messages waiting to be delivered and delivered but not acknowledged"""
+        with self._condition:
+            return {'ready': len(self._ready), 'unacked': len(self._unacked)}
+
+    def close(self) -> None:
+        """Requeue the unacknowledged messages like RabbitMQ does when a consumer disconnects"""
+        with self._condition:
+            for tag in sorted(self._unacked, reverse=True):
+                self._ready.appendleft((self._unacked.pop(tag), True))
+            self._condition.notify_all()
+
+
+class RabbitMQBroker:
+    """Broker backed by a durable RabbitMQ queue. basic_qos(prefetch_count) limits the messages a worker holds without
+    acknowledging them, so a slow worker never hoards the queue while the other workers are idle.\n
+    Usage:\n
+        broker = RabbitMQBroker()
+        worker = ScrapeWorker(broker)
+        worker.run()
+    """
+    def __init__(self, url: str=config.RABBITMQ_URL, queue: str=config.QUEUE_NAME, prefetch: int=config.WORKER_PREFETCH, dead_letter_queue: str=config.DEAD_LETTER_QUEUE) -> None:
+        """
+        Args:
+            url (str): The AMQP url of the RabbitMQ server.
+            queue (str): Name of the queue. It is declared durable if it does not exist.
+            prefetch (int): Maximum number of unacknowledged messages delivered to this consumer.
+            dead_letter_queue (str): Durable queue of the messages given up by dead_letter().
+        Raises:
+            ImportError: If pika is not installed.
+        """
+        if pika is None:
+            raise ImportError('pika is required to use RabbitMQ (pip install pika)')
+        self.queue: str = queue
+        self.dead_letter_queue: str = dead_letter_queue
+        self.prefetch: int = max(1, prefetch)
+        self.connection = pika.BlockingConnection(pika.URLParameters(url))
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=queue, durable=True)
+        self.channel.queue_declare(queue=dead_letter_queue, durable=True)
+        self.channel.basic_qos(prefetch_count=self.prefetch)
+        self._ready: deque[Delivery] = deque()
+        self._consumer_tag: str|None = None
+
+    def _on_message(self, channel, method, properties, body: bytes) -> None:
+        self._ready.append(Delivery(body, method.delivery_tag, method.redelivered))
+
+    def publish(self, body: bytes|str, queue: str|None=None) -> None:
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        # delivery_mode=2 keeps the message on disk until it is acknowledged
+        self.channel.basic_publish(exchange='', routing_key=queue or self.queue, body=body, properties=pika.BasicProperties(delivery_mode=2))
+
+    def publish_many(self, bodies: Iterable[bytes|str]) -> int:
+        count = 0
+        for body in bodies:
+            self.publish(body)
+            count += 1
+        return count
+
+    def consume(self, timeout: float=0) -> Delivery|None:
+        """Return the next message, waiting up to timeout seconds for one. None if no message arrived"""
+        if self._consumer_tag is None:
+            self._consumer_tag = self.channel.basic_consume(queue=self.queue, on_message_callback=self._on_message)
+        deadline = time.monotonic() + timeout
+        while not self._ready:
+            remaining = deadline - time.monotonic()
+            self.connection.process_data_events(time_limit=max(0, remaining))
+            if remaining <= 0 and not self._ready:
+                return None
+        return self._ready.popleft()
+
+    def ack(self, delivery_tag: int) -> None:
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+
+    def nack(self, delivery_tag: int, requeue: bool=True) -> None:
+        self.channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+    def dead_letter(self, delivery: Delivery) -> None:
+        """Publish the message to the dead letter queue and acknowledge it"""
+        self.publish(delivery.body, queue=self.dead_letter_queue)
+        self.channel.basic_ack(delivery_tag=delivery.delivery_tag)
+
+    def process_events(self) -> None:
+        """Answer heartbeats and buffer the arriving messages without waiting. BlockingConnection does it only while it is
+        called, so the worker calls this while a batch is scraped or the server closes the connection after missed heartbeats"""
+        self.connection.process_data_events(time_limit=0)
+
+    def close(self) -> None:
+        """Close the connection. RabbitMQ requeues the messages that are not acknowledged"""
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception as e:
+            logger.error(f'Error closing RabbitMQ connection: {e.__str__()}')
@@ -0,0 +1,187 @@
+"""
+ScrapeWorker consumes product urls from a broker (RabbitMQ or the in-process stand-in), scrapes them with Extractor and stores the
+products. Messages are taken in batches of at most prefetch urls, scraped concurrently, upserted in a single transaction and
+acknowledged only after that transaction committed. If the worker dies before it, the broker delivers the urls to another worker.
+A url whose product cannot be stored is requeued up to WORKER_MAX_WRITE_ATTEMPTS times and then moved to the dead letter queue.
+"""
+
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from application.crawler.incremental import CrawlState
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+from application.data_management.price_history import PriceTracker
+from application.driver.pool import DriverPool
+from application.extractor.extract import Extractor
+from application.worker.broker import Delivery
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+class ScrapeWorker:
+    """Worker that scrapes the urls delivered by the broker and acknowledges them after the products are stored.\n
+    Usage:\n
+        worker = ScrapeWorker(RabbitMQBroker())
+        worker.run()
+    """
+    def __init__(self, broker, method: str=config.METHOD, threads: int=config.WORKER_THREADS, idle_timeout: float=config.WORKER_IDLE_TIMEOUT, incremental: bool=config.INCREMENTAL_CRAWL, db_file: str=config.DB_FILE, connection: sqlite3.Connection|None=None) -> None:
+        """
+        Args:
+            broker (InMemoryBroker|RabbitMQBroker): The broker the urls are consumed from.
+            method (str): 'requests' or 'selenium'.
+            threads (int): Number of urls of a batch scraped at the same time.
+            idle_timeout (float): Seconds to wait for a message before the batch collected so far is processed.
+            incremental (bool): Skip parsing and writing the pages whose content did not change since the last crawl.
+            db_file (str): The SQLite database file. Not used if connection is provided.
+            connection (sqlite3.Connection|None): Already opened connection to be used instead of opening a new one.
+        """
+        self.broker = broker
+        self.method: str = method
+        self.threads: int = max(1, threads)
+        self.idle_timeout: float = idle_timeout
+        # A batch never holds more messages than the broker delivers without acknowledgement
+        self.batch_size: int = max(1, getattr(broker, 'prefetch', self.threads))
+        self._owns_connection: bool = connection is None
+        self.connection: sqlite3.Connection|None = connection or SQLiteDBInit(db_file).connection
+        self.crud: ProductsCRUD = ProductsCRUD(self.connection)
+        self.price_tracker: PriceTracker = PriceTracker(self.connection)
+        self.crawl_state: CrawlState|None = CrawlState(connection=self.connection) if incremental else None
+        self.driver_pool: DriverPool|None = None
+        self.processed: int = 0
+        self._rows: list[dict] = []
+        # Urls of the current batch whose product was added (Extractor may return 'ok' without adding one)
+        self._added: set[str] = set()
+        # Number of failed writes of the urls requeued by this worker
+        self._write_failures: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add(self, product_data: dict) -> bool:
+        """Buffer the product of the current batch. Called by Extractor as its writer"""
+        with self._lock:
+            self._rows.append(product_data)
+            self._added.add(product_data.get('url'))
+        return True
+
+    def stop(self) -> None:
+        """Stop the worker after the current batch"""
+        self._stop.set()
+
+    def run(self, max_messages: int|None=None, stop_when_idle: bool=False) -> int:
+        """
+        Consume and process messages until stop() is called.
+        Args:
+            max_messages (int|None): Stop after this number of messages is processed.
+            stop_when_idle (bool): Stop when no message arrived in idle_timeout seconds.
+        Returns:
+            int: Number of the messages processed (acknowledged or rejected).
+        """
+        if self.method == 'selenium' and self.driver_pool is None:
+            self.driver_pool = DriverPool(size=min(self.threads, config.DRIVER_POOL_SIZE))
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                while not self._stop.is_set():
+                    limit = self.batch_size if max_messages is None else min(self.batch_size, max_messages - self.processed)
+                    if limit <= 0:
+                        break
+                    batch = self._next_batch(limit)
+                    if not batch:
+                        if stop_when_idle:
+                            break
+                        continue
+                    self.process_batch(batch, executor)
+        finally:
+            if self.driver_pool:
+                self.driver_pool.close()
+                self.driver_pool = None
+        logger.info(f'Worker stopped after {self.processed} message(s)')
+        return self.processed
+
+    def _next_batch(self, limit: int) -> list[Delivery]:
+        """Wait for a message, then take the messages already available up to limit"""
+        delivery = self.broker.consume(timeout=self.idle_timeout)
+        if delivery is None:
+            return []
+        batch = [delivery]
+        while len(batch) < limit:
+            delivery = self.broker.consume(timeout=0)
+            if delivery is None:
+                break
+            batch.append(delivery)
+        return batch
+
+    def process_batch(self, batch: list[Delivery], executor: ThreadPoolExecutor) -> None:
+        """Scrape the batch, store its products in one transaction and acknowledge the messages"""
+        with self._lock:
+            self._rows = []
+            self._added = set()
+        futures = [executor.submit(self._scrape, delivery) for delivery in batch]
+        # Keep the broker connection alive (heartbeats) while the urls are scraped
+        while wait(futures, timeout=config.WORKER_EVENTS_INTERVAL).not_done:
+            self.broker.process_events()
+        outcomes = [future.result() for future in futures]
+        self.broker.process_events()
+        with self._lock:
+            rows, self._rows = self._rows, []
+            added, self._added = self._added, set()
+        written = self.crud.upsert_products(rows, price_tracker=self.price_tracker) if rows else True
+        if not written:
+            logger.error(f'Failed to write {len(rows)} product(s), the batch is requeued')
+        for delivery, (status, url, digest) in zip(batch, outcomes):
+            if (status == 'ok' and written and url in added) or status == 'not_modified':
+                if self.crawl_state is not None:
+                    self.crawl_state.record(url, 200, digest=digest)
+                self._write_failures.pop(url, None)
+                self.broker.ack(delivery.delivery_tag)
+            elif status == 'ok' and url in added:
+                failures = self._write_failures.get(url, 0) + 1
+                if failures >= config.WORKER_MAX_WRITE_ATTEMPTS:
+                    logger.error(f'Product of {url} could not be stored {failures} times, moved to the dead letter queue')
+                    self._write_failures.pop(url, None)
+                    self.broker.dead_letter(delivery)
+                else:
+                    self._write_failures[url] = failures
+                    self.broker.nack(delivery.delivery_tag, requeue=True)
+            elif status == 'ok':
+                # Scraped without a product (An error was swallowed), it is tried once more like a failed url
+                logger.error(f'No product stored for {url}')
+                self.broker.nack(delivery.delivery_tag, requeue=not delivery.redelivered)
+            else:
+                # A failed url is tried once more (by any worker) and then dropped
+                self.broker.nack(delivery.delivery_tag, requeue=status == 'error' and not delivery.redelivered)
+        if self.crawl_state is not None:
+            self.crawl_state.flush()
+        self.processed += len(batch)
+        logger.info(f'Batch of {len(batch)} message(s) processed, {len(rows)} product(s) written')
+
+    def _scrape(self, delivery: Delivery) -> tuple[str, str, str|None]:
+        """Scrape the url of the message. Returns the status ('ok', 'not_modified', 'error' or 'invalid' if it is not a url), the url
+        and the fingerprint of the page"""
+        try:
+            url = "".join(delivery.body.decode('utf-8').split())
+        except UnicodeDecodeError:
+            url = ''
+        if not url.startswith(('http://', 'https://')):
+            logger.error(f'Invalid message rejected: {delivery.body[:100]!r}')
+            return 'invalid', url, None
+        try:
+            if self.method == 'selenium':
+                extractor = Extractor(url, method='selenium', driver_pool=self.driver_pool, writer=self, crawl_state=self.crawl_state)
+            else:
+                extractor = Extractor(url, method='requests', writer=self, crawl_state=self.crawl_state)
+            return extractor.scrape().get('status', 'error'), url, extractor.digest
+        except Exception as e:
+            logger.error(f'Error scraping {url}: {e.__str__()}')
+            return 'error', url, None
+
+    def close(self) -> None:
+        """Close the broker and the connection if it opened by the worker"""
+        self.broker.close()
+        if self.crawl_state is not None:
+            self.crawl_state.close()
+        if self._owns_connection and self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,6 @@
+"""
+Benchmarks of the scraper. Run them from the project root, for eg:
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_parsers --corpus benchmarks/corpus/pages
+    python -m benchmarks.load_test --products 2000 --concurrency 8 16 32
+"""
@@ -0,0 +1,141 @@
+"""
+Compare the parser backends on a corpus of saved product pages.
+For every backend it measures the time to parse the pages, the time to run the css field finders of Extractor on them and
+the peak RSS of parsing them. The memory of every backend is measured in its own subprocess, so the C parsers (lxml,
+selectolax) are counted and one backend does not raise the peak of the next. Without a corpus, synthetic product pages
+are generated.
+
+Usage:
+    python -m benchmarks.bench_parsers [--corpus DIR] [--backends html.parser lxml selectolax] [--repeat 3] [--json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from benchmarks.bench_suite import peak_rss_mb
+from application.extractor.extract import Extractor
+from application.extractor.parsers import available_backends, parse_html
+
+
+def make_synthetic_page(index: int, size_kb: int=300) -> str:
+    """Build a product page of about size_kb kilobytes (Mostly markup like the real shops have)"""
+    filler_item = '<div class="card"><a href="/product/{0}"><img src="/img/{0}.jpg" alt="item {0}"><span class="title">Item {0}</span></a></div>'
+    filler: list[str] = []
+    size = 0
+    i = 0
+    while size < size_kb * 1024:
+        item = filler_item.format(i)
+        filler.append(item)
+        size += len(item)
+        i += 1
+    return (
+        '<!DOCTYPE html><html><head><title>Product {0}</title>'
+        '<script type="application/ld+json">{{"@context": "https://schema.org", "@type": "Product", "name": "Product {0}"}}</script>'
+        '</head><body><h1>Product {0}</h1><div class="price">{0}.99</div><div class="description">Description {0}</div>'
+        '<div class="images"><img src="/img/main-{0}.jpg"></div><div class="brand">Brand</div><div class="category">Category</div>'
+        '{1}</body></html>'
+    ).format(index, ''.join(filler))
+
+
+def load_corpus(corpus: str|None, synthetic: int) -> list[str]:
+    """Read every .html file of the corpus directory, or generate synthetic pages"""
+    if corpus:
+        pages = [path.read_text(encoding='utf-8', errors='replace') for path in sorted(Path(corpus).glob('**/*.htm*'))]
+        if pages:
+            return pages
+    return [make_synthetic_page(i) for i in range(synthetic)]
+
+
+def parse_rss(backend: str, pages: list[str]) -> dict:
+    """Parse every page with the backend in this process and report the peak RSS before and after (MiB)"""
+    loaded = peak_rss_mb()
+    for page in pages:
+        document = parse_html(page, backend)
+        del document
+    peak = peak_rss_mb()
+    return {'peak_rss_mb': peak, 'parse_rss_mb': peak - loaded if peak is not None else None}
+
+
+def measure_rss(backend: str, corpus: str|None, synthetic: int) -> dict:
+    """
+    Run parse_rss for the backend in a new Python process.
+    Args:
+        backend (str): Parser backend.
+        corpus (str|None): Directory of saved product pages.
+        synthetic (int): Number of synthetic pages if no corpus found.
+    Returns:
+        dict: {'peak_rss_mb': float|None, 'parse_rss_mb': float|None}, None values if the subprocess failed.
+    """
+    command = [sys.executable, '-m', 'benchmarks.bench_parsers', '--rss-of', backend, '--synthetic', str(synthetic)]
+    if corpus:
+        command += ['--corpus', corpus]
+    result = subprocess.run(command, cwd=Path(__file__).parent.parent, capture_output=True, text=True)
+    try:
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        print(f'Measuring the memory of {backend} failed: {result.stderr.strip()}', file=sys.stderr)
+        return {'peak_rss_mb': None, 'parse_rss_mb': None}
+
+
+def bench_backend(backend: str, pages: list[str], repeat: int, memory: dict|None=None) -> dict:
+    """Measure parse and extract time (Best of repeat runs) of the backend, memory is the result of measure_rss"""
+    parse_runs: list[float] = []
+    extract_runs: list[float] = []
+    for _ in range(repeat):
+        parse_time = extract_time = 0.0
+        for page in pages:
+            started_at = time.perf_counter()
+            document = parse_html(page, backend)
+            parsed_at = time.perf_counter()
+            extractor = Extractor('https://example.com/product', method='requests', html_body=page, soup=document, parser_backend=backend)
+            extractor._extract_fields()
+            parse_time += parsed_at - started_at
+            extract_time += time.perf_counter() - parsed_at
+        parse_runs.append(parse_time)
+        extract_runs.append(extract_time)
+    parse_best, extract_best = min(parse_runs), min(extract_runs)
+    total = parse_best + extract_best
+    return {
+        'backend': backend,
+        'pages': len(pages),
+        'parse_ms_per_page': parse_best / len(pages) * 1000,
+        'extract_ms_per_page': extract_best / len(pages) * 1000,
+        'pages_per_second': len(pages) / total if total else 0.0,
+        **(memory or {'peak_rss_mb': None, 'parse_rss_mb': None}),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--corpus', help='Directory of saved product pages (.html)')
+    arg_parser.add_argument('--backends', nargs='+', default=available_backends(), help='Parser backends to compare')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Number of runs (The best one is reported)')
+    arg_parser.add_argument('--synthetic', type=int, default=20, help='Number of synthetic pages if no corpus found')
+    arg_parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    arg_parser.add_argument('--rss-of', metavar='BACKEND', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    pages = load_corpus(args.corpus, args.synthetic)
+    if args.rss_of:
+        # Subprocess of measure_rss
+        print(json.dumps(parse_rss(args.rss_of, pages)))
+        return
+    missing = [backend for backend in args.backends if backend not in available_backends()]
+    if missing:
+        print(f'Skipping backends that are not installed: {", ".join(missing)}')
+    results = [bench_backend(backend, pages, max(1, args.repeat), measure_rss(backend, args.corpus, args.synthetic))
+               for backend in args.backends if backend not in missing]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"backend":<12} {"parse ms/page":>14} {"extract ms/page":>16} {"pages/s":>9} {"peak RSS MiB":>13} {"parse MiB":>10}')
+    for result in results:
+        peak, growth = (f'{result[key]:.1f}' if result[key] is not None else '-' for key in ('peak_rss_mb', 'parse_rss_mb'))
+        print(f'{result["backend"]:<12} {result["parse_ms_per_page"]:>14.2f} {result["extract_ms_per_page"]:>16.2f} '
+              f'{result["pages_per_second"]:>9.1f} {peak:>13} {growth:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Throughput benchmarks of the hot paths of the scraper on the bundled corpus (benchmarks/corpus): saved product pages,
+robots.txt files and sitemaps. Every benchmark reports µs per call and its throughput (pages/s, calls/s or rows/s), the
+suite reports the peak RSS of the process. Nothing is fetched, the database benchmarks run on a temporary SQLite file.
+The results are compared with the stored baseline (benchmarks/baseline.json) and the command fails if a benchmark got slower
+than the tolerance. Baselines are machine dependent: save a new one on the machine that runs the comparison.
+
+Usage:
+    python -m benchmarks.bench_suite [--only json_ld_scan robots_is_allowed] [--repeat 5] [--json]
+    python -m benchmarks.bench_suite --save-baseline
+    python -m benchmarks.bench_suite --tolerance 0.3 --baseline path/to/baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+from application.extractor._resources import to_english_digits
+from application.extractor.extract import Extractor
+from application.extractor.robots_parser import RobotsTxtParser
+from application.extractor.sitemap import iter_sitemap_entries
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+CORPUS_DIR = Path(__file__).parent / 'corpus'
+BASELINE_FILE = Path(__file__).parent / 'baseline.json'
+# Allowed slowdown of µs per call against the baseline before a benchmark counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# Every benchmark runs for at least this many seconds per repeat, so the fast ones are not dominated by timer overhead
+MIN_RUN_TIME = 0.2
+
+ROBOTS_PATHS = [
+    '/product/item-1/', '/wp-admin/options.php', '/wp-admin/admin-ajax.php', '/cart/', '/shop/?orderby=price',
+    '/category-42/products/phone', '/category-42/x/compare', '/category-7/shoes?sort_7=asc', '/account/orders', '/feed.json',
+]
+DIGIT_TEXTS = ['۱۸,۴۹۰,۰۰۰ تومان', '٢٣٥٠٠٠٠ ریال', 'Price: 89.00 USD', 'کد محصول ۱۲۳۴۵۶۷۸۹۰ - موجود در انبار']
+
+
+def load_corpus(corpus_dir: Path=CORPUS_DIR) -> dict[str, dict[str, str|bytes]]:
+    """Read the pages, robots files and sitemaps of the corpus. Returns {kind: {file name: content}}"""
+    return {
+        'pages': {path.name: path.read_text(encoding='utf-8') for path in sorted((corpus_dir / 'pages').glob('*.htm*'))},
+        'robots': {path.name: path.read_text(encoding='utf-8') for path in sorted((corpus_dir / 'robots').glob('*.txt'))},
+        'sitemaps': {path.name: path.read_bytes() for path in sorted((corpus_dir / 'sitemaps').glob('*.xml*'))},
+    }
+
+
+def measure(func: Callable[[], int], repeat: int) -> tuple[float, int]:
+    """
+    Run func in a loop for at least MIN_RUN_TIME, repeat times.
+    Args:
+        func (Callable[[], int]): Runs the benchmarked code once and returns the number of items (pages, calls or rows) it processed.
+    Returns:
+        tuple[float, int]: Seconds per run of the best repeat and number of items of a run.
+    """
+    items = func()    # Warm up (Regex compiling, matcher building, imports)
+    best = float('inf')
+    for _ in range(max(1, repeat)):
+        runs = 0
+        started_at = time.perf_counter()
+        while True:
+            func()
+            runs += 1
+            elapsed = time.perf_counter() - started_at
+            if elapsed >= MIN_RUN_TIME:
+                break
+        best = min(best, elapsed / runs)
+    return best, items
+
+
+def make_result(seconds_per_run: float, items: int, unit: str) -> dict:
+    """Build the result of a benchmark from the time of a run that processed items"""
+    return {
+        'us_per_call': seconds_per_run / max(1, items) * 1_000_000,
+        f'{unit}_per_second': items / seconds_per_run if seconds_per_run else 0.0,
+    }
+
+
+def page_extractors(corpus: dict) -> list[Extractor]:
+    return [Extractor(f'https://example.com/product/{name}', method='requests', html_body=page) for name, page in corpus['pages'].items()]
+
+
+def bench_json_ld_scan(corpus: dict, repeat: int) -> dict:
+    """Extractor._scrape_json_ld: Find the JSON-LD scripts of the page and load the Product"""
+    extractors = page_extractors(corpus)
+    def run() -> int:
+        for extractor in extractors:
+            extractor._scrape_json_ld()
+        return len(extractors)
+    return make_result(*measure(run, repeat), 'pages')
+
+
+def bench_json_ld_extract(corpus: dict, repeat: int) -> dict:
+    """Extractor._extract_json_ld_data: Normalize the loaded JSON-LD Product"""
+    pairs = [(extractor, data) for extractor in page_extractors(corpus) if (data := extractor._scrape_json_ld())]
+    def run() -> int:
+        for extractor, data in pairs:
+            extractor._extract_json_ld_data(data)
+        return len(pairs)
+    return make_result(*measure(run, repeat), 'calls')
+
+
+def bench_extract_page(corpus: dict, repeat: int) -> dict:
+    """Extractor.extract: The whole extraction of the page (JSON-LD or the css fallback)"""
+    pages = list(corpus['pages'].items())
+    def run() -> int:
+        for name, page in pages:
+            Extractor(f'https://example.com/product/{name}', method='requests', html_body=page).extract()
+        return len(pages)
+    return make_result(*measure(run, repeat), 'pages')
+
+
+def bench_to_english_digits(corpus: dict, repeat: int) -> dict:
+    """to_english_digits on short price and product texts"""
+    def run() -> int:
+        for text in DIGIT_TEXTS:
+            to_english_digits(text)
+        return len(DIGIT_TEXTS)
+    return make_result(*measure(run, repeat), 'calls')
+
+
+def bench_robots_is_allowed(corpus: dict, repeat: int) -> dict:
+    """RobotsTxtParser.is_allowed on every robots file of the corpus (Parsed once)"""
+    parsers: list[RobotsTxtParser] = []
+    for content in corpus['robots'].values():
+        parser = RobotsTxtParser('https://example.com')
+        parser._parse_content(content)
+        parsers.append(parser)
+    def run() -> int:
+        for parser in parsers:
+            for path in ROBOTS_PATHS:
+                parser.is_allowed('scraper-bot', path)
+        return len(parsers) * len(ROBOTS_PATHS)
+    return make_result(*measure(run, repeat), 'calls')
+
+
+def bench_sitemap_parse(corpus: dict, repeat: int) -> dict:
+    """iter_sitemap_entries on the sitemaps of the corpus, fed in 64 KiB chunks like a streamed response"""
+    chunk_size = 64 * 1024
+    sitemaps = [[content[i:i + chunk_size] for i in range(0, len(content), chunk_size)] for content in corpus['sitemaps'].values()]
+    def run() -> int:
+        return sum(1 for chunks in sitemaps for _ in iter_sitemap_entries(chunks))
+    return make_result(*measure(run, repeat), 'entries')
+
+
+def make_products(count: int, offset: int=0) -> list[dict]:
+    """Build product rows like the ones extracted from the corpus"""
+    return [{
+        'url': f'https://example.com/product/item-{offset + i}/',
+        'title': f'Product {offset + i}',
+        'name': f'Product {offset + i}',
+        'price': 1000.0 + i,
+        'description': 'Soft merino wool sweater. ' * 8,
+        'images': [f'https://example.com/images/item-{offset + i}-{j}.jpg' for j in range(4)],
+        'company_name': 'Northwind',
+        'category': ['Clothing', 'Sweaters'],
+    } for i in range(count)]
+
+
+def _bench_db(repeat: int, write: Callable[[ProductsCRUD, list[dict]], None], rows: int) -> dict:
+    """Time write of rows new products (Every run writes new urls, so the table grows like in a crawl)"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = SQLiteDBInit(os.path.join(temp_dir, 'bench.db'))
+        crud = ProductsCRUD(db.connection)
+        batches = (make_products(rows, offset) for offset in itertools.count(0, rows))
+        def run() -> int:
+            write(crud, next(batches))
+            return rows
+        try:
+            return make_result(*measure(run, repeat), 'rows')
+        finally:
+            db.connection.close()
+
+
+def bench_insert_product(corpus: dict, repeat: int) -> dict:
+    """ProductsCRUD.insert_product: One transaction per product"""
+    def write(crud: ProductsCRUD, products: list[dict]) -> None:
+        for product in products:
+            crud.insert_product(product)
+    return _bench_db(repeat, write, 200)
+
+
+def bench_upsert_products(corpus: dict, repeat: int) -> dict:
+    """ProductsCRUD.upsert_products: The products in batches of 500 (Like ProductWriter)"""
+    def write(crud: ProductsCRUD, products: list[dict]) -> None:
+        for i in range(0, len(products), 500):
+            crud.upsert_products(products[i:i + 500])
+    return _bench_db(repeat, write, 2000)
+
+
+BENCHMARKS: dict[str, Callable[[dict, int], dict]] = {
+    'json_ld_scan': bench_json_ld_scan,
+    'json_ld_extract': bench_json_ld_extract,
+    'extract_page': bench_extract_page,
+    'to_english_digits': bench_to_english_digits,
+    'robots_is_allowed': bench_robots_is_allowed,
+    'sitemap_parse': bench_sitemap_parse,
+    'insert_product': bench_insert_product,
+    'upsert_products': bench_upsert_products,
+}
+
+
+def peak_rss_mb() -> float|None:
+    """Peak resident memory of the process in MiB (None where the resource module is not available)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+def run_suite(names: list[str]|None=None, repeat: int=5, corpus_dir: Path=CORPUS_DIR) -> dict:
+    """
+    Run the benchmarks on the corpus.
+    Args:
+        names (list[str]|None): Benchmarks to run. All of them if not given.
+        repeat (int): Number of runs of every benchmark (The best one is reported).
+        corpus_dir (Path): Directory with the pages, robots and sitemaps sub directories.
+    Returns:
+        dict: {'benchmarks': {name: result}, 'peak_rss_mb': float|None, 'python': str, 'platform': str}
+    """
+    unknown = [name for name in names or [] if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f'Unknown benchmarks: {", ".join(unknown)}. Choose from {", ".join(BENCHMARKS)}')
+    corpus = load_corpus(corpus_dir)
+    results = {name: BENCHMARKS[name](corpus, repeat) for name in names or BENCHMARKS}
+    return {
+        'benchmarks': results,
+        'peak_rss_mb': peak_rss_mb(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float=DEFAULT_TOLERANCE) -> list[str]:
+    """Return a message for every benchmark whose µs per call is more than tolerance slower than the baseline"""
+    regressions: list[str] = []
+    for name, result in report['benchmarks'].items():
+        expected = baseline.get('benchmarks', {}).get(name, {}).get('us_per_call')
+        if not expected:
+            continue
+        change = result['us_per_call'] / expected - 1
+        result['change'] = change
+        if change > tolerance:
+            regressions.append(f'{name}: {result["us_per_call"]:.2f} µs per call, {change:+.0%} against the baseline ({expected:.2f} µs)')
+    return regressions
+
+
+def print_report(report: dict) -> None:
+    print(f'{"benchmark":<20} {"µs/call":>10} {"throughput":>22} {"vs baseline":>12}')
+    for name, result in report['benchmarks'].items():
+        unit = next(key for key in result if key.endswith('_per_second'))
+        throughput = f'{result[unit]:,.0f} {unit.removesuffix("_per_second")}/s'
+        change = f'{result["change"]:+.0%}' if 'change' in result else '-'
+        print(f'{name:<20} {result["us_per_call"]:>10.2f} {throughput:>22} {change:>12}')
+    if report['peak_rss_mb'] is not None:
+        print(f'peak RSS: {report["peak_rss_mb"]:.1f} MiB')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run (All by default)')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Number of runs (The best one is reported)')
+    arg_parser.add_argument('--corpus', type=Path, default=CORPUS_DIR, help='Corpus directory')
+    arg_parser.add_argument('--baseline', type=Path, default=BASELINE_FILE, help='Baseline file to compare with or save into')
+    arg_parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline')
+    arg_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Allowed slowdown against the baseline (0.25 = 25%%)')
+    arg_parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = arg_parser.parse_args()
+    # The log lines of every extracted page would flood the console (And time of the console is not what is measured)
+    logging.disable(logging.CRITICAL)
+    report = run_suite(args.only, max(1, args.repeat), args.corpus)
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+        print(f'Baseline saved into {args.baseline}')
+    regressions: list[str] = []
+    if not args.save_baseline and args.baseline.exists():
+        regressions = compare(report, json.loads(args.baseline.read_text(encoding='utf-8')), args.tolerance)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+End-to-end load test of the crawler against the local mock shop (benchmarks/mock_shop.py) or another server.
+The real pipeline runs: robots.txt is read by RobotsTxtParser, the product links are found in the nested sitemaps by
+RobotsExtLinks, then AsyncCrawler fetches, extracts and stores every product page into a temporary database.
+For every concurrency level it reports the throughput (pages/s) and the latency of the pages, from the first fetch of the
+page (Retries included) until its product is handed to the writer.
+
+Usage:
+    python -m benchmarks.load_test [--products 2000] [--latency 0.05] [--error-rate 0.01] [--concurrency 8 16 32 64] [--json]
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 16
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from application.crawler.async_crawler import AsyncCrawler
+from application.crawler.scheduler import HostScheduler
+from application.data_management.writer import ProductWriter
+from application.extractor.robots_cache import RobotsCache
+from application.extractor.robots_parser import RobotsTxtParser, RobotsExtLinks
+from benchmarks.mock_shop import MockShop
+import config
+
+
+class TimedCrawler(AsyncCrawler):
+    """AsyncCrawler that remembers when every url is fetched for the first time"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.started_at: dict[str, float] = {}
+
+    async def _process(self, url, session, executor):
+        self.started_at.setdefault(url, time.monotonic())
+        return await super()._process(url, session, executor)
+
+
+class TimedWriter(ProductWriter):
+    """ProductWriter that records the latency of every product it receives (Time since its page was first fetched)"""
+    def __init__(self, started_at: dict[str, float], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.started_at: dict[str, float] = started_at
+        self.latencies: list[float] = []
+
+    def add(self, product_data: dict) -> bool:
+        started_at = self.started_at.get(product_data.get('url'))
+        if started_at is not None:
+            self.latencies.append(time.monotonic() - started_at)
+        return super().add(product_data)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of the values (0.0 if there is none)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def discover_products(base_url: str) -> tuple[list[str], dict[str, str], float]:
+    """Find the product links of the shop through its robots.txt and sitemaps. Returns the links, their lastmods and the seconds it took"""
+    started_at = time.perf_counter()
+    robots_parser = RobotsTxtParser(base_url)
+    robots_parser._fetch_and_parse('requests')
+    ext_links = RobotsExtLinks(robots_parser)
+    links = ext_links.find_product_sitemap_links()
+    return links, ext_links.get_lastmods(), time.perf_counter() - started_at
+
+
+def crawl_products(urls: list[str], concurrency: int, parse_processes: int=0, db_file: str|None=None) -> dict:
+    """
+    Crawl the urls with AsyncCrawler into a new database and measure it.
+    Args:
+        urls (list[str]): Product page urls.
+        concurrency (int): Number of pages processed at the same time (All of them may go to the same host).
+        parse_processes (int): Number of processes parsing the pages. 0 parses them in the thread pool.
+        db_file (str|None): Database of the products. A temporary one is used if not given.
+    Returns:
+        dict: Pages, ok and error counts, seconds, pages_per_second, latency_ms percentiles and rows written.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = db_file or os.path.join(temp_dir, 'load_test.db')
+        robots_cache = RobotsCache(db_file)
+        # No politeness delay: the load test measures how fast the crawler itself can go
+        scheduler = HostScheduler(default_delay=0.0, host_concurrency=concurrency)
+        crawler = TimedCrawler(concurrency=concurrency, method='requests', scheduler=scheduler, incremental=False, robots_cache=robots_cache,
+                               parse_processes=parse_processes, archive_pages=False, max_retries=config.MAX_RETRIES)
+        writer = TimedWriter(crawler.started_at, db_file=db_file)
+        crawler.writer = writer
+        try:
+            started_at = time.perf_counter()
+            results = crawler.run(urls)
+            seconds = time.perf_counter() - started_at
+            writer.flush()
+        finally:
+            writer.close()
+            robots_cache.close()
+    ok = sum(1 for result in results if result.get('status') == 'ok')
+    return {
+        'concurrency': concurrency,
+        'pages': len(urls),
+        'ok': ok,
+        'errors': len(results) - ok,
+        'seconds': seconds,
+        'pages_per_second': ok / seconds if seconds else 0.0,
+        'latency_ms': {f'p{p}': percentile(writer.latencies, p) * 1000 for p in (50, 90, 99)} | {'max': max(writer.latencies, default=0.0) * 1000},
+        'rows_written': writer.written,
+    }
+
+
+def run_load_test(base_url: str, concurrency_levels: list[int], parse_processes: int=0, max_pages: int|None=None) -> dict:
+    """Discover the products of the shop once, then crawl all of them at every concurrency level"""
+    # RobotsExtLinks reads the scraping method from config
+    method, config.METHOD = config.METHOD, 'requests'
+    try:
+        links, _, discovery_seconds = discover_products(base_url)
+        links = links[:max_pages] if max_pages else links
+        runs = [crawl_products(links, concurrency, parse_processes) for concurrency in concurrency_levels]
+    finally:
+        config.METHOD = method
+    return {
+        'base_url': base_url,
+        'discovery': {'links': len(links), 'seconds': discovery_seconds},
+        'runs': runs,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f'{report["discovery"]["links"]} product link(s) found in the sitemaps of {report["base_url"]} in {report["discovery"]["seconds"]:.2f}s')
+    print(f'{"concurrency":>11} {"ok":>7} {"errors":>7} {"seconds":>8} {"pages/s":>9} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    for run in report['runs']:
+        latency = run['latency_ms']
+        print(f'{run["concurrency"]:>11} {run["ok"]:>7} {run["errors"]:>7} {run["seconds"]:>8.2f} {run["pages_per_second"]:>9.1f} '
+              f'{latency["p50"]:>8.1f} {latency["p90"]:>8.1f} {latency["p99"]:>8.1f} {latency["max"]:>8.1f}')
+    if 'server' in report:
+        print(f'Server responses: {report["server"]}')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--url', help='Base url of an already running server (A mock shop is started if not given)')
+    arg_parser.add_argument('--products', type=int, default=1000, help='Number of product pages of the mock shop')
+    arg_parser.add_argument('--latency', type=float, default=0.02, help='Seconds every product page of the mock shop waits')
+    arg_parser.add_argument('--jitter', type=float, default=0.01, help='Random extra latency of the mock shop pages')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Share of the mock shop pages answered with 500/503')
+    arg_parser.add_argument('--concurrency', type=int, nargs='+', default=[config.CONCURRENCY], help='Concurrency levels to measure')
+    arg_parser.add_argument('--parse-processes', type=int, default=0, help='Processes parsing the pages (0 parses them in threads)')
+    arg_parser.add_argument('--max-pages', type=int, help='Crawl only this many of the discovered product pages')
+    arg_parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = arg_parser.parse_args()
+    # The log lines of every crawled page would flood the console
+    logging.disable(logging.CRITICAL)
+    if args.url:
+        report = run_load_test(args.url.rstrip('/'), args.concurrency, args.parse_processes, args.max_pages)
+    else:
+        with MockShop(args.products, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate) as shop:
+            report = run_load_test(shop.base_url, args.concurrency, args.parse_processes, args.max_pages)
+            report['server'] = shop.stats()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
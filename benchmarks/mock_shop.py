@@ -0,0 +1,278 @@
+"""
+A local mock e-commerce server for end-to-end load tests of the crawler, so nothing is fetched from real shops.
+It serves synthetic WooCommerce-like product pages with JSON-LD, a robots.txt and nested sitemaps: a sitemap index that
+points to a product sitemap index of gzipped product sitemaps and to a page sitemap. Product pages are answered after a
+configurable latency and a configurable share of them fail with 500 or 503 (With Retry-After).
+
+Usage:
+    python -m benchmarks.mock_shop [--port 8000] [--products 5000] [--latency 0.05] [--jitter 0.02] [--error-rate 0.01]
+"""
+
+import argparse
+import gzip
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+PRODUCT_PATH_RE = re.compile(r'^/product/item-(\d+)/$')
+PRODUCT_SITEMAP_RE = re.compile(r'^/product-sitemap(\d+)\.xml\.gz$')
+# Pages listed in the page sitemap (Not product pages, so the crawler must skip them)
+STATIC_PAGES = ('/about-us/', '/contact/', '/blog/', '/shop/')
+CATEGORIES = ('Mobile', 'Laptop', 'Camera', 'Headphones', 'Watch', 'Tablet')
+
+
+class MockShopHandler(BaseHTTPRequestHandler):
+    """Answer the requests from the MockShop of the server"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockShop/1.0'
+
+    def do_GET(self) -> None:
+        status, content_type, body, headers = self.server.shop.respond(self.path.split('?', 1)[0])
+        if 'gzip' in self.headers.get('Accept-Encoding', '') and content_type.startswith('text/html'):
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Thousands of requests per second would flood the console
+        pass
+
+
+class MockShop:
+    """Serve a synthetic shop on a local port in a background thread.\n
+    Usage:\n
+        with MockShop(products=1000, latency=0.05) as shop:
+            links = ...  # crawl shop.base_url
+            print(shop.stats())
+    """
+    def __init__(self, products: int=1000, host: str='127.0.0.1', port: int=0, latency: float=0.0, jitter: float=0.0, error_rate: float=0.0, sitemap_size: int=500, seed: int=0) -> None:
+        """
+        Args:
+            products (int): Number of product pages of the shop.
+            host (str): Address the server listens on.
+            port (int): Port the server listens on. 0 picks a free port.
+            latency (float): Seconds every product page waits before it is answered.
+            jitter (float): Random extra latency (Up to this many seconds) of every product page.
+            error_rate (float): Share of the product page requests answered with 500 or 503 (0.0 to 1.0).
+            sitemap_size (int): Number of product urls in every product sitemap.
+            seed (int): Seed of the latency and error randomness, so runs are repeatable.
+        """
+        self.products: int = max(0, products)
+        self.host: str = host
+        self.port: int = port
+        self.latency: float = max(0.0, latency)
+        self.jitter: float = max(0.0, jitter)
+        self.error_rate: float = min(max(0.0, error_rate), 1.0)
+        self.sitemap_size: int = max(1, sitemap_size)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._statuses: Counter = Counter()
+        self._sitemaps: dict[str, bytes] = {}
+        self._server: ThreadingHTTPServer|None = None
+        self._thread: threading.Thread|None = None
+
+    def __enter__(self) -> 'MockShop':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def start(self) -> str:
+        """Start serving in a background thread. Returns the base url of the shop"""
+        self._server = ThreadingHTTPServer((self.host, self.port), MockShopHandler)
+        self._server.daemon_threads = True
+        self._server.shop = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='MockShop', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        """Stop the server and wait for its thread"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict[str, int]:
+        """Number of responses sent with every status code"""
+        with self._lock:
+            return {str(status): count for status, count in sorted(self._statuses.items())}
+
+    def product_urls(self) -> list[str]:
+        return [f'{self.base_url}/product/item-{i}/' for i in range(self.products)]
+
+    def respond(self, path: str) -> tuple[int, str, bytes, dict[str, str]]:
+        """Build the response of the path. Returns status, content type, body and the extra headers"""
+        response = self._route(path)
+        with self._lock:
+            self._statuses[response[0]] += 1
+        return response
+
+    def _route(self, path: str) -> tuple[int, str, bytes, dict[str, str]]:
+        if match := PRODUCT_PATH_RE.match(path):
+            index = int(match.group(1))
+            if index >= self.products:
+                return 404, 'text/html; charset=utf-8', b'<h1>Not found</h1>', {}
+            return self._product_response(index)
+        if path == '/robots.txt':
+            return 200, 'text/plain; charset=utf-8', self._robots_txt().encode(), {}
+        if path in ('/sitemap_index.xml', '/product-sitemap-index.xml', '/page-sitemap.xml') or PRODUCT_SITEMAP_RE.match(path):
+            content_type = 'application/x-gzip' if path.endswith('.gz') else 'application/xml; charset=utf-8'
+            return 200, content_type, self._sitemap(path), {}
+        if path in STATIC_PAGES:
+            return 200, 'text/html; charset=utf-8', f'<html><body><h1>{path.strip("/")}</h1></body></html>'.encode(), {}
+        return 404, 'text/html; charset=utf-8', b'<h1>Not found</h1>', {}
+
+    def _product_response(self, index: int) -> tuple[int, str, bytes, dict[str, str]]:
+        """Wait the latency, then answer with the product page or an injected error"""
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self._random.random() < self.error_rate
+            status = self._random.choice((500, 503)) if failed else 200
+        if delay:
+            time.sleep(delay)
+        if status == 503:
+            return status, 'text/html; charset=utf-8', b'<h1>Service unavailable</h1>', {'Retry-After': '0'}
+        if status == 500:
+            return status, 'text/html; charset=utf-8', b'<h1>Internal server error</h1>', {}
+        return 200, 'text/html; charset=utf-8', build_product_page(self.base_url, index).encode(), {}
+
+    def _robots_txt(self) -> str:
+        return (
+            'User-agent: *\n'
+            'Disallow: /cart/\n'
+            'Disallow: /checkout/\n'
+            'Disallow: /*?add-to-cart=*\n'
+            '\n'
+            f'Sitemap: {self.base_url}/sitemap_index.xml\n'
+        )
+
+    def _sitemap(self, path: str) -> bytes:
+        """Build the sitemap once and keep it (Product sitemaps are gzipped)"""
+        with self._lock:
+            content = self._sitemaps.get(path)
+        if content is not None:
+            return content
+        if path == '/sitemap_index.xml':
+            content = sitemap_index([f'{self.base_url}/product-sitemap-index.xml', f'{self.base_url}/page-sitemap.xml'])
+        elif path == '/product-sitemap-index.xml':
+            count = math.ceil(self.products / self.sitemap_size)
+            content = sitemap_index([f'{self.base_url}/product-sitemap{n}.xml.gz' for n in range(count)])
+        elif path == '/page-sitemap.xml':
+            content = urlset([(f'{self.base_url}{page}', None) for page in STATIC_PAGES])
+        else:
+            start = int(PRODUCT_SITEMAP_RE.match(path).group(1)) * self.sitemap_size
+            indexes = range(start, min(start + self.sitemap_size, self.products))
+            content = gzip.compress(urlset([(f'{self.base_url}/product/item-{i}/', product_lastmod(i)) for i in indexes]))
+        with self._lock:
+            self._sitemaps[path] = content
+        return content
+
+
+def product_lastmod(index: int) -> str:
+    return f'2024-{1 + index % 12:02d}-{1 + index % 28:02d}T{index % 24:02d}:00:00+00:00'
+
+
+def sitemap_index(locs: list[str]) -> bytes:
+    entries = ''.join(f'<sitemap><loc>{loc}</loc></sitemap>' for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'.encode()
+
+
+def urlset(urls: list[tuple[str, str|None]]) -> bytes:
+    entries = ''.join(f'<url><loc>{loc}</loc>' + (f'<lastmod>{lastmod}</lastmod>' if lastmod else '') + '</url>' for loc, lastmod in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{entries}</urlset>'.encode()
+
+
+def build_product_page(base_url: str, index: int) -> str:
+    """Build the WooCommerce-like page of the product, with its JSON-LD, menus and related products like the real shops"""
+    url = f'{base_url}/product/item-{index}/'
+    category = CATEGORIES[index % len(CATEGORIES)]
+    price = 100 + (index * 37) % 9900
+    json_ld = {
+        '@context': 'https://schema.org/',
+        '@type': 'Product',
+        'name': f'{category} model {index}',
+        'url': url,
+        'description': f'Synthetic {category.lower()} number {index} of the mock shop. ' * 4,
+        'image': [f'{base_url}/wp-content/uploads/item-{index}-{i}.jpg' for i in range(4)],
+        'sku': f'SKU-{index:06d}',
+        'brand': {'@type': 'Brand', 'name': f'Brand {index % 17}'},
+        'category': category,
+        'offers': [{
+            '@type': 'Offer',
+            'price': f'{price}.00',
+            'priceCurrency': 'USD',
+            'availability': 'https://schema.org/OutOfStock' if index % 10 == 0 else 'https://schema.org/InStock',
+        }],
+    }
+    menu = ''.join(
+        f'<li class="menu-item"><a href="/product-category/{name.lower()}/">{name}</a><ul class="sub-menu">'
+        + ''.join(f'<li><a href="/product-category/{name.lower()}/sub-{j}/">{name} {j}</a></li>' for j in range(8))
+        + '</ul></li>'
+        for name in CATEGORIES
+    )
+    related = ''.join(
+        f'<li class="product type-product"><a href="/product/item-{i}/"><img width="300" height="300" src="/wp-content/uploads/item-{i}-300x300.jpg" alt="">'
+        f'<h2 class="woocommerce-loop-product__title">{CATEGORIES[i % len(CATEGORIES)]} model {i}</h2>'
+        f'<span class="price"><bdi>${100 + (i * 37) % 9900}.00</bdi></span></a></li>'
+        for i in range(index + 1, index + 25)
+    )
+    return (
+        f'<!DOCTYPE html><html lang="en-US"><head><meta charset="UTF-8"><title>{json_ld["name"]} - Mock Shop</title>'
+        + ''.join(f'<link rel="stylesheet" href="/wp-content/themes/shop/style-{i}.css?ver=6.4" media="all">' for i in range(10))
+        + f'<script type="application/ld+json">{json.dumps(json_ld)}</script>'
+        f'<script>var wc_add_to_cart_params = {{"ajax_url":"\\/wp-admin\\/admin-ajax.php","nonce":"{index:08x}"}};</script>'
+        f'</head><body class="product-template-default single-product woocommerce"><header><nav><ul>{menu}</ul></nav></header>'
+        f'<main><div class="product"><h1 class="product_title">{json_ld["name"]}</h1><p class="price"><bdi>${price}.00</bdi></p>'
+        f'<div class="woocommerce-product-details__short-description">{json_ld["description"]}</div></div>'
+        f'<section class="related products"><ul class="products">{related}</ul></section></main>'
+        f'<footer><p>Mock Shop</p></footer></body></html>'
+    )
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8000)
+    arg_parser.add_argument('--products', type=int, default=1000, help='Number of product pages')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='Seconds every product page waits')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency (Seconds) of the product pages')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Share of the product pages answered with 500/503')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    shop = MockShop(args.products, args.host, args.port, args.latency, args.jitter, args.error_rate, seed=args.seed)
+    print(f'Mock shop with {shop.products} products serving on {shop.start()} (Ctrl+C to stop)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shop.stop()
+        print(f'Responses: {shop.stats()}')
+
+
+if __name__ == '__main__':
+    main()
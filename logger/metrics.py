@@ -0,0 +1,361 @@
+"""
+Per-stage timing metrics of the scraper: counters and histograms with labels, kept in memory and rendered in the Prometheus
+text format. The stages (fetch, render wait, soup parse, JSON-LD extraction, database writes, ...) are timed with stage_timer or
+the timed decorator, which feed the stage duration histogram and the stage result counter per host and status.
+MetricsExporter serves the metrics on an HTTP endpoint (/metrics) and/or dumps them into a file periodically (For eg, for the
+textfile collector of node_exporter). Metrics are kept per process: pages parsed by the parse processes of AsyncCrawler are
+timed in the crawler process as the 'parse' stage.
+
+Usage:
+    with stage_timer('fetch', url) as timer:
+        ...
+        timer.status = 'error'
+
+    exporter = MetricsExporter(port=9100)
+    exporter.start()
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterable
+from urllib.parse import urlsplit
+from logger.logger import setup_logger
+import config
+
+
+logger = setup_logger('scraper.log', __name__)
+
+
+# Upper bounds (in seconds) of the histogram buckets, from a fast regex scan to a slow selenium render
+DEFAULT_BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    text = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f'{{{text}}}' if text else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A counter per combination of label values (Only goes up)"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...]=()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(f'{labels.get(name, "")}' for name in self.labelnames)
+
+    def inc(self, amount: float=1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}' for key, value in values]
+
+
+class Histogram:
+    """A histogram (Bucket counts, sum and count) per combination of label values"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...]=(), buckets: tuple[float, ...]=DEFAULT_BUCKETS) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # Label values -> [count of every bucket (Not cumulative, the last one is +Inf), sum, count]
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(f'{labels.get(name, "")}' for name in self.labelnames)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def get(self, **labels: Any) -> tuple[int, float]:
+        """Return the count and the sum of the observed values"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines: list[str] = []
+        for key, (counts, total, count) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of the process. Metrics are created once by name and shared by all the modules"""
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter|Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class: type, name: str, *args, **kwargs) -> Counter|Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f'Metric {name} already registered as a {metric.kind}')
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...]=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...]=(), buckets: tuple[float, ...]=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def reset(self) -> None:
+        """Clear the values of every metric (The metrics stay registered)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def render(self) -> str:
+        """Return all the metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: list[str] = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS: Histogram = REGISTRY.histogram('scraper_stage_duration_seconds', 'Time spent in every stage of the scraper', ('stage', 'host'))
+STAGE_RESULTS: Counter = REGISTRY.counter('scraper_stage_total', 'Number of finished stages by their result', ('stage', 'host', 'status'))
+HTTP_RESPONSES: Counter = REGISTRY.counter('scraper_http_responses_total', 'HTTP responses of the fetched pages by status code', ('host', 'status'))
+
+
+def get_host(url: str|None) -> str:
+    """Host of the url used as the host label ('' if there is none)"""
+    return urlsplit(url).netloc.lower() if url else ''
+
+
+def result_status(result: Any) -> str:
+    """Status label of a stage from its return value: the 'status' of a result dict, 'error' for False/None, otherwise 'ok'"""
+    if isinstance(result, dict) and result.get('status'):
+        return f'{result["status"]}'
+    if result is False or result is None:
+        return 'error'
+    return 'ok'
+
+
+class stage_timer:
+    """Time the block as the stage of the url: its duration goes into the stage histogram and its status (timer.status, 'ok'
+    by default or 'error' if the block raised) into the stage counter. Does nothing if config.METRICS_ENABLED is False"""
+    def __init__(self, stage: str, url: str|None=None) -> None:
+        self.stage: str = stage
+        self.host: str = get_host(url)
+        self.status: str = 'ok'
+        self.started_at: float = 0.0
+
+    def __enter__(self) -> 'stage_timer':
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if not config.METRICS_ENABLED:
+            return
+        if exc_type is not None:
+            self.status = 'error'
+        STAGE_SECONDS.observe(time.perf_counter() - self.started_at, stage=self.stage, host=self.host)
+        STAGE_RESULTS.inc(stage=self.stage, host=self.host, status=self.status)
+
+
+def timed(stage: str, url_of: Callable[..., str|None]|None=None) -> Callable:
+    """
+    Decorator that times every call of the function as the stage. The status of the stage comes from the return value (result_status).
+    Args:
+        stage (str): Name of the stage.
+        url_of (Callable|None): Returns the url of the call from its arguments. Defaults to the product_url of the instance (Methods of Extractor).
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                url = url_of(*args, **kwargs) if url_of else getattr(args[0], 'product_url', None) if args else None
+            except Exception:
+                # The metrics must never break the call (For eg, invalid arguments are handled by the function itself)
+                url = None
+            with stage_timer(stage, url) as timer:
+                result = func(*args, **kwargs)
+                timer.status = result_status(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def count_response(url: str|None, status: int|str|None) -> None:
+    """Count an HTTP response of the url by its status code ('error' if no response received)"""
+    if config.METRICS_ENABLED:
+        HTTP_RESPONSES.inc(host=get_host(url), status=status if status is not None else 'error')
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the metrics of the registry of the server on /metrics"""
+    def do_GET(self) -> None:
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes of the endpoint are not worth a log line
+        pass
+
+
+class MetricsExporter:
+    """Expose the metrics through an HTTP endpoint and/or a file rewritten every dump_interval seconds.\n
+    Usage:\n
+        exporter = MetricsExporter()
+        exporter.start()
+        ...
+        exporter.close()    # The file is written a last time
+    """
+    def __init__(self, port: int|None=config.METRICS_PORT, host: str=config.METRICS_HOST, dump_file: str|None=config.METRICS_DUMP_FILE, dump_interval: float=config.METRICS_DUMP_INTERVAL, registry: MetricsRegistry=REGISTRY) -> None:
+        """
+        Args:
+            port (int|None): Port of the HTTP endpoint. None disables it, 0 picks a free port.
+            host (str): Address the HTTP endpoint listens on.
+            dump_file (str|None): File the metrics are written into. None disables the dump.
+            dump_interval (float): Seconds between two dumps.
+            registry (MetricsRegistry): Metrics to expose.
+        """
+        self.port: int|None = port
+        self.host: str = host
+        self.dump_file: str|None = dump_file
+        self.dump_interval: float = max(0.1, dump_interval)
+        self.registry: MetricsRegistry = registry
+        self._server: ThreadingHTTPServer|None = None
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+
+    def __enter__(self) -> 'MetricsExporter':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def start(self) -> bool:
+        """Start the endpoint and the periodic dump (The ones enabled). Returns False if the endpoint could not be started"""
+        if not config.METRICS_ENABLED:
+            return True
+        started = True
+        if self.port is not None:
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+                self._server.daemon_threads = True
+                self._server.registry = self.registry
+                self.port = self._server.server_address[1]
+                self._start_thread(self._server.serve_forever, 'MetricsServer')
+                logger.info(f'Metrics served on http://{self.host}:{self.port}/metrics')
+            except OSError as e:
+                logger.error(f'Cannot start the metrics endpoint on port {self.port}: {e.__str__()}')
+                self._server = None
+                started = False
+        if self.dump_file:
+            self._start_thread(self._dump_periodically, 'MetricsDumper')
+        return started
+
+    def _start_thread(self, target: Callable, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def dump(self) -> bool:
+        """Write the metrics into the dump file (Replaced at once, so readers never see a half written file)"""
+        if not self.dump_file:
+            return False
+        temp_file = f'{self.dump_file}.tmp'
+        try:
+            directory = os.path.dirname(self.dump_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(self.registry.render())
+            os.replace(temp_file, self.dump_file)
+            return True
+        except Exception as e:
+            logger.error(f'Cannot dump the metrics into {self.dump_file}: {e.__str__()}')
+            return False
+
+    def _dump_periodically(self) -> None:
+        while not self._stop.wait(self.dump_interval):
+            self.dump()
+
+    def close(self) -> None:
+        """Stop the endpoint and the periodic dump, then dump the metrics a last time"""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        if self.dump_file and config.METRICS_ENABLED:
+            self.dump()
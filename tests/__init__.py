@@ -1 +1,17 @@
 print("\n\n*********************** ENTERING X_Scrapper TESTING GROUND.************************\n\n\n")
+
+
+def make_product(i: int, **fields) -> dict:
+    """Product data of the i-th test product as Extractor returns it. fields replace or add values (For eg, price=12.5)"""
+    product = {
+        "url": f"https://example.com/product/{i}",
+        "title": f"Product {i}",
+        "price": 10.0 + i,
+        "description": "desc",
+        "images": ["img1.jpg"],
+        "name": f"Product {i}",
+        "company_name": "Company",
+        "category": ["Cat"],
+    }
+    product.update(fields)
+    return product
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from application.archive import warc
+from application.archive.reextract import reextract
+from application.archive.warc import HtmlArchive, ArchiveReader, build_record, parse_record
+from application.crawler.async_crawler import AsyncCrawler
+from application.crawler.scheduler import HostScheduler
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+
+
+PAGE = '<html><script type="application/ld+json">{"@type": "Product", "name": "Product %s", "offers": {"price": "%s"}}</script></html>'
+
+
+class TestWarcRecord(unittest.TestCase):
+    def test_record_round_trip(self):
+        body = '<html>قیمت: ۱۰۰</html>'
+        data = build_record("https://example.com/product/1", body, 200, {'ETag': '"v1"', 'Content-Encoding': 'gzip'})
+        self.assertTrue(data.startswith(b'WARC/1.1\r\nWARC-Type: response\r\n'))
+        record = parse_record(data)
+        self.assertEqual(record.url, "https://example.com/product/1")
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.body, body)
+        self.assertEqual(record.headers['ETag'], '"v1"')
+        self.assertNotIn('Content-Encoding', record.headers)
+
+
+class TestHtmlArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.archive_dir = os.path.join(self.tmp_dir.name, 'archive')
+        self.conn = SQLiteDBInit(os.path.join(self.tmp_dir.name, 'test.db')).connection
+        self.addCleanup(self.conn.close)
+
+    def make_archive(self, **kwargs):
+        return HtmlArchive(self.archive_dir, connection=self.conn, **kwargs)
+
+    def test_append_and_read_back(self):
+        with self.make_archive(segment_size=300, batch_size=2) as archive:
+            for i in range(5):
+                archive.append(f"https://example.com/product/{i}", PAGE % (i, i))
+            archive.append("https://example.com/product/0", PAGE % ('0 new', 0))
+        self.assertGreater(len(os.listdir(self.archive_dir)), 1)
+        self.assertTrue(all(name.endswith('.warc.gz') for name in os.listdir(self.archive_dir)))
+        with ArchiveReader(self.archive_dir, connection=self.conn) as reader:
+            self.assertIn('Product 0 new', reader.get("https://example.com/product/0/").body)
+            records = list(reader.iter_records())
+            self.assertEqual(len(records), 5)
+            self.assertEqual(len(list(reader.iter_records(latest_only=False))), 6)
+            self.assertEqual(list(reader.iter_records(since='2999-01-01 00:00:00')), [])
+            self.assertIsNone(reader.get("https://example.com/missing"))
+
+    def test_reader_sees_records_of_open_segment(self):
+        archive = self.make_archive(batch_size=1)
+        self.addCleanup(archive.close)
+        reader = ArchiveReader(self.archive_dir, connection=self.conn)
+        self.addCleanup(reader.close)
+        archive.append("https://example.com/product/1", PAGE % (1, 1))
+        self.assertIn('Product 1', reader.get("https://example.com/product/1").body)
+        archive.append("https://example.com/product/2", PAGE % (2, 2))
+        self.assertIn('Product 2', reader.get("https://example.com/product/2").body)
+
+    @unittest.skipIf(warc.zstandard is None, 'zstandard is not installed')
+    def test_zstd_segments(self):
+        with self.make_archive(compression='zstd') as archive:
+            archive.append("https://example.com/product/1", PAGE % (1, 1))
+        self.assertTrue(os.listdir(self.archive_dir)[0].endswith('.warc.zst'))
+        with ArchiveReader(self.archive_dir, connection=self.conn) as reader:
+            self.assertIn('Product 1', reader.get("https://example.com/product/1").body)
+
+    def test_reextract_without_network(self):
+        with self.make_archive() as archive:
+            for i in range(3):
+                archive.append(f"https://example.com/product/{i}", PAGE % (i, 10 + i))
+            archive.append("https://example.com/product/9", 'Not found', status=404)
+        with patch("application.extractor.extract.http_get") as mock_get:
+            counts = reextract(self.archive_dir, processes=0, db_file=os.path.join(self.tmp_dir.name, 'test.db'))
+            mock_get.assert_not_called()
+        self.assertEqual(counts, {'records': 3, 'stored': 3})
+        product = ProductsCRUD(self.conn).get_product(url="https://example.com/product/2")
+        self.assertEqual(product[2], "Product 2")
+        self.assertEqual(product[3], 12.0)
+
+    @patch("application.crawler.async_crawler.ProductWriter")
+    @patch("application.crawler.async_crawler.Extractor")
+    def test_crawler_archives_fetched_pages(self, mock_extractor, mock_writer):
+        mock_extractor.return_value.scrape.return_value = {'status': 'ok', 'msg': '', 'data': {}}
+        archive = self.make_archive()
+        self.addCleanup(archive.close)
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, incremental=False, scheduler=HostScheduler(default_delay=0, host_concurrency=10), archive=archive)
+
+        async def fake_fetch(url, session, headers=None):
+            return 200, PAGE % (url[-1], 1), None, {'ETag': '"v1"'}
+
+        crawler._fetch = fake_fetch
+        crawler.run([f"https://example.com/product/{i}" for i in range(3)])
+        with ArchiveReader(self.archive_dir, connection=self.conn) as reader:
+            record = reader.get("https://example.com/product/2")
+        self.assertIn('Product 2', record.body)
+        self.assertEqual(record.headers['ETag'], '"v1"')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import patch
+from application.extractor.extract import Extractor
+from benchmarks import bench_suite
+
+
+class TestBenchSuite(unittest.TestCase):
+    def test_corpus_pages_are_extracted(self):
+        corpus = bench_suite.load_corpus()
+        self.assertTrue(corpus['pages'] and corpus['robots'] and corpus['sitemaps'])
+        for name, page in corpus['pages'].items():
+            product = Extractor(f'https://example.com/{name}', method='requests', html_body=page).extract()
+            self.assertTrue(product.get('title'), name)
+
+    def test_compare_reports_only_slower_benchmarks(self):
+        report = {'benchmarks': {'fast': {'us_per_call': 9.0}, 'slow': {'us_per_call': 15.0}, 'new': {'us_per_call': 1.0}}}
+        baseline = {'benchmarks': {'fast': {'us_per_call': 10.0}, 'slow': {'us_per_call': 10.0}}}
+        regressions = bench_suite.compare(report, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('slow:'))
+        self.assertAlmostEqual(report['benchmarks']['fast']['change'], -0.1)
+        self.assertNotIn('change', report['benchmarks']['new'])
+
+    @patch.object(bench_suite, 'MIN_RUN_TIME', 0)
+    def test_run_suite(self):
+        report = bench_suite.run_suite(['to_english_digits', 'robots_is_allowed', 'sitemap_parse', 'insert_product'], repeat=1)
+        self.assertEqual(set(report['benchmarks']), {'to_english_digits', 'robots_is_allowed', 'sitemap_parse', 'insert_product'})
+        self.assertGreater(report['benchmarks']['insert_product']['rows_per_second'], 0)
+        self.assertGreater(report['benchmarks']['sitemap_parse']['entries_per_second'], 0)
+        with self.assertRaises(ValueError):
+            bench_suite.run_suite(['unknown'])
+
+
+if __name__ == '__main__':
+    unittest.main()
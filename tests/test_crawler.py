@@ -0,0 +1,215 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock, ANY
+import aiohttp
+from application.crawler.async_crawler import AsyncCrawler, parse_retry_after
+from application.crawler.incremental import CrawlState, content_hash
+from application.crawler.scheduler import HostScheduler
+from application.database.sqlite import CrawlStateCRUD
+
+
+class TestAsyncCrawler(unittest.TestCase):
+    def setUp(self):
+        patcher_extractor = patch("application.crawler.async_crawler.Extractor")
+        self.mock_extractor = patcher_extractor.start()
+        self.addCleanup(patcher_extractor.stop)
+        self.mock_extractor.return_value.scrape.return_value = {'status': 'ok', 'msg': '', 'data': {}}
+
+        patcher_writer = patch("application.crawler.async_crawler.ProductWriter")
+        self.mock_writer = patcher_writer.start()
+        self.addCleanup(patcher_writer.stop)
+        # Every product added is committed right away
+        listeners = []
+        self.mock_writer.return_value.add_listener.side_effect = listeners.append
+        self.mock_writer.return_value.add.side_effect = lambda product_data: [listener([product_data.get('url')], True) for listener in listeners] or True
+
+        patcher_state = patch("application.crawler.async_crawler.CrawlState")
+        self.mock_state = patcher_state.start()
+        self.addCleanup(patcher_state.stop)
+        self.mock_state.return_value.is_unchanged.return_value = False
+        self.mock_state.return_value.is_same_content.return_value = False
+        self.mock_state.return_value.conditional_headers.return_value = {}
+
+    def test_crawl_respects_concurrency_limit(self):
+        crawler = AsyncCrawler(concurrency=3, method='requests', parse_processes=0, respect_robots=False, scheduler=HostScheduler(default_delay=0, host_concurrency=10))
+        state = {'running': 0, 'max_running': 0}
+
+        async def fake_fetch(url, session, headers=None):
+            state['running'] += 1
+            state['max_running'] = max(state['max_running'], state['running'])
+            await asyncio.sleep(0.01)
+            state['running'] -= 1
+            return 200, '<html></html>', None, {}
+
+        crawler._fetch = fake_fetch
+        urls = [f"https://example.com/product/{i}" for i in range(10)]
+        results = crawler.run(urls)
+        self.assertEqual(len(results), 10)
+        self.assertLessEqual(state['max_running'], 3)
+        self.assertEqual(state['max_running'], 3)
+        self.assertEqual(self.mock_extractor.call_count, 10)
+        self.mock_extractor.assert_any_call("https://example.com/product/0", method='requests', html_body='<html></html>', writer=ANY)
+
+    def test_crawl_fetch_failure(self):
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, scheduler=HostScheduler(default_delay=0))
+
+        async def fake_fetch(url, session, headers=None):
+            return None, None, None, {}
+
+        crawler._fetch = fake_fetch
+        results = crawler.run(["https://example.com/product/1"])
+        self.assertEqual(results[0]['status'], 'error')
+        self.mock_extractor.assert_not_called()
+
+    @patch("application.crawler.async_crawler.DriverPool")
+    def test_crawl_selenium_runs_scrape_in_executor(self, mock_pool_class):
+        crawler = AsyncCrawler(concurrency=2, method='selenium', respect_robots=False, scheduler=HostScheduler(default_delay=0))
+        crawler._fetch = MagicMock()
+        results = crawler.run(["https://example.com/product/1", "https://example.com/product/2"])
+        self.assertEqual(len(results), 2)
+        crawler._fetch.assert_not_called()
+        self.mock_extractor.assert_any_call("https://example.com/product/1", method='selenium', driver_pool=ANY, writer=ANY, crawl_state=ANY)
+        mock_pool_class.return_value.close.assert_called_once()
+
+    def test_crawl_retries_throttled_url(self):
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, scheduler=HostScheduler(default_delay=0), max_retries=2)
+        calls = []
+
+        async def fake_fetch(url, session, headers=None):
+            calls.append(url)
+            if len(calls) == 1:
+                return 429, None, 0.01, {}
+            return 200, '<html></html>', None, {}
+
+        crawler._fetch = fake_fetch
+        results = crawler.run(["https://example.com/product/1"])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['status'], 'ok')
+
+    def test_crawl_retries_connection_errors(self):
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, max_retries=2, scheduler=HostScheduler(default_delay=0, host_concurrency=10))
+        calls = []
+
+        @contextlib.asynccontextmanager
+        async def fake_get(url, headers=None):
+            calls.append(url)
+            if url.endswith('/2') or calls.count(url) == 1:
+                raise aiohttp.ClientConnectionError('Connection reset')
+            yield MagicMock(status=200, headers={}, text=AsyncMock(return_value='<html></html>'))
+
+        @contextlib.asynccontextmanager
+        async def fake_session(*args, **kwargs):
+            yield MagicMock(get=fake_get)
+
+        with patch("application.crawler.async_crawler.create_async_session", fake_session):
+            results = crawler.run(["https://example.com/product/1", "https://example.com/product/2"])
+        self.assertEqual(calls.count("https://example.com/product/1"), 2)
+        self.assertEqual(calls.count("https://example.com/product/2"), 3)
+        self.assertEqual(sorted(result['status'] for result in results), ['error', 'ok'])
+        self.assertEqual(crawler._retries, {})
+
+    def test_crawl_retries_server_errors(self):
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, max_retries=2, scheduler=HostScheduler(default_delay=0, host_concurrency=10))
+        calls = []
+
+        async def fake_fetch(url, session, headers=None):
+            calls.append(url)
+            if url.endswith('/404'):
+                return 404, None, None, {}
+            if calls.count(url) == 1:
+                return int(url.rsplit('/', 1)[1]), None, None, {}
+            return 200, '<html></html>', None, {}
+
+        crawler._fetch = fake_fetch
+        urls = [f"https://example.com/product/{status}" for status in (500, 502, 504, 404)]
+        results = crawler.run(urls)
+        self.assertEqual([calls.count(url) for url in urls], [2, 2, 2, 1])
+        self.assertEqual(sorted(result['status'] for result in results), ['error', 'ok', 'ok', 'ok'])
+        self.assertEqual(crawler._retries, {})
+
+    @patch("application.crawler.async_crawler.RobotsCache")
+    def test_crawl_skips_urls_disallowed_by_robots(self, mock_cache_class):
+        mock_parser = MagicMock()
+        mock_parser.get_crawl_delay.return_value = 0
+        mock_parser.is_allowed.side_effect = lambda ua, path: not path.startswith('/private')
+        mock_cache_class.return_value.get.return_value = mock_parser
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=True)
+
+        async def fake_fetch(url, session, headers=None):
+            return 200, '<html></html>', None, {}
+
+        crawler._fetch = fake_fetch
+        results = crawler.run(["https://example.com/product/1", "https://example.com/private/2"])
+        self.assertEqual(len(results), 1)
+        mock_cache_class.return_value.get.assert_called_once_with("https://example.com")
+        self.assertEqual(crawler.scheduler.hosts["example.com"].base_delay, 0)
+
+    def test_incremental_crawl_skips_unchanged_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state = CrawlState(os.path.join(tmp, 'test.db'))
+            state.record("https://example.com/product/1", 200, {'ETag': '"v1"'}, lastmod='2024-01-01')
+            state.record("https://example.com/product/2", 200, {'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+            state.record("https://example.com/product/3", 200, digest=content_hash('<html>same</html>'))
+            state.flush()
+            crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, scheduler=HostScheduler(default_delay=0), crawl_state=state)
+            sent_headers = {}
+
+            async def fake_fetch(url, session, headers=None):
+                sent_headers[url] = headers
+                if url.endswith('/2'):
+                    return 304, None, None, {}
+                if url.endswith('/3'):
+                    return 200, '<html>same</html>', None, {}
+                return 200, '<html>new</html>', None, {'ETag': '"v2"'}
+
+            def make_extractor(url, writer=None, **kwargs):
+                extractor = MagicMock()
+                extractor.scrape.side_effect = lambda: writer.add({'url': url}) and {'status': 'ok', 'msg': '', 'data': {'url': url}}
+                return extractor
+
+            self.mock_extractor.side_effect = make_extractor
+            crawler._fetch = fake_fetch
+            lastmods = {"https://example.com/product/1": '2024-01-01', "https://example.com/product/4": '2024-02-01'}
+            urls = [f"https://example.com/product/{i}" for i in range(1, 5)]
+            results = crawler.run(urls, lastmods)
+            statuses = {result['data'].get('url'): result['status'] for result in results}
+            self.assertEqual(statuses["https://example.com/product/1"], 'not_modified')
+            self.assertEqual(statuses["https://example.com/product/2"], 'not_modified')
+            self.assertEqual(statuses["https://example.com/product/3"], 'not_modified')
+            self.assertNotIn("https://example.com/product/1", sent_headers)
+            self.assertEqual(sent_headers["https://example.com/product/2"], {'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+            self.mock_extractor.assert_called_once_with("https://example.com/product/4", method='requests', html_body='<html>new</html>', writer=ANY)
+            stored = CrawlStateCRUD(state.connection).get_states(["https://example.com/product/4"])
+            self.assertEqual(stored["https://example.com/product/4"]['etag'], '"v2"')
+            self.assertEqual(stored["https://example.com/product/4"]['sitemap_lastmod'], '2024-02-01')
+            state.close()
+
+    def test_pipeline_parses_in_process_pool(self):
+        crawler = AsyncCrawler(concurrency=4, method='requests', respect_robots=False, scheduler=HostScheduler(default_delay=0, host_concurrency=10), incremental=False, parse_processes=2, queue_size=2)
+        page = '<html><script type="application/ld+json">{"@type": "Product", "name": "Product %s"}</script></html>'
+
+        async def fake_fetch(url, session, headers=None):
+            return 200, page % url.rsplit('/', 1)[-1], None, {}
+
+        crawler._fetch = fake_fetch
+        urls = [f"https://example.com/product/{i}" for i in range(6)]
+        results = crawler.run(urls)
+        self.assertEqual(len(results), 6)
+        self.assertEqual({result['data']['title'] for result in results}, {f"Product {i}" for i in range(6)})
+        self.mock_extractor.assert_not_called()
+        self.assertEqual(self.mock_writer.return_value.add.call_count, 6)
+        self.assertIsNone(crawler._parse_queue)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("not a date"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+    def test_crawl_empty(self):
+        crawler = AsyncCrawler()
+        self.assertEqual(crawler.run([]), [])
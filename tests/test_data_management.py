@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from application.data_management import manage_sqlite
+from application.data_management.manage_sqlite import get_db_connection, close_db_connections, upsert_product_data
+from application.data_management.writer import ProductWriter
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+from tests import make_product
+
+
+class TestSharedConnection(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_file = os.path.join(self.tmp_dir.name, "test.db")
+        self.addCleanup(close_db_connections)
+
+    def test_connection_reused_and_tuned(self):
+        conn = get_db_connection(self.db_file)
+        self.assertIs(conn, get_db_connection(self.db_file))
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+
+    def test_upsert_does_not_create_new_connection(self):
+        conn = get_db_connection(self.db_file)
+        with patch.object(manage_sqlite, "get_db_connection", return_value=conn) as mock_get, \
+                patch.object(manage_sqlite, "SQLiteDBInit") as mock_init:
+            self.assertTrue(upsert_product_data(make_product(1)))
+            self.assertTrue(upsert_product_data(make_product(2)))
+            mock_init.assert_not_called()
+            self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM products").fetchone()[0], 2)
+
+
+class TestProductWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_file = os.path.join(self.tmp_dir.name, "test.db")
+
+    def _count(self, writer):
+        return writer.connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def test_flush_when_batch_full(self):
+        writer = ProductWriter(self.db_file, batch_size=3, flush_interval=0)
+        self.addCleanup(writer.close)
+        writer.add(make_product(1))
+        writer.add(make_product(2))
+        self.assertEqual(self._count(writer), 0)
+        writer.add(make_product(3))
+        self.assertEqual(self._count(writer), 3)
+        self.assertEqual(writer.written, 3)
+
+    def test_flush_by_time(self):
+        writer = ProductWriter(self.db_file, batch_size=100, flush_interval=0.05)
+        self.addCleanup(writer.close)
+        writer.add(make_product(1))
+        deadline = time.monotonic() + 2
+        while writer.written == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._count(writer), 1)
+
+    def test_close_flushes_remaining_rows(self):
+        with ProductWriter(self.db_file, batch_size=100, flush_interval=0) as writer:
+            for i in range(5):
+                writer.add(make_product(i))
+            self.assertEqual(writer.written, 0)
+        self.assertEqual(writer.written, 5)
+        self.assertIsNone(writer.connection)
+
+    def test_failed_batch_is_rolled_back(self):
+        writer = ProductWriter(self.db_file, batch_size=100, flush_interval=0)
+        self.addCleanup(writer.close)
+        writer.add(make_product(1))
+        writer.add({"url": "https://example.com/broken"})
+        self.assertFalse(writer.flush())
+        self.assertEqual(self._count(writer), 0)
+
+
+class TestProductUpsert(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_file = os.path.join(self.tmp_dir.name, "test.db")
+        self.conn = SQLiteDBInit(self.db_file).connection
+        self.addCleanup(self.conn.close)
+        self.crud = ProductsCRUD(self.conn)
+
+    def test_upsert_updates_same_normalized_url(self):
+        product = make_product(1)
+        self.assertTrue(upsert_product_data(product, db_connection=self.conn))
+        product = dict(product, url="HTTPS://Example.com/product/1/?utm_source=mail", title="New title")
+        self.assertTrue(upsert_product_data(product, db_connection=self.conn))
+        rows = self.conn.execute("SELECT url, title FROM products").fetchall()
+        self.assertEqual(rows, [("https://example.com/product/1", "New title")])
+
+    def test_upsert_without_update_keeps_existing_row(self):
+        upsert_product_data(make_product(1), db_connection=self.conn)
+        upsert_product_data(dict(make_product(1), title="Ignored"), db_connection=self.conn, update=False)
+        self.assertEqual(self.conn.execute("SELECT title FROM products").fetchall(), [("Product 1",)])
+
+    def test_get_product_by_url_uses_index(self):
+        self.crud.upsert_products([make_product(i) for i in range(3)])
+        row = self.crud.get_product(url="https://example.com/product/2/")
+        self.assertEqual(row[1], "https://example.com/product/2")
+        plan = self.conn.execute("EXPLAIN QUERY PLAN SELECT * FROM products WHERE url = ?", ("x",)).fetchall()
+        self.assertIn("idx_products_url", str(plan))
+        self.assertEqual(self.crud.get_product(url="https://example.com/missing"), set())
+
+    def test_update_product_uses_given_data(self):
+        self.crud.upsert_product(make_product(1))
+        product_id = self.crud.get_product(url=make_product(1)["url"])[0]
+        self.assertTrue(self.crud.update_product(dict(make_product(1), title="Updated"), product_id))
+        self.assertEqual(self.crud.get_product(product_id=product_id)[2], "Updated")
+
+    def test_old_database_migrated_to_unique_index(self):
+        db_file = os.path.join(self.tmp_dir.name, "old.db")
+        conn = sqlite3.connect(db_file)
+        conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, url TEXT, title TEXT, price TEXT, description TEXT, images TEXT, "
+                     "name TEXT, company_name TEXT, category TEXT, created_at DATETIME, updated_at DATETIME)")
+        conn.executemany("INSERT INTO products (url, title) VALUES (?, ?)", [
+            ("https://example.com/product/1", "old"),
+            ("https://example.com/product/1/", "new"),
+            ("https://example.com/product/2", "other"),
+        ])
+        conn.commit()
+        conn.close()
+        migrated = SQLiteDBInit(db_file).connection
+        self.addCleanup(migrated.close)
+        rows = migrated.execute("SELECT url, title FROM products ORDER BY url").fetchall()
+        self.assertEqual(rows, [("https://example.com/product/1", "new"), ("https://example.com/product/2", "other")])
+        with self.assertRaises(sqlite3.IntegrityError):
+            migrated.execute("INSERT INTO products (url) VALUES ('https://example.com/product/2')")
+
+
+class TestProductDetails(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_file = os.path.join(self.tmp_dir.name, "test.db")
+        self.conn = SQLiteDBInit(self.db_file).connection
+        self.addCleanup(self.conn.close)
+        self.crud = ProductsCRUD(self.conn)
+
+    def test_images_and_categories_stored_as_rows(self):
+        self.crud.upsert_product(dict(make_product(1), images=["a.jpg", "b.jpg"], category=["Laptop", "Lenovo"]))
+        product = self.crud.get_product(url=make_product(1)["url"])
+        self.assertEqual(self.crud.get_product_images(product[0]), ["a.jpg", "b.jpg"])
+        self.assertEqual(self.crud.get_product_categories(product[0]), ["Laptop", "Lenovo"])
+        self.assertEqual(product[5], '["a.jpg", "b.jpg"]')
+        self.assertIsInstance(product[3], float)
+        # Updating the product replaces its detail rows
+        self.crud.upsert_product(dict(make_product(1), images=["c.jpg"], category=["Laptop"]))
+        self.assertEqual(self.crud.get_product_images(product[0]), ["c.jpg"])
+        self.assertEqual(self.crud.get_product_categories(product[0]), ["Laptop"])
+        self.crud.delete_product(product[0])
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM product_images").fetchone()[0], 0)
+
+    def test_insert_ignore_keeps_existing_details(self):
+        self.crud.upsert_product(dict(make_product(1), category=["Old"]))
+        self.crud.upsert_products([dict(make_product(1), category=["New"]), dict(make_product(2), category=["New"])], update=False)
+        rows = self.conn.execute("SELECT p.url, c.name FROM product_categories c JOIN products p ON p.id = c.product_id ORDER BY p.url").fetchall()
+        self.assertEqual(rows, [("https://example.com/product/1", "Old"), ("https://example.com/product/2", "New")])
+
+    def test_find_products_by_category_and_price(self):
+        self.crud.upsert_products([dict(make_product(i), category=["Even" if i % 2 == 0 else "Odd"]) for i in range(6)])
+        rows = self.crud.find_products(category="Even", min_price=11, max_price=14.5)
+        self.assertEqual([row[2] for row in rows], ["Product 2", "Product 4"])
+        plan = str(self.conn.execute("EXPLAIN QUERY PLAN SELECT product_id FROM product_categories WHERE name = ?", ("x",)).fetchall())
+        self.assertIn("idx_product_categories_name", plan)
+        plan = str(self.conn.execute("EXPLAIN QUERY PLAN SELECT * FROM products WHERE price BETWEEN ? AND ?", (1, 2)).fetchall())
+        self.assertIn("idx_products_price", plan)
+
+    def test_old_text_price_table_migrated(self):
+        db_file = os.path.join(self.tmp_dir.name, "old.db")
+        conn = sqlite3.connect(db_file)
+        conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, url TEXT, title TEXT, price TEXT, description TEXT, images TEXT, "
+                     "name TEXT, company_name TEXT, category TEXT, created_at DATETIME, updated_at DATETIME)")
+        conn.execute("INSERT INTO products (url, title, price, images, category) VALUES (?, ?, ?, ?, ?)",
+                     ("https://example.com/product/1", "old", "1,250.5", "['a.jpg', 'b.jpg']", None))
+        conn.commit()
+        conn.close()
+        migrated = SQLiteDBInit(db_file).connection
+        self.addCleanup(migrated.close)
+        crud = ProductsCRUD(migrated)
+        row = crud.get_product(url="https://example.com/product/1")
+        self.assertEqual(row[3], 1250.5)
+        self.assertEqual(row[5], '["a.jpg", "b.jpg"]')
+        self.assertEqual(crud.get_product_images(row[0]), ["a.jpg", "b.jpg"])
+        columns = {column[1]: column[2] for column in migrated.execute("PRAGMA table_info(products)")}
+        self.assertEqual(columns["price"], "REAL")
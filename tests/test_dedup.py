@@ -0,0 +1,41 @@
+import unittest
+from application.crawler.dedup import BloomFilter, SeenSet
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_add_and_contains(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        self.assertTrue(bloom.add("https://example.com/product/1"))
+        self.assertFalse(bloom.add("https://example.com/product/1"))
+        self.assertIn("https://example.com/product/1", bloom)
+        self.assertEqual(len(bloom), 1)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        for i in range(5000):
+            bloom.add(f"https://example.com/product/{i}")
+        false_positives = sum(1 for i in range(5000, 15000) if f"https://example.com/product/{i}" in bloom)
+        self.assertLess(false_positives / 10000, 0.03)
+
+
+class TestSeenSet(unittest.TestCase):
+    def test_exact_below_threshold(self):
+        seen = SeenSet(threshold=10)
+        self.assertTrue(seen.add("a"))
+        self.assertFalse(seen.add("a"))
+        self.assertTrue(seen.is_exact)
+        self.assertEqual(len(seen), 1)
+
+    def test_switches_to_bloom_filter(self):
+        seen = SeenSet(threshold=10, capacity=1000, error_rate=0.001)
+        for i in range(20):
+            self.assertTrue(seen.add(f"url-{i}"))
+        self.assertFalse(seen.is_exact)
+        for i in range(20):
+            self.assertIn(f"url-{i}", seen)
+            self.assertFalse(seen.add(f"url-{i}"))
+        self.assertEqual(len(seen), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import threading
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, PropertyMock
 from application.driver.chrome import setup_driver
+from application.driver.pool import DriverPool
+from application.driver.readiness import wait_until_ready, build_ready_script
 
 
 class TestSetupDriver(unittest.TestCase):
@@ -48,3 +52,143 @@ class TestSetupDriver(unittest.TestCase):
         mock_options_instance.add_argument.assert_any_call('--proxy-server=http://proxy1:8080')
         mock_chrome.assert_called_once_with(options=mock_options_instance)
         self.assertEqual(driver, mock_driver)
+
+
+class TestDriverPool(unittest.TestCase):
+    def _make_pool(self, **kwargs):
+        factory = MagicMock(side_effect=lambda: MagicMock(window_handles=["main"]))
+        return DriverPool(driver_factory=factory, **kwargs), factory
+
+    def test_driver_reused_after_release(self):
+        pool, factory = self._make_pool(size=2)
+        with pool.driver() as first:
+            pass
+        with pool.driver() as second:
+            pass
+        self.assertIs(first, second)
+        factory.assert_called_once()
+
+    def test_unhealthy_driver_replaced(self):
+        pool, factory = self._make_pool(size=1)
+        driver = pool.acquire()
+        pool.release(driver)
+        type(driver).window_handles = PropertyMock(side_effect=Exception("session deleted"))
+        new_driver = pool.acquire()
+        self.assertIsNot(driver, new_driver)
+        driver.quit.assert_called_once()
+        self.assertEqual(factory.call_count, 2)
+
+    def test_driver_recycled_after_max_pages(self):
+        pool, factory = self._make_pool(size=1, max_pages=2)
+        driver = pool.acquire()
+        pool.release(driver)
+        self.assertIs(pool.acquire(), driver)
+        pool.release(driver)
+        driver.quit.assert_called_once()
+        self.assertIsNot(pool.acquire(), driver)
+
+    def test_driver_recycled_when_memory_grows(self):
+        pool, factory = self._make_pool(size=1, max_memory_mb=100)
+        driver = pool.acquire()
+        driver.execute_script.return_value = 200 * 1024 * 1024
+        pool.release(driver)
+        driver.quit.assert_called_once()
+
+    def test_acquire_timeout_when_pool_exhausted(self):
+        pool, factory = self._make_pool(size=1)
+        pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire(timeout=0.01)
+
+    def test_acquire_timeout_not_extended_by_wakeups(self):
+        pool, factory = self._make_pool(size=1)
+        pool.acquire()
+        stop = threading.Event()
+
+        def wake_up():
+            # Wake the waiter up without giving a driver back (For 2 seconds at most)
+            for _ in range(100):
+                if stop.wait(0.02):
+                    return
+                with pool._condition:
+                    pool._condition.notify_all()
+
+        thread = threading.Thread(target=wake_up)
+        thread.start()
+        started_at = time.monotonic()
+        try:
+            with self.assertRaises(TimeoutError):
+                pool.acquire(timeout=0.1)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertLess(time.monotonic() - started_at, 1)
+
+    def test_acquire_waits_for_release_from_other_thread(self):
+        pool, factory = self._make_pool(size=1)
+        driver = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, args=(driver,))
+        timer.start()
+        self.assertIs(pool.acquire(timeout=2), driver)
+        timer.join()
+
+    def test_close_quits_idle_drivers(self):
+        pool, factory = self._make_pool(size=2)
+        driver = pool.acquire()
+        pool.release(driver)
+        pool.close()
+        driver.quit.assert_called_once()
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+
+class TestWaitUntilReady(unittest.TestCase):
+    def test_ready_immediately(self):
+        driver = MagicMock()
+        driver.execute_script.return_value = True
+        self.assertTrue(wait_until_ready(driver, "https://shop.com/p/1", conditions=['json_ld', 'ready_state'], timeout=1))
+        script = driver.execute_script.call_args[0][0]
+        self.assertIn('application/ld+json', script)
+        self.assertIn('document.readyState', script)
+        driver.execute_script.assert_called_once()
+
+    def test_timeout_returns_false(self):
+        driver = MagicMock()
+        driver.execute_script.return_value = False
+        self.assertFalse(wait_until_ready(driver, conditions=['json_ld'], timeout=0.05, poll_interval=0.01))
+        self.assertGreater(driver.execute_script.call_count, 1)
+
+    def test_site_selector_passed_to_script(self):
+        driver = MagicMock()
+        driver.execute_script.return_value = True
+        with patch("application.driver.readiness.config.READY_SELECTORS", new={"shop.com": "h1.product_title"}):
+            wait_until_ready(driver, "https://www.shop.com/p/1", conditions=['selector'], timeout=1)
+        self.assertEqual(driver.execute_script.call_args[0][1], "h1.product_title")
+
+    def test_site_selector_required(self):
+        driver = MagicMock()
+        driver.execute_script.return_value = True
+        with patch("application.driver.readiness.config.READY_SELECTORS", new={"shop.com": "h1.product_title"}):
+            wait_until_ready(driver, "https://shop.com/p/1", conditions=['json_ld', 'ready_state', 'selector'], timeout=1)
+        script = driver.execute_script.call_args[0][0]
+        self.assertIn('querySelector(arguments[0])', script)
+        self.assertNotIn('document.readyState', script)
+        self.assertNotIn('application/ld+json', script)
+
+    def test_ready_state_fallback_without_site_selector(self):
+        driver = MagicMock()
+        driver.execute_script.return_value = True
+        with patch("application.driver.readiness.config.READY_SELECTORS", new={"shop.com": "h1.product_title"}):
+            wait_until_ready(driver, "https://other.com/p/1", conditions=['ready_state', 'selector'], timeout=1)
+        self.assertEqual(driver.execute_script.call_args[0][0], "return (document.readyState === 'complete');")
+
+    @patch("application.driver.readiness.time.sleep")
+    def test_no_conditions_waits_timeout(self, mock_sleep):
+        driver = MagicMock()
+        self.assertFalse(wait_until_ready(driver, conditions=[], timeout=2))
+        mock_sleep.assert_called_once_with(2)
+        driver.execute_script.assert_not_called()
+
+    def test_build_ready_script_ignores_unknown_conditions(self):
+        self.assertIsNone(build_ready_script(['unknown']))
+        self.assertEqual(build_ready_script(['ready_state']), "return (document.readyState === 'complete');")
@@ -0,0 +1,86 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from application.data_management import export
+from application.data_management.export import export_products, detect_format
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD
+from tests import make_product
+
+
+class TestExportProducts(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.conn = SQLiteDBInit(os.path.join(self.tmp_dir.name, "test.db")).connection
+        self.addCleanup(self.conn.close)
+        ProductsCRUD(self.conn).upsert_products([make_product(i) for i in range(5)])
+        with self.conn:
+            self.conn.execute("UPDATE products SET updated_at = '2024-01-01 00:00:00' WHERE id <= 3")
+            self.conn.execute("UPDATE products SET updated_at = '2024-02-01 00:00:00' WHERE id > 3")
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_jsonl_export_in_chunks(self):
+        result = export_products(self.path('products.jsonl'), chunk_size=2, db_connection=self.conn)
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(result.last_updated_at, '2024-02-01 00:00:00')
+        with open(self.path('products.jsonl'), encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['title'] for row in rows], [f"Product {i}" for i in range(5)])
+        self.assertFalse(os.path.exists(self.path('products.jsonl.part')))
+
+    def test_incremental_csv_export(self):
+        result = export_products(self.path('products.csv'), since='2024-02-01 00:00:00', chunk_size=1, db_connection=self.conn)
+        self.assertEqual(result.rows, 2)
+        with open(self.path('products.csv'), encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['url'] for row in rows], ["https://example.com/product/3", "https://example.com/product/4"])
+
+    def test_incremental_export_continues_after_last_row(self):
+        first = export_products(self.path('first.jsonl'), chunk_size=2, db_connection=self.conn)
+        self.assertEqual((first.last_updated_at, first.last_id), ('2024-02-01 00:00:00', 5))
+        # Rows written later in the same second as the last exported row
+        ProductsCRUD(self.conn).upsert_products([make_product(i) for i in range(5, 7)])
+        with self.conn:
+            self.conn.execute("UPDATE products SET updated_at = '2024-02-01 00:00:00' WHERE id > 5")
+        second = export_products(self.path('second.jsonl'), since=first.last_updated_at, after_id=first.last_id, db_connection=self.conn)
+        self.assertEqual((second.rows, second.last_id), (2, 7))
+        with open(self.path('second.jsonl'), encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['id'] for line in f], [6, 7])
+        third = export_products(self.path('third.jsonl'), since=second.last_updated_at, after_id=second.last_id, db_connection=self.conn)
+        self.assertEqual(third.rows, 0)
+
+    def test_rows_of_current_second_left_to_next_export(self):
+        with self.conn:
+            self.conn.execute("UPDATE products SET updated_at = '2024-03-01 00:00:00' WHERE id = 5")
+        with patch("application.data_management.export.current_timestamp", return_value='2024-03-01 00:00:00'):
+            result = export_products(self.path('products.jsonl'), db_connection=self.conn)
+        self.assertEqual((result.rows, result.last_id), (4, 4))
+
+    def test_empty_export(self):
+        result = export_products(self.path('products.jsonl'), since='2030-01-01 00:00:00', db_connection=self.conn)
+        self.assertEqual(result, (0, None, None))
+        self.assertEqual(os.path.getsize(self.path('products.jsonl')), 0)
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format('out.ndjson'), 'jsonl')
+        self.assertEqual(detect_format('out.PARQUET'), 'parquet')
+        with self.assertRaises(ValueError):
+            detect_format('out.xlsx')
+
+    @unittest.skipIf(export.pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_export(self):
+        import pyarrow.parquet
+        result = export_products(self.path('products.parquet'), chunk_size=2, db_connection=self.conn)
+        table = pyarrow.parquet.read_table(self.path('products.parquet'))
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column('price').to_pylist(), [10.0, 11.0, 12.0, 13.0, 14.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -138,4 +138,43 @@ class TestExtractor(unittest.TestCase):
         self.assertEqual(data["description"], "Test Desc")
         self.assertEqual(data["images"], ["img1.jpg"])
         self.assertEqual(data["company_name"], "Test Company")
-        self.assertEqual(data["category"], ["cat1"])
\ No newline at end of file
+        self.assertEqual(data["category"], ["cat1"])
+
+PRODUCT_PAGE = """<html><head>
+<script type="application/ld+json">{"@context": "https://schema.org", "@type": "BreadcrumbList", "itemListElement": []}</script>
+<SCRIPT data-rh="true" TYPE='application/ld+json'>
+{"@context": "https://schema.org", "@type": "Product", "name": "Fast Product",
+ "offers": {"@type": "Offer", "price": "12.50", "priceCurrency": "USD"}}
+</SCRIPT>
+</head><body><h1>Fast Product</h1></body></html>"""
+
+
+class TestJsonLdFastPath(unittest.TestCase):
+    def setUp(self):
+        patcher_bs = patch("application.extractor.extract.parse_html")
+        self.mock_bs = patcher_bs.start()
+        self.addCleanup(patcher_bs.stop)
+
+    def test_json_ld_found_without_parsing_page(self):
+        writer = MagicMock()
+        extractor = Extractor("https://example.com/product/1", method='requests', html_body=PRODUCT_PAGE, writer=writer)
+        result = extractor.scrape()
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['data']['title'], "Fast Product")
+        self.assertEqual(result['data']['price'], 12.5)
+        self.mock_bs.assert_not_called()
+        writer.add.assert_called_once()
+
+    def test_soup_built_only_for_css_fallback(self):
+        writer = MagicMock()
+        extractor = Extractor("https://example.com/product/1", method='requests', html_body="<html><h1>Plain</h1></html>", writer=writer)
+        extractor._extract_fields = MagicMock()
+        extractor.scrape()
+        self.mock_bs.assert_called_once_with("<html><h1>Plain</h1></html>", None)
+        extractor._extract_fields.assert_called_once()
+
+    def test_find_json_ld_scripts(self):
+        extractor = Extractor("https://example.com/product/1", html_body=PRODUCT_PAGE)
+        scripts = extractor._find_json_ld_scripts()
+        self.assertEqual(len(scripts), 2)
+        self.assertIn('"Product"', scripts[1])
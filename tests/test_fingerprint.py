@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from application.crawler.incremental import CrawlState
+from application.extractor.extract import Extractor
+from application.extractor.fingerprint import content_hash, normalize_html
+
+
+PAGE = """<html><head>
+<meta name="csrf-token" content="%(token)s">
+<script nonce="%(token)s">var wc_add_to_cart_params = {"ajax_url": "/wp-admin/admin-ajax.php", "wc_ajax_nonce": "%(token)s"};</script>
+<!-- Page cached on %(token)s -->
+</head><body>
+<h1>Product</h1><span class="price">%(price)s</span>
+<form action="/cart?_wpnonce=%(token)s"><input type="hidden" name="csrf_token" value="%(token)s"></form>
+</body></html>"""
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_tokens_removed(self):
+        html = normalize_html(PAGE % {'token': 'a1b2c3', 'price': '10'})
+        self.assertNotIn('a1b2c3', html)
+        self.assertIn('<span class="price">10</span>', html)
+        self.assertIn('"ajax_url": "/wp-admin/admin-ajax.php"', html)
+
+    def test_same_hash_when_only_tokens_change(self):
+        first = content_hash(PAGE % {'token': 'a1b2c3', 'price': '10'})
+        self.assertEqual(first, content_hash(PAGE % {'token': 'zzz999', 'price': '10'}))
+        self.assertNotEqual(first, content_hash(PAGE % {'token': 'a1b2c3', 'price': '11'}))
+        self.assertNotEqual(
+            content_hash(PAGE % {'token': 'a1b2c3', 'price': '10'}, normalize=False),
+            content_hash(PAGE % {'token': 'zzz999', 'price': '10'}, normalize=False),
+        )
+        self.assertEqual(content_hash(b'<p>\xff</p>'), content_hash('<p>\udcff</p>'.encode('utf-8', 'surrogateescape')))
+
+
+class TestExtractorFingerprintStage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.state = CrawlState(os.path.join(self.tmp_dir.name, 'test.db'))
+        self.addCleanup(self.state.close)
+        self.url = "https://example.com/product/1"
+
+    @patch.object(Extractor, '_store_product')
+    @patch.object(Extractor, 'extract')
+    def test_unchanged_page_not_parsed_or_stored(self, mock_extract, mock_store):
+        self.state.record(self.url, 200, digest=content_hash(PAGE % {'token': 'a1b2c3', 'price': '10'}))
+        self.state.flush()
+        # A new CrawlState reads the state from the database
+        state = CrawlState(connection=self.state.connection)
+        result = Extractor(self.url, method='requests', html_body=PAGE % {'token': 'other', 'price': '10'}, crawl_state=state).scrape()
+        self.assertEqual(result['status'], 'not_modified')
+        mock_extract.assert_not_called()
+        mock_store.assert_not_called()
+
+    @patch.object(Extractor, '_store_product', return_value=True)
+    @patch.object(Extractor, 'extract')
+    def test_changed_page_extracted(self, mock_extract, mock_store):
+        self.state.record(self.url, 200, digest=content_hash(PAGE % {'token': 'a1b2c3', 'price': '10'}))
+        extractor = Extractor(self.url, method='requests', html_body=PAGE % {'token': 'a1b2c3', 'price': '12'}, crawl_state=self.state)
+        self.assertEqual(extractor.scrape()['status'], 'ok')
+        mock_extract.assert_called_once()
+        self.assertEqual(extractor.digest, content_hash(PAGE % {'token': 'x', 'price': '12'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch, MagicMock
+from _main import scrape_and_store
+from application.crawler.async_crawler import AsyncCrawler
+from application.crawler.frontier import SQLiteFrontier
+from application.crawler.incremental import CrawlState
+from application.crawler.scheduler import HostScheduler
+from application.data_management.writer import ProductWriter
+from application.database.sqlite import CrawlStateCRUD, ProductsCRUD
+from application.network.http_client import create_async_session
+
+
+class TestSQLiteFrontier(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_file = os.path.join(self.tmp.name, 'test.db')
+
+    def make_frontier(self, **kwargs):
+        frontier = SQLiteFrontier(self.db_file, **kwargs)
+        self.addCleanup(frontier.close)
+        return frontier
+
+    def test_claim_by_priority_and_keep_state_on_add(self):
+        frontier = self.make_frontier()
+        frontier.add(["https://example.com/product/1", "https://example.com/product/2"], lastmods={"https://example.com/product/1": '2024-01-01'})
+        frontier.add(["https://example.com/product/3"], priority=5)
+        batch = frontier.claim(2)
+        self.assertEqual(batch, [("https://example.com/product/3", None), ("https://example.com/product/1", '2024-01-01')])
+        # Adding a claimed url again does not make it pending
+        frontier.add(["https://example.com/product/3"])
+        self.assertEqual(frontier.counts(), {'pending': 1, 'in_flight': 2, 'done': 0, 'failed': 0})
+        self.assertEqual(frontier.claim(10), [("https://example.com/product/2", None)])
+        self.assertEqual(frontier.claim(10), [])
+
+    def test_failed_url_retried_until_max_attempts(self):
+        frontier = self.make_frontier(max_attempts=2)
+        frontier.add(["https://example.com/product/1"])
+        for _ in range(2):
+            batch = frontier.claim(10)
+            self.assertEqual(len(batch), 1)
+            frontier.finish(failed=[(batch[0][0], 'timeout')])
+        self.assertEqual(frontier.claim(10), [])
+        self.assertEqual(frontier.counts()['failed'], 1)
+
+    def test_resume_after_crash(self):
+        frontier = self.make_frontier()
+        urls = [f"https://example.com/product/{i}" for i in range(5)]
+        frontier.add(urls)
+        frontier.finish(done=[url for url, _ in frontier.claim(2)])
+        frontier.claim(2)
+        # The process dies here and a new process opens the same frontier
+        resumed = self.make_frontier()
+        self.assertEqual(resumed.recover(), 2)
+        self.assertTrue(resumed.has_unfinished())
+        remaining = [url for url, _ in resumed.claim(10)]
+        self.assertEqual(remaining, urls[2:])
+
+    def test_recover_only_expired_leases(self):
+        frontier = self.make_frontier(lease_timeout=-1, owner='a')
+        frontier.add(["https://example.com/product/1"])
+        frontier.claim(1)
+        running = self.make_frontier(lease_timeout=60, owner='b')
+        running.add(["https://example.com/product/2"])
+        running.claim(1)
+        other = self.make_frontier(lease_timeout=60, owner='c')
+        self.assertEqual(other.recover(expired_only=True), 1)
+        self.assertEqual(other.claim(10), [("https://example.com/product/1", None)])
+
+    def test_restart_recovers_own_leases(self):
+        urls = [f"https://example.com/product/{i}" for i in range(5)]
+        frontier = self.make_frontier(lease_timeout=3600, owner='a')
+        frontier.add(urls)
+        frontier.claim(3)
+        other = self.make_frontier(lease_timeout=3600, owner='b')
+        other.claim(1)
+        # The crawler 'a' dies and starts again while the lease of its urls is still valid
+        restarted = self.make_frontier(lease_timeout=3600, owner='a')
+        self.assertEqual(restarted.recover(expired_only=True), 3)
+        self.assertEqual([url for url, _ in restarted.claim(10)], urls[:3] + urls[4:])
+        self.assertEqual(restarted.counts()['in_flight'], 5)
+
+    @patch("_main.AsyncCrawler")
+    def test_scrape_and_store_resumes_after_crash(self, mock_crawler_class):
+        urls = [f"https://example.com/product/{i}" for i in range(5)]
+        frontier = self.make_frontier()
+        frontier.add(urls)
+        frontier.claim(3)
+        frontier.close()
+        crawled = []
+
+        def run_frontier(frontier):
+            while batch := frontier.claim(10):
+                crawled.extend(url for url, _ in batch)
+                frontier.finish(done=[url for url, _ in batch])
+            return [{'status': 'ok', 'data': {'url': url}} for url in crawled]
+
+        mock_crawler_class.return_value.run_frontier.side_effect = run_frontier
+        with patch("_main.SQLiteFrontier", lambda: SQLiteFrontier(self.db_file)):
+            scrape_and_store(urls[:1])
+        self.assertEqual(sorted(crawled), urls)
+        self.assertEqual(self.make_frontier().counts(), {'pending': 0, 'in_flight': 0, 'done': 5, 'failed': 0})
+
+    def test_clear_finished(self):
+        frontier = self.make_frontier()
+        frontier.add(["https://example.com/product/1", "https://example.com/product/2"])
+        frontier.finish(done=[frontier.claim(1)[0][0]])
+        frontier.clear_finished()
+        self.assertEqual(frontier.counts(), {'pending': 1, 'in_flight': 0, 'done': 0, 'failed': 0})
+
+
+class TestCrawlFrontier(unittest.TestCase):
+    def setUp(self):
+        patcher_extractor = patch("application.crawler.async_crawler.Extractor")
+        self.mock_extractor = patcher_extractor.start()
+        self.addCleanup(patcher_extractor.stop)
+
+        patcher_writer = patch("application.crawler.async_crawler.ProductWriter")
+        mock_writer = patcher_writer.start()
+        self.addCleanup(patcher_writer.stop)
+        # Every product added is committed right away
+        listeners = []
+        mock_writer.return_value.add_listener.side_effect = listeners.append
+        mock_writer.return_value.add.side_effect = lambda product_data: [listener([product_data.get('url')], True) for listener in listeners] or True
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_run_frontier_marks_results(self):
+        def make_extractor(url, writer=None, **kwargs):
+            extractor = MagicMock()
+            extractor.scrape.side_effect = lambda: writer.add({'url': url}) and {'status': 'ok', 'msg': '', 'data': {'url': url}}
+            return extractor
+        self.mock_extractor.side_effect = make_extractor
+        frontier = SQLiteFrontier(os.path.join(self.tmp.name, 'test.db'), max_attempts=1)
+        self.addCleanup(frontier.close)
+        urls = [f"https://example.com/product/{i}" for i in range(5)]
+        frontier.add(urls)
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, incremental=False, scheduler=HostScheduler(default_delay=0, host_concurrency=10))
+
+        async def fake_fetch(url, session, headers=None):
+            if url.endswith('/4'):
+                return None, None, None, {}
+            return 200, '<html></html>', None, {}
+
+        crawler._fetch = fake_fetch
+        results = crawler.run_frontier(frontier, batch_size=2)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(frontier.counts(), {'pending': 0, 'in_flight': 0, 'done': 4, 'failed': 1})
+
+    def test_batches_share_the_pipeline(self):
+        frontier = SQLiteFrontier(os.path.join(self.tmp.name, 'test.db'))
+        self.addCleanup(frontier.close)
+        urls = [f"https://example.com/product/{i}" for i in range(5)]
+        frontier.add(urls)
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=2, respect_robots=False, incremental=False, scheduler=HostScheduler(default_delay=0, host_concurrency=10))
+        page = '<html><script type="application/ld+json">{"@type": "Product", "name": "Product %s"}</script></html>'
+
+        async def fake_fetch(url, session, headers=None):
+            return 200, page % url.rsplit('/', 1)[-1], None, {}
+
+        crawler._fetch = fake_fetch
+        with patch("application.crawler.async_crawler.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as mock_pool, \
+                patch("application.crawler.async_crawler.create_async_session", wraps=create_async_session) as mock_session:
+            results = crawler.run_frontier(frontier, batch_size=2)
+        self.assertEqual({result['data']['title'] for result in results}, {f"Product {i}" for i in range(5)})
+        self.assertEqual(frontier.counts(), {'pending': 0, 'in_flight': 0, 'done': 5, 'failed': 0})
+        self.assertEqual(mock_pool.call_count, 1)
+        self.assertEqual(mock_session.call_count, 1)
+
+
+class TestCrawlFrontierStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_file = os.path.join(self.tmp.name, 'test.db')
+
+    @patch.object(ProductsCRUD, 'upsert_products', return_value=False)
+    def test_failed_commit_is_not_recorded(self, _):
+        page = '<html><script type="application/ld+json">{"@type": "Product", "name": "Product %s", "offers": {"price": "10"}}</script></html>'
+        frontier = SQLiteFrontier(self.db_file, max_attempts=1)
+        self.addCleanup(frontier.close)
+        state = CrawlState(self.db_file)
+        self.addCleanup(state.close)
+        writer = ProductWriter(db_file=self.db_file, batch_size=2)
+        self.addCleanup(writer.close)
+        urls = [f"https://example.com/product/{i}" for i in range(3)]
+        frontier.add(urls)
+        crawler = AsyncCrawler(concurrency=2, method='requests', parse_processes=0, respect_robots=False, crawl_state=state,
+                               scheduler=HostScheduler(default_delay=0, host_concurrency=10))
+        crawler.writer = writer
+
+        async def fake_fetch(url, session, headers=None):
+            return 200, page % url.rsplit('/', 1)[-1], None, {'ETag': '"v1"'}
+
+        crawler._fetch = fake_fetch
+        results = crawler.run_frontier(frontier, batch_size=3)
+        self.assertEqual({result['status'] for result in results}, {'error'})
+        self.assertEqual(frontier.counts().get('done', 0), 0)
+        state.flush()
+        self.assertEqual(CrawlStateCRUD(state.connection).get_states(urls), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import requests
+from application.data_management.manage_sqlite import upsert_product_data
+from application.extractor.extract import Extractor
+from logger import metrics
+from logger.metrics import MetricsExporter, MetricsRegistry, REGISTRY, STAGE_RESULTS, STAGE_SECONDS, stage_timer, timed
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        REGISTRY.reset()
+        self.addCleanup(REGISTRY.reset)
+
+    def test_render_counter_and_histogram(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('pages_total', 'Pages', ('host', 'status'))
+        counter.inc(host='a.com', status='ok')
+        counter.inc(2, host='a.com', status='ok')
+        histogram = registry.histogram('fetch_seconds', 'Fetch time', ('host',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, host='a.com')
+        histogram.observe(0.5, host='a.com')
+        histogram.observe(5, host='a.com')
+        text = registry.render()
+        self.assertIn('# TYPE pages_total counter', text)
+        self.assertIn('pages_total{host="a.com",status="ok"} 3', text)
+        self.assertIn('# TYPE fetch_seconds histogram', text)
+        self.assertIn('fetch_seconds_bucket{host="a.com",le="0.1"} 1', text)
+        self.assertIn('fetch_seconds_bucket{host="a.com",le="1"} 2', text)
+        self.assertIn('fetch_seconds_bucket{host="a.com",le="+Inf"} 3', text)
+        self.assertIn('fetch_seconds_count{host="a.com"} 3', text)
+        self.assertIs(registry.counter('pages_total', 'Pages', ('host', 'status')), counter)
+        with self.assertRaises(ValueError):
+            registry.histogram('pages_total', 'Pages')
+
+    def test_stage_timer_status(self):
+        with stage_timer('fetch', 'https://Example.com/p/1'):
+            pass
+        with self.assertRaises(RuntimeError):
+            with stage_timer('fetch', 'https://example.com/p/2'):
+                raise RuntimeError('boom')
+        self.assertEqual(STAGE_RESULTS.get(stage='fetch', host='example.com', status='ok'), 1)
+        self.assertEqual(STAGE_RESULTS.get(stage='fetch', host='example.com', status='error'), 1)
+        self.assertEqual(STAGE_SECONDS.get(stage='fetch', host='example.com')[0], 2)
+
+    def test_timed_status_from_result(self):
+        @timed('store', url_of=lambda product_data: product_data['url'])
+        def store(product_data):
+            return product_data.get('ok', False)
+        self.assertTrue(store({'url': 'https://shop.com/1', 'ok': True}))
+        self.assertFalse(store({'url': 'https://shop.com/2'}))
+        self.assertEqual(STAGE_RESULTS.get(stage='store', host='shop.com', status='ok'), 1)
+        self.assertEqual(STAGE_RESULTS.get(stage='store', host='shop.com', status='error'), 1)
+
+    def test_timed_url_of_error_is_ignored(self):
+        @timed('store', url_of=lambda product_data: product_data['url'])
+        def store(product_data):
+            return bool(product_data)
+        self.assertFalse(store(None))
+        self.assertEqual(STAGE_RESULTS.get(stage='store', host='', status='error'), 1)
+        self.assertFalse(upsert_product_data(None, db_connection=MagicMock()))
+
+    @patch.object(metrics.config, 'METRICS_ENABLED', False)
+    def test_disabled(self):
+        with stage_timer('fetch', 'https://example.com/'):
+            pass
+        self.assertEqual(STAGE_SECONDS.get(stage='fetch', host='example.com'), (0, 0.0))
+
+    @patch('application.extractor.extract.upsert_product_data', return_value=True)
+    def test_extractor_stages(self, _):
+        html = '<html><head><script type="application/ld+json">{"@type": "Product", "name": "Phone", "offers": {"price": "10"}}</script></head></html>'
+        result = Extractor('https://shop.com/product/1', method='requests', html_body=html).scrape()
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(STAGE_RESULTS.get(stage='json_ld', host='shop.com', status='ok'), 1)
+        self.assertEqual(STAGE_RESULTS.get(stage='scrape', host='shop.com', status='ok'), 1)
+
+    @patch('application.extractor.extract.http_get')
+    def test_extractor_counts_responses(self, mock_http_get):
+        mock_http_get.return_value = MagicMock(status_code=404, raise_for_status=MagicMock(side_effect=requests.HTTPError(response=MagicMock())))
+        self.assertFalse(Extractor('https://shop.com/product/1', method='requests')._initialize_requests())
+        self.assertEqual(metrics.HTTP_RESPONSES.get(host='shop.com', status=404), 1)
+        self.assertEqual(STAGE_RESULTS.get(stage='fetch', host='shop.com', status='error'), 1)
+
+    def test_exporter_endpoint_and_dump(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dump_file = os.path.join(tmp_dir, 'metrics', 'scraper.prom')
+            with stage_timer('fetch', 'https://example.com/'):
+                pass
+            exporter = MetricsExporter(port=0, dump_file=dump_file, dump_interval=60)
+            self.assertTrue(exporter.start())
+            try:
+                response = requests.get(f'http://{exporter.host}:{exporter.port}/metrics', timeout=5)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('scraper_stage_duration_seconds_count{stage="fetch",host="example.com"} 1', response.text)
+                self.assertEqual(requests.get(f'http://{exporter.host}:{exporter.port}/other', timeout=5).status_code, 404)
+            finally:
+                exporter.close()
+            with open(dump_file, encoding='utf-8') as f:
+                self.assertIn('scraper_stage_total{stage="fetch",host="example.com",status="ok"} 1', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
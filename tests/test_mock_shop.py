@@ -0,0 +1,51 @@
+import gzip
+import unittest
+import requests
+from application.extractor.extract import Extractor
+from benchmarks.load_test import percentile, run_load_test
+from benchmarks.mock_shop import MockShop
+
+
+class TestMockShop(unittest.TestCase):
+    def setUp(self):
+        self.shop = MockShop(products=30, sitemap_size=10)
+        self.shop.start()
+        self.addCleanup(self.shop.stop)
+
+    def test_serves_robots_and_nested_gzipped_sitemaps(self):
+        robots = requests.get(f'{self.shop.base_url}/robots.txt', timeout=5)
+        self.assertIn(f'Sitemap: {self.shop.base_url}/sitemap_index.xml', robots.text)
+        index = requests.get(f'{self.shop.base_url}/product-sitemap-index.xml', timeout=5)
+        self.assertEqual(index.text.count('<sitemap>'), 3)
+        sitemap = requests.get(f'{self.shop.base_url}/product-sitemap2.xml.gz', timeout=5)
+        self.assertIn(f'{self.shop.base_url}/product/item-29/', gzip.decompress(sitemap.content).decode())
+
+    def test_product_page_is_extracted(self):
+        response = requests.get(f'{self.shop.base_url}/product/item-7/', timeout=5)
+        self.assertEqual(response.status_code, 200)
+        product = Extractor(response.url, method='requests', html_body=response.text).extract()
+        self.assertEqual(product['title'], 'Laptop model 7')
+        self.assertEqual(product['price'], 359.0)
+        self.assertEqual(requests.get(f'{self.shop.base_url}/product/item-30/', timeout=5).status_code, 404)
+
+    def test_error_rate(self):
+        self.shop.error_rate = 1.0
+        statuses = {requests.get(f'{self.shop.base_url}/product/item-{i}/', timeout=5).status_code for i in range(10)}
+        self.assertTrue(statuses <= {500, 503})
+        self.assertEqual(sum(self.shop.stats().values()), 10)
+
+    def test_load_test_crawls_every_product(self):
+        report = run_load_test(self.shop.base_url, [4])
+        self.assertEqual(report['discovery']['links'], 30)
+        run = report['runs'][0]
+        self.assertEqual((run['ok'], run['errors'], run['rows_written']), (30, 0, 30))
+        self.assertGreater(run['latency_ms']['p99'], 0)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from application.network import http_client
+from application.network.http_client import create_session, get_session, http_get
+
+
+class TestHttpClient(unittest.TestCase):
+    def test_create_session_pools_and_retries(self):
+        session = create_session(pool_connections=4, pool_maxsize=8, retries=2, backoff_factor=0.1)
+        adapter = session.get_adapter("https://example.com")
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 8)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.1)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+        self.assertIn("gzip", session.headers["Accept-Encoding"])
+        self.assertIs(session.get_adapter("http://example.com"), adapter)
+
+    def test_get_session_is_shared_per_thread(self):
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(get_session()))
+        thread.start()
+        thread.join()
+        self.assertIs(get_session(), get_session())
+        self.assertIsNot(sessions[0], get_session())
+
+    @patch.object(http_client, "get_session")
+    def test_http_get_uses_default_timeout(self, mock_get_session):
+        mock_session = MagicMock()
+        mock_get_session.return_value = mock_session
+        with patch.object(http_client.config, "REQUEST_TIMEOUT", 7):
+            http_get("https://example.com/robots.txt")
+        mock_session.get.assert_called_once_with("https://example.com/robots.txt", timeout=7)
+        http_get("https://example.com/robots.txt", timeout=2, stream=True)
+        mock_session.get.assert_called_with("https://example.com/robots.txt", timeout=2, stream=True)
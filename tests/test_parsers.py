@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import patch
+from application.extractor import parsers
+from application.extractor.parsers import available_backends, parse_html, resolve_backend
+
+
+PAGE = '<html><body><h1 class="title">Test <b>Product</b></h1><div class="images"><img src="a.jpg"><img src="b.jpg"></div></body></html>'
+
+
+class TestParserBackends(unittest.TestCase):
+    def tearDown(self):
+        resolve_backend.cache_clear()
+
+    def check_backend(self, backend):
+        document = parse_html(PAGE, backend)
+        self.assertEqual(document.select('h1.title')[0].get_text().strip(), 'Test Product')
+        self.assertEqual([img.get('src') for img in document.select('.images img')], ['a.jpg', 'b.jpg'])
+        self.assertIsNone(document.select('h1')[0].get('data-missing'))
+        self.assertEqual(document.select('.missing'), [])
+
+    def test_html_parser(self):
+        self.check_backend('html.parser')
+
+    @unittest.skipUnless('lxml' in available_backends(), 'lxml is not installed')
+    def test_lxml(self):
+        self.check_backend('lxml')
+
+    @unittest.skipUnless('selectolax' in available_backends(), 'selectolax is not installed')
+    def test_selectolax(self):
+        self.check_backend('selectolax')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            parse_html(PAGE, 'unknown')
+
+    def test_missing_backend_falls_back_to_html_parser(self):
+        with patch.object(parsers, 'available_backends', return_value=['html.parser']):
+            self.assertEqual(resolve_backend('selectolax'), 'html.parser')
+            self.check_backend('selectolax')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from application.data_management.price_history import PriceTracker, observed_values
+from application.database.sqlite import SQLiteDBInit, ProductsCRUD, PriceHistoryCRUD
+from tests import make_product as base_product
+
+
+def make_product(i: int, price: float=10.0, currency: str='USD', availability: str='https://schema.org/InStock') -> dict:
+    return base_product(i, price=price, currency=currency, availability=availability)
+
+
+class TestPriceHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_file = os.path.join(self.tmp_dir.name, "test.db")
+        self.conn = SQLiteDBInit(self.db_file).connection
+        self.addCleanup(self.conn.close)
+        self.crud = ProductsCRUD(self.conn)
+        self.history = PriceHistoryCRUD(self.conn)
+
+    def test_observed_values(self):
+        self.assertEqual(observed_values(make_product(1, currency='usd')), (10.0, 'USD', 'InStock'))
+        self.assertEqual(observed_values({'price': 0.0}), (None, None, None))
+
+    def test_only_changes_recorded(self):
+        tracker = PriceTracker(self.conn)
+        self.crud.upsert_products([make_product(1), make_product(2)], price_tracker=tracker)
+        self.crud.upsert_products([make_product(1), make_product(2, price=12.5)], price_tracker=tracker)
+        self.crud.upsert_products([make_product(1, availability='https://schema.org/OutOfStock')], price_tracker=tracker)
+        self.crud.upsert_products([make_product(1, availability='https://schema.org/OutOfStock')], price_tracker=tracker)
+        first = [row[:3] for row in self.history.get_history("https://example.com/product/1")]
+        second = [row[:3] for row in self.history.get_history("https://example.com/product/2/")]
+        self.assertEqual(first, [(10.0, 'USD', 'InStock'), (10.0, 'USD', 'OutOfStock')])
+        self.assertEqual(second, [(10.0, 'USD', 'InStock'), (12.5, 'USD', 'InStock')])
+
+    def test_last_values_loaded_lazily_from_database(self):
+        self.crud.upsert_products([make_product(1)], price_tracker=PriceTracker(self.conn))
+        tracker = PriceTracker(self.conn, cache_size=1)
+        with patch.object(tracker.crud, 'last_values', wraps=tracker.crud.last_values) as mock_load:
+            self.crud.upsert_products([make_product(1)], price_tracker=tracker)
+            self.crud.upsert_products([make_product(1)], price_tracker=tracker)
+        mock_load.assert_called_once_with(["https://example.com/product/1"])
+        self.assertEqual(len(self.history.get_history("https://example.com/product/1")), 1)
+
+    def test_cache_not_updated_when_transaction_fails(self):
+        tracker = PriceTracker(self.conn)
+        with patch.object(ProductsCRUD, 'write_details', side_effect=RuntimeError('fail')):
+            self.assertFalse(self.crud.upsert_products([make_product(1)], price_tracker=tracker))
+        self.crud.upsert_products([make_product(1)], price_tracker=tracker)
+        self.assertEqual(len(self.history.get_history("https://example.com/product/1")), 1)
+
+    def test_stale_cache_checked_against_database(self):
+        other_conn = SQLiteDBInit(self.db_file).connection
+        self.addCleanup(other_conn.close)
+        tracker, other_tracker = PriceTracker(self.conn), PriceTracker(other_conn)
+        self.crud.upsert_products([make_product(1)], price_tracker=tracker)
+        # Another worker records the new price, so the cache of the first tracker is stale
+        ProductsCRUD(other_conn).upsert_products([make_product(1, price=12.0)], price_tracker=other_tracker)
+        self.crud.upsert_products([make_product(1, price=12.0)], price_tracker=tracker)
+        rows = [row[0] for row in self.history.get_history("https://example.com/product/1")]
+        self.assertEqual(rows, [10.0, 12.0])
+
+    def test_last_values_error_rolls_back(self):
+        tracker = PriceTracker(self.conn)
+        tracker.crud.conn = MagicMock(execute=MagicMock(side_effect=sqlite3.OperationalError('database is locked')))
+        self.assertFalse(self.crud.upsert_products([make_product(1)], price_tracker=tracker))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0], 0)
+
+    def test_range_queries(self):
+        with self.conn:
+            self.history.insert([
+                ("https://example.com/product/1", 10.0, 'USD', None, '2024-01-01 00:00:00'),
+                ("https://example.com/product/1", 11.0, 'USD', None, '2024-02-01 00:00:00'),
+                ("https://example.com/product/2", 5.0, 'USD', None, '2024-02-15 00:00:00'),
+            ])
+        rows = self.history.get_history("https://example.com/product/1", start='2024-01-15 00:00:00')
+        self.assertEqual([row[0] for row in rows], [11.0])
+        rows = self.history.get_changes(start='2024-02-01 00:00:00', end='2024-02-15 00:00:00')
+        self.assertEqual([row[0] for row in rows], ["https://example.com/product/1"])
+        plan = str(self.conn.execute("EXPLAIN QUERY PLAN SELECT * FROM price_history WHERE url = ? AND observed_at >= ?", ("x", "y")).fetchall())
+        self.assertIn("idx_price_history_url", plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
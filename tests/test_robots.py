@@ -1,11 +1,16 @@
+import threading
+import time
+from collections import deque
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
+from application.crawler.dedup import SeenSet
+from application.extractor.sitemap import SitemapEntry
 from application.extractor.robots_parser import RobotsTxtParser, RobotsExtLinks
 from requests.exceptions import RequestException
 
 class TestRobotsTxtParserRequests(unittest.TestCase):
     
-    @patch("application.extractor.robots_parser.requests.get")
+    @patch("application.extractor.robots_parser.http_get")
     def test_scrape_requests_success(self, mock_get):
         # Mock response object
         mock_response = MagicMock()
@@ -26,7 +31,7 @@ class TestRobotsTxtParserRequests(unittest.TestCase):
         self.assertIn("/public/", parser.user_agents["*"]["allow"])
         self.assertIn("https://example.com/sitemap.xml", parser.sitemaps)
 
-    @patch("application.extractor.robots_parser.requests.get")
+    @patch("application.extractor.robots_parser.http_get")
     def test_scrape_requests_failure(self, mock_get):
         # Simulate a requests exception
         mock_get.side_effect = RequestException("Connection error")
@@ -52,6 +57,28 @@ class TestRobotsTxtParserRequests(unittest.TestCase):
         self.assertIn("/nobing/", parser.user_agents["Bingbot"]["disallow"])
         self.assertIn("/public/", parser.user_agents["Bingbot"]["allow"])
 
+    def test_parse_content_crawl_delay(self):
+        parser = RobotsTxtParser("https://example.com")
+        content = """
+        User-agent: *
+        Crawl-delay: 2.5
+        User-agent: FastBot
+        Crawl-delay: 0
+        User-agent: BadBot
+        Crawl-delay: soon
+        User-agent: RulesBot
+        Disallow: /private/
+        """
+        parser._parse_content(content)
+        self.assertEqual(parser.get_crawl_delay("*"), 2.5)
+        self.assertEqual(parser.get_crawl_delay("FastBot"), 0)
+        self.assertEqual(parser.get_crawl_delay("fastbot"), 0)
+        self.assertEqual(parser.get_crawl_delay("OtherBot"), 2.5)
+        # The group of the user-agent applies without the delay of '*' (RFC 9309), like its rules in is_allowed
+        self.assertIsNone(parser.get_crawl_delay("BadBot"))
+        self.assertIsNone(parser.get_crawl_delay("rulesbot"))
+        self.assertIsNone(RobotsTxtParser("https://example.com").get_crawl_delay("OtherBot"))
+
     def test_is_allowed(self):
         parser = RobotsTxtParser("https://example.com")
         parser.user_agents = {
@@ -98,15 +125,28 @@ class TestRobotsExtLinks(unittest.TestCase):
         self.ext_links = RobotsExtLinks(self.mock_parser)
 
     def test_check_sm_product_link(self):
-        self.assertTrue(self.ext_links._is_url_product("https://example.com/product-123.xml"))
+        self.assertFalse(self.ext_links._is_url_product("https://example.com/product-123.xml"))
+        self.assertFalse(self.ext_links._is_url_product("https://example.com/product-sitemap.xml"))
+        self.assertFalse(self.ext_links._is_url_product("https://example.com/product-sitemap1.xml.gz"))
         self.assertFalse(self.ext_links._is_url_product("https://example.com/category.xml"))
+        self.assertTrue(self.ext_links._is_url_product("https://sitemap-shop.com/product/p-1/"))
+        self.assertFalse(self.ext_links._is_url_product("https://item-shop.com/about/"))
+        self.assertFalse(self.ext_links._is_url_product("https://example.com/sitemap_index.xml"))
+        self.assertTrue(self.ext_links._is_url_product("https://example.com/shop/Items/42"))
+
+    def test_check_link_sitemap_entry_goes_to_frontier(self):
+        seen, frontier = SeenSet(), deque()
+        self.ext_links._check_link("https://s.com/products-1.xml", None, True, seen, frontier)
+        self.ext_links._check_link("https://sitemap-shop.com/product/p-1/", "2024-05-01", False, seen, frontier)
+        self.assertEqual(list(frontier), ["https://s.com/products-1.xml"])
+        self.assertEqual(self.ext_links.get_product_links(), ["https://sitemap-shop.com/product/p-1/"])
 
     def test_check_sm_link(self):
         self.assertTrue(self.ext_links._is_url_sitemap("https://example.com/sitemap.xml"))
         self.assertTrue(self.ext_links._is_url_sitemap("https://example.com/other.xml"))
         self.assertFalse(self.ext_links._is_url_sitemap("https://example.com/page.html"))
 
-    @patch("application.extractor.robots_parser.requests.get")
+    @patch("application.extractor.robots_parser.http_get")
     def test_fetch_content_requests(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -167,7 +207,79 @@ class TestRobotsExtLinks(unittest.TestCase):
         ext_links._is_url_product = lambda url: "product" in url
         ext_links._is_url_sitemap = lambda url: "sitemap" in url or "products" in url
         links = ext_links.find_product_sitemap_links()
-        self.assertIn("https://example.com/products.xml", links)
+        # products.xml of robots.txt is fetched as a sitemap, not returned as a product
+        self.assertEqual(sorted(links), ["https://example.com/product1", "https://example.com/product2"])
+
+    @patch.object(RobotsExtLinks, "_fetch_content")
+    def test_find_product_sitemap_links_keeps_lastmod(self, mock_fetch_content):
+        mock_fetch_content.return_value = """<?xml version="1.0" encoding="UTF-8"?>
+        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+            <url><loc>https://example.com/product1</loc><lastmod>2024-05-01</lastmod></url>
+            <url><loc>https://example.com/product2</loc></url>
+        </urlset>
+        """
+        self.mock_parser.get_sitemaps.return_value = ["https://example.com/sitemap.xml"]
+        ext_links = RobotsExtLinks(self.mock_parser)
+        ext_links._is_url_product = lambda url: "product" in url
+        links = ext_links.find_product_sitemap_links()
+        self.assertEqual(links, ["https://example.com/product1", "https://example.com/product2"])
+        self.assertEqual(ext_links.get_lastmods(), {"https://example.com/product1": "2024-05-01"})
+
+    @patch("application.extractor.robots_parser.stream_sitemap")
+    @patch("application.extractor.robots_parser.config")
+    def test_find_product_sitemap_links_streams_with_requests(self, mock_config, mock_stream_sitemap):
+        mock_config.METHOD = "requests"
+        entries = {
+            "https://example.com/sitemap_index.xml": [SitemapEntry("https://example.com/pages-1.xml.gz", None, True)],
+            "https://example.com/pages-1.xml.gz": [SitemapEntry("https://example.com/product/1", "2024-05-01")],
+        }
+        mock_stream_sitemap.side_effect = lambda url, timeout: iter(entries.get(url, []))
+        self.mock_parser.get_sitemaps.return_value = ["https://example.com/sitemap_index.xml"]
+        ext_links = RobotsExtLinks(self.mock_parser)
+        ext_links._is_url_product = lambda url: "product" in url
+        ext_links._is_url_sitemap = lambda url: "sitemap" in url
+        links = ext_links.find_product_sitemap_links()
+        self.assertEqual(links, ["https://example.com/product/1"])
+        self.assertEqual(ext_links.get_lastmods(), {"https://example.com/product/1": "2024-05-01"})
+
+    @patch("application.extractor.robots_parser.stream_sitemap")
+    @patch("application.extractor.robots_parser.config")
+    def test_robots_sitemap_with_product_name_is_fetched(self, mock_config, mock_stream_sitemap):
+        mock_config.METHOD = "requests"
+        mock_stream_sitemap.return_value = iter([SitemapEntry("https://shop.com/product/a/")])
+        self.mock_parser.get_sitemaps.return_value = ["https://shop.com/product-sitemap.xml"]
+        links = RobotsExtLinks(self.mock_parser).find_product_sitemap_links()
+        mock_stream_sitemap.assert_called_once_with("https://shop.com/product-sitemap.xml", timeout=ANY)
+        self.assertEqual(links, ["https://shop.com/product/a/"])
+
+    @patch("application.extractor.robots_parser.stream_sitemap")
+    @patch("application.extractor.robots_parser.config")
+    def test_find_product_sitemap_links_fetches_children_in_parallel(self, mock_config, mock_stream_sitemap):
+        mock_config.METHOD = "requests"
+        state = {'running': 0, 'max_running': 0}
+        lock = threading.Lock()
+
+        def fake_stream(url, timeout):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+            if url.endswith("index.xml"):
+                return iter([SitemapEntry(f"https://example.com/pages-{i}.xml", None, True) for i in range(8)])
+            # The same product is listed in every child sitemap
+            return iter([SitemapEntry(f"https://example.com/product/{url[-5]}"), SitemapEntry("https://example.com/product/shared")])
+
+        mock_stream_sitemap.side_effect = fake_stream
+        self.mock_parser.get_sitemaps.return_value = ["https://example.com/index.xml"]
+        ext_links = RobotsExtLinks(self.mock_parser, concurrency=4)
+        ext_links._is_url_product = lambda url: "product" in url
+        links = ext_links.find_product_sitemap_links()
+        self.assertEqual(len(links), 9)
+        self.assertEqual(links.count("https://example.com/product/shared"), 1)
+        self.assertEqual(mock_stream_sitemap.call_count, 9)
+        self.assertEqual(state['max_running'], 4)
 
     def test_close_driver(self):
         ext_links = RobotsExtLinks(self.mock_parser)
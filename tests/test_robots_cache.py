@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from application.extractor.robots_cache import RobotsCache
+
+
+def make_response(status_code, text=''):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    return response
+
+
+class TestRobotsCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_file = os.path.join(self.tmp.name, 'test.db')
+        patcher = patch("application.extractor.robots_cache.http_get")
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_cache(self, **kwargs):
+        cache = RobotsCache(self.db_file, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_fetched_once_and_shared_between_instances(self):
+        self.mock_get.return_value = make_response(200, "User-agent: *\nDisallow: /private\nCrawl-delay: 2\nSitemap: https://example.com/sitemap.xml")
+        cache = self.make_cache()
+        parser = cache.get("https://example.com")
+        self.assertFalse(parser.is_allowed("X_Scraper", "/private/1"))
+        self.assertEqual(parser.get_crawl_delay("X_Scraper"), 2)
+        self.assertIs(cache.get("https://example.com/"), parser)
+        # Another worker process uses the same database file
+        other = self.make_cache().get("https://example.com")
+        self.assertEqual(other.get_sitemaps(), ["https://example.com/sitemap.xml"])
+        self.mock_get.assert_called_once_with("https://example.com/robots.txt", timeout=5)
+
+    def test_4xx_allows_everything(self):
+        self.mock_get.return_value = make_response(404)
+        parser = self.make_cache().get("https://example.com")
+        self.assertTrue(parser.is_allowed("X_Scraper", "/anything"))
+
+    def test_5xx_disallows_everything_for_error_ttl(self):
+        self.mock_get.return_value = make_response(503)
+        cache = self.make_cache(error_ttl=0.05)
+        self.assertFalse(cache.get("https://example.com").is_allowed("X_Scraper", "/anything"))
+        self.mock_get.return_value = make_response(200, "User-agent: *\nAllow: /")
+        self.assertFalse(cache.get("https://example.com").is_allowed("X_Scraper", "/anything"))
+        time.sleep(0.06)
+        self.assertTrue(cache.get("https://example.com").is_allowed("X_Scraper", "/anything"))
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_unreachable_server(self):
+        self.mock_get.side_effect = Exception("Connection error")
+        parser = self.make_cache().get("https://example.com")
+        self.assertFalse(parser.is_allowed("X_Scraper", "/"))
+
+    def test_waits_for_the_lease_holder(self):
+        holder = self.make_cache()
+        self.assertTrue(holder.crud.try_lease("https://example.com", time.time(), 5))
+        waiter = self.make_cache()
+
+        def finish_fetch():
+            time.sleep(0.2)
+            holder._store("https://example.com", 200, "User-agent: *\nDisallow: /cart")
+
+        thread = threading.Thread(target=finish_fetch)
+        thread.start()
+        parser = waiter.get("https://example.com")
+        thread.join()
+        self.assertFalse(parser.is_allowed("X_Scraper", "/cart"))
+        self.mock_get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
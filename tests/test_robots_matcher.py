@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+from application.extractor.robots_matcher import RobotsMatcher, select_group, select_group_name
+from application.extractor.robots_parser import RobotsTxtParser
+from application.extractor.robots_parser_async import AsyncRobotsTxtParser
+
+
+class TestRobotsMatcher(unittest.TestCase):
+    def test_longest_match_wins(self):
+        matcher = RobotsMatcher(allow=["/shop/public"], disallow=["/shop/"])
+        self.assertFalse(matcher.is_allowed("/shop/private"))
+        self.assertTrue(matcher.is_allowed("/shop/public/item"))
+        matcher = RobotsMatcher(allow=["/shop/"], disallow=["/shop/private"])
+        self.assertFalse(matcher.is_allowed("/shop/private/item"))
+        self.assertTrue(matcher.is_allowed("/shop/other"))
+
+    def test_allow_wins_tie(self):
+        matcher = RobotsMatcher(allow=["/page"], disallow=["/page"])
+        self.assertTrue(matcher.is_allowed("/page"))
+
+    def test_wildcards(self):
+        matcher = RobotsMatcher(allow=["/*/reviews$"], disallow=["/*.pdf$", "/*?sort=", "/product/*/reviews"])
+        self.assertFalse(matcher.is_allowed("/files/catalog.pdf"))
+        self.assertTrue(matcher.is_allowed("/files/catalog.pdf?download=1"))
+        self.assertFalse(matcher.is_allowed("/category/shoes?sort=price"))
+        self.assertTrue(matcher.is_allowed("/category/shoes?page=2"))
+        self.assertFalse(matcher.is_allowed("/product/1/reviews/2"))
+        # Both rules match, the Disallow is longer
+        self.assertFalse(matcher.is_allowed("/product/1/reviews"))
+
+    def test_empty_rules(self):
+        matcher = RobotsMatcher(allow=[], disallow=[""])
+        self.assertTrue(matcher.is_allowed("/anything"))
+        self.assertFalse(RobotsMatcher(disallow=["/"]).is_allowed("/anything"))
+
+    def test_select_group(self):
+        groups = {"*": "wildcard", "TestBot": "test"}
+        self.assertEqual(select_group(groups, "testbot"), "test")
+        self.assertEqual(select_group(groups, "OtherBot"), "wildcard")
+        self.assertIsNone(select_group({}, "OtherBot"))
+        self.assertEqual(select_group_name({"*", "TestBot"}, "testbot"), "TestBot")
+        self.assertIsNone(select_group_name({"TestBot"}, "OtherBot"))
+
+
+class TestParsersUseMatcher(unittest.TestCase):
+    def test_parser_uses_only_the_specific_group(self):
+        parser = RobotsTxtParser("https://example.com")
+        parser._parse_content("""
+        User-agent: *
+        Disallow: /
+
+        User-agent: X_Scraper
+        Disallow: /checkout
+        """)
+        self.assertTrue(parser.is_allowed("X_Scraper", "/product/1"))
+        self.assertFalse(parser.is_allowed("X_Scraper", "/checkout/cart"))
+        self.assertFalse(parser.is_allowed("OtherBot", "/product/1"))
+
+    def test_parser_recompiles_when_rules_replaced(self):
+        parser = RobotsTxtParser("https://example.com")
+        parser.user_agents = {"*": {"allow": [], "disallow": ["/a"]}}
+        self.assertFalse(parser.is_allowed("*", "/a"))
+        parser.user_agents = {"*": {"allow": [], "disallow": []}}
+        self.assertTrue(parser.is_allowed("*", "/a"))
+
+    def test_async_parser(self):
+        parser = AsyncRobotsTxtParser("https://example.com")
+        asyncio.run(parser._parse_content("User-agent: *\nAllow: /shop/public\nDisallow: /shop/\n"))
+        self.assertTrue(asyncio.run(parser.is_allowed("AnyBot", "/shop/public/1")))
+        self.assertFalse(asyncio.run(parser.is_allowed("AnyBot", "/shop/private")))
+
+
+if __name__ == '__main__':
+    unittest.main()
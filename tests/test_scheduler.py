@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from application.crawler.scheduler import HostScheduler, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_consume_and_refill(self):
+        bucket = TokenBucket(rate=2.0, capacity=1)
+        now = bucket.updated_at
+        self.assertTrue(bucket.consume(now))
+        self.assertFalse(bucket.consume(now))
+        self.assertAlmostEqual(bucket.wait_time(now), 0.5)
+        self.assertTrue(bucket.consume(now + 0.5))
+
+    def test_unlimited_rate(self):
+        bucket = TokenBucket(rate=0.0)
+        now = bucket.updated_at
+        for _ in range(5):
+            self.assertTrue(bucket.consume(now))
+
+
+class TestHostScheduler(unittest.TestCase):
+    def test_round_robin_between_hosts(self):
+        scheduler = HostScheduler(default_delay=0, host_concurrency=1)
+        for url in ["https://a.com/1", "https://a.com/2", "https://b.com/1"]:
+            scheduler.add(url)
+
+        async def take_two():
+            return [await scheduler.get(), await scheduler.get()]
+
+        self.assertEqual(asyncio.run(take_two()), ["https://a.com/1", "https://b.com/1"])
+        self.assertEqual(scheduler.pending(), 1)
+
+    def test_get_returns_none_when_done(self):
+        scheduler = HostScheduler(default_delay=0)
+        scheduler.add("https://a.com/1")
+
+        async def crawl():
+            url = await scheduler.get()
+            scheduler.report(url, latency=0.01, status=200)
+            return url, await scheduler.get()
+
+        self.assertEqual(asyncio.run(crawl()), ("https://a.com/1", None))
+
+    def test_crawl_delay_applies_between_requests(self):
+        scheduler = HostScheduler(default_delay=0)
+        scheduler.set_crawl_delay("a.com", 0.05)
+        scheduler.add("https://a.com/1")
+        scheduler.add("https://a.com/2")
+
+        async def crawl():
+            loop = asyncio.get_running_loop()
+            url = await scheduler.get()
+            started_at = loop.time()
+            scheduler.report(url, status=200)
+            await scheduler.get()
+            return loop.time() - started_at
+
+        self.assertGreaterEqual(asyncio.run(crawl()), 0.04)
+
+    def test_throttle_status_increases_delay(self):
+        scheduler = HostScheduler(default_delay=1.0, max_delay=10.0)
+        scheduler.add("https://a.com/1")
+        asyncio.run(scheduler.get())
+        scheduler.report("https://a.com/1", latency=0.1, status=429)
+        self.assertEqual(scheduler.get_delay("a.com"), 2.0)
+        self.assertIsNone(asyncio.run(scheduler.get()))
+
+    def test_delay_adapts_to_latency(self):
+        scheduler = HostScheduler(default_delay=0.1, host_concurrency=2)
+        scheduler.add("https://a.com/1")
+        asyncio.run(scheduler.get())
+        scheduler.report("https://a.com/1", latency=4.0, status=200)
+        self.assertEqual(scheduler.get_delay("a.com"), 2.0)
+        self.assertEqual(scheduler.get_delay("b.com"), 0.1)
@@ -0,0 +1,105 @@
+import gzip
+import unittest
+from unittest.mock import patch, MagicMock
+from application.extractor.sitemap import SitemapEntry, iter_sitemap_entries, iter_sitemap_text, stream_sitemap
+
+
+URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <url><loc>https://example.com/product/1</loc><lastmod>2024-05-01</lastmod></url>
+    <url><loc>https://example.com/product/2</loc></url>
+</urlset>
+"""
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <sitemap><loc>https://example.com/sitemap-products-1.xml.gz</loc><lastmod>2024-05-02</lastmod></sitemap>
+</sitemapindex>
+"""
+
+# Yoast/WooCommerce layout: the image of the product has its own <image:loc>
+IMAGE_URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">
+    <url>
+        <loc>https://shop.com/product/a/</loc>
+        <lastmod>2024-05-01</lastmod>
+        <image:image><image:loc>https://shop.com/wp-content/uploads/a.jpg</image:loc></image:image>
+    </url>
+</urlset>
+"""
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestSitemapParser(unittest.TestCase):
+    def test_iter_entries_in_small_chunks(self):
+        entries = list(iter_sitemap_entries(split(URLSET, 7)))
+        self.assertEqual(entries, [
+            SitemapEntry("https://example.com/product/1", "2024-05-01", False),
+            SitemapEntry("https://example.com/product/2", None, False),
+        ])
+
+    def test_iter_entries_gzipped(self):
+        entries = list(iter_sitemap_entries(split(gzip.compress(URLSET), 10)))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1", "https://example.com/product/2"])
+
+    def test_iter_entries_sitemap_index(self):
+        entries = list(iter_sitemap_entries([SITEMAP_INDEX]))
+        self.assertEqual(entries, [SitemapEntry("https://example.com/sitemap-products-1.xml.gz", "2024-05-02", True)])
+
+    def test_iter_entries_plain_text(self):
+        entries = list(iter_sitemap_entries(split(b"https://example.com/product/1\nhttps://example.com/product/2\n", 5)))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1", "https://example.com/product/2"])
+
+    def test_iter_entries_plain_text_in_one_chunk(self):
+        entries = list(iter_sitemap_entries([b"https://example.com/product/1\nhttps://example.com/product/2"]))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1", "https://example.com/product/2"])
+
+    def test_iter_entries_with_byte_order_mark(self):
+        entries = list(iter_sitemap_entries(split(b"\xef\xbb\xbf" + URLSET, 2)))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1", "https://example.com/product/2"])
+        entries = list(iter_sitemap_text("\ufeff" + URLSET.decode()))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1", "https://example.com/product/2"])
+
+    def test_iter_entries_gzipped_with_padding(self):
+        # Two gzip members then zero padding
+        data = gzip.compress(URLSET[:100]) + gzip.compress(URLSET[100:]) + b"\x00" * 512
+        entries = list(iter_sitemap_entries(split(data, 64)))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1", "https://example.com/product/2"])
+
+    def test_iter_entries_stops_at_broken_xml(self):
+        entries = list(iter_sitemap_entries([b"<urlset><url><loc>https://example.com/product/1</loc></url><url><loc>"]))
+        self.assertEqual([entry.loc for entry in entries], ["https://example.com/product/1"])
+
+    def test_iter_text_falls_back_to_regex(self):
+        content = "<html><body><div><url><loc>https://example.com/product/1</loc><lastmod>2024-05-01</lastmod></url><br></body></html>"
+        entries = list(iter_sitemap_text(content))
+        self.assertEqual(entries, [SitemapEntry("https://example.com/product/1", "2024-05-01", False)])
+
+    def test_image_loc_is_not_the_entry_loc(self):
+        expected = [SitemapEntry("https://shop.com/product/a/", "2024-05-01", False)]
+        self.assertEqual(list(iter_sitemap_entries(split(IMAGE_URLSET, 16))), expected)
+        self.assertEqual(list(iter_sitemap_text(IMAGE_URLSET.decode())), expected)
+        # Malformed (Rendered by a browser), parsed by the regex fallback
+        self.assertEqual(list(iter_sitemap_text("<html>&nbsp;" + IMAGE_URLSET.decode().split("?>", 1)[1])), expected)
+
+    @patch("application.extractor.sitemap.http_get")
+    def test_stream_sitemap(self, mock_http_get):
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_content.return_value = iter(split(URLSET, 16))
+        mock_http_get.return_value = mock_response
+        entries = list(stream_sitemap("https://example.com/sitemap.xml"))
+        self.assertEqual(len(entries), 2)
+        mock_http_get.assert_called_once_with("https://example.com/sitemap.xml", timeout=5, stream=True)
+
+    @patch("application.extractor.sitemap.http_get")
+    def test_stream_sitemap_fetch_error(self, mock_http_get):
+        mock_http_get.side_effect = Exception("Network error")
+        self.assertEqual(list(stream_sitemap("https://example.com/sitemap.xml")), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
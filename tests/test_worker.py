@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from application.database.sqlite import CrawlStateCRUD, SQLiteDBInit
+from application.worker.broker import InMemoryBroker
+from application.worker.worker import ScrapeWorker
+
+
+class TestInMemoryBroker(unittest.TestCase):
+    def test_prefetch_limits_unacked_messages(self):
+        broker = InMemoryBroker(prefetch=2)
+        broker.publish_many(['a', 'b', 'c'])
+        first = broker.consume()
+        broker.consume()
+        self.assertIsNone(broker.consume(timeout=0.01))
+        broker.ack(first.delivery_tag)
+        self.assertEqual(broker.consume().body, b'c')
+
+    def test_nack_and_close_requeue_messages(self):
+        broker = InMemoryBroker(prefetch=5)
+        broker.publish_many(['a', 'b'])
+        first = broker.consume()
+        broker.nack(first.delivery_tag, requeue=True)
+        redelivered = broker.consume()
+        self.assertEqual(redelivered.body, b'a')
+        self.assertTrue(redelivered.redelivered)
+        broker.consume()
+        broker.close()
+        self.assertEqual(broker.counts(), {'ready': 2, 'unacked': 0})
+
+
+class TestScrapeWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_file = os.path.join(self.tmp.name, 'test.db')
+        patcher = patch("application.worker.worker.Extractor")
+        self.mock_extractor = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_extractor.side_effect = self.make_extractor
+
+    def make_extractor(self, url, method, writer, **kwargs):
+        extractor = MagicMock()
+        extractor.digest = None
+        if url.endswith('/broken'):
+            extractor.scrape.return_value = {'status': 'error', 'msg': '', 'data': {'url': url}}
+        elif url.endswith('/silent'):
+            # Extractor swallowed an error: 'ok' without a product
+            extractor.digest = 'digest'
+            extractor.scrape.return_value = {'status': 'ok', 'msg': '', 'data': {'url': url}}
+        else:
+            def scrape():
+                writer.add({'url': url, 'title': 'Title', 'price': 1.0, 'description': '', 'images': [], 'name': 'Name', 'company_name': '', 'category': []})
+                return {'status': 'ok', 'msg': '', 'data': {'url': url}}
+            extractor.scrape.side_effect = scrape
+        return extractor
+
+    def make_worker(self, broker):
+        worker = ScrapeWorker(broker, method='requests', threads=2, idle_timeout=0.01, db_file=self.db_file)
+        self.addCleanup(worker.close)
+        return worker
+
+    def count_products(self):
+        connection = SQLiteDBInit(self.db_file).connection
+        try:
+            return connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_messages_acked_after_products_stored(self):
+        broker = InMemoryBroker(prefetch=3)
+        broker.publish_many([f"https://example.com/product/{i}" for i in range(5)] + ['not a url'])
+        processed = self.make_worker(broker).run(stop_when_idle=True)
+        self.assertEqual(processed, 6)
+        self.assertEqual(self.count_products(), 5)
+        self.assertEqual(broker.counts(), {'ready': 0, 'unacked': 0})
+
+    def test_failed_url_retried_once(self):
+        broker = InMemoryBroker(prefetch=3)
+        broker.publish("https://example.com/product/broken")
+        worker = self.make_worker(broker)
+        self.assertEqual(worker.run(stop_when_idle=True), 2)
+        self.assertEqual(self.mock_extractor.call_count, 2)
+        self.assertEqual(broker.counts(), {'ready': 0, 'unacked': 0})
+
+    def test_batch_requeued_when_write_fails(self):
+        broker = InMemoryBroker(prefetch=3)
+        broker.publish_many([f"https://example.com/product/{i}" for i in range(2)])
+        worker = self.make_worker(broker)
+        with patch.object(worker.crud, 'upsert_products', return_value=False):
+            worker.run(max_messages=2)
+        self.assertEqual(broker.counts(), {'ready': 2, 'unacked': 0})
+        self.assertEqual(self.count_products(), 0)
+
+    @patch("application.worker.worker.config.WORKER_MAX_WRITE_ATTEMPTS", 3)
+    def test_url_dead_lettered_when_write_keeps_failing(self):
+        broker = InMemoryBroker(prefetch=3)
+        broker.publish_many([f"https://example.com/product/{i}" for i in range(2)])
+        worker = self.make_worker(broker)
+        with patch.object(worker.crud, 'upsert_products', return_value=False):
+            self.assertEqual(worker.run(stop_when_idle=True), 6)
+        self.assertEqual(broker.counts(), {'ready': 0, 'unacked': 0})
+        self.assertEqual(sorted(broker.dead), [b"https://example.com/product/0", b"https://example.com/product/1"])
+        self.assertEqual(worker._write_failures, {})
+
+    @patch("application.worker.worker.config.WORKER_EVENTS_INTERVAL", 0.01)
+    def test_broker_events_processed_during_batch(self):
+        broker = InMemoryBroker(prefetch=3)
+        broker.publish("https://example.com/product/1")
+        worker = self.make_worker(broker)
+        scraped = threading.Event()
+        self.mock_extractor.side_effect = None
+        self.mock_extractor.return_value.scrape.side_effect = lambda: scraped.wait(1) or {'status': 'error'}
+        events = 0
+        def process_events():
+            nonlocal events
+            events += 1
+            if events == 3:
+                scraped.set()
+        with patch.object(broker, 'process_events', side_effect=process_events):
+            worker.run(max_messages=1)
+        self.assertGreaterEqual(events, 3)
+
+    def test_ok_without_product_not_acked(self):
+        broker = InMemoryBroker(prefetch=3)
+        broker.publish_many(["https://example.com/product/silent", "https://example.com/product/1"])
+        worker = ScrapeWorker(broker, method='requests', threads=2, idle_timeout=0.01, incremental=True, db_file=self.db_file)
+        self.addCleanup(worker.close)
+        self.assertEqual(worker.run(stop_when_idle=True), 3)
+        self.assertEqual(self.mock_extractor.call_count, 3)
+        self.assertEqual(broker.counts(), {'ready': 0, 'unacked': 0})
+        self.assertEqual(self.count_products(), 1)
+        states = CrawlStateCRUD(worker.connection).get_states(["https://example.com/product/silent", "https://example.com/product/1"])
+        self.assertEqual(list(states), ["https://example.com/product/1"])
+
+
+if __name__ == '__main__':
+    unittest.main()